@@ -1,3 +1,4 @@
+import codecs
 import sys
 import paramiko
 import click
@@ -7,6 +8,9 @@ import time
 import os
 from queue import Queue, Empty
 
+from simplenet.cli.crypto_profiles import (CRYPTO_PROFILES, DEFAULT_CRYPTO_PROFILE, connect_kwargs,
+                                           negotiated_algorithms)
+
 # Ensure log directory exists
 if not os.path.exists('./log'):
     os.makedirs('./log')
@@ -27,10 +31,12 @@ def read_and_process_output(channel, output_queue, buffer, prompt, prompt_count,
         log_file (str): Path to the log file.
     """
     counter = 0
+    # Incremental decoder: a multibyte character split across two reads is decoded once both halves arrive
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
     with open(log_file, 'a') as f:
         while True:
             if channel.recv_ready():
-                output_chunk = channel.recv(4096).decode('utf-8').replace('\r', '')
+                output_chunk = decoder.decode(channel.recv(65536)).replace('\r', '')
                 print(f"Received chunk: {output_chunk}")
                 f.write(output_chunk)
                 f.flush()
@@ -64,8 +70,10 @@ def read_and_process_output(channel, output_queue, buffer, prompt, prompt_count,
               help='Disable automatically adding the host key [default=False]')
 @click.option('--look-for-keys', is_flag=True, default=False, help='Look for local SSH key [default=False]')
 @click.option('--inter-command-time', '-i', default=1, help='Inter-command time in seconds [default is 1 second]')
+@click.option('--crypto-profile', type=click.Choice(list(CRYPTO_PROFILES)), default=DEFAULT_CRYPTO_PROFILE,
+              help=f'SSH algorithms to offer [default={DEFAULT_CRYPTO_PROFILE}]')
 def main(host, user, password, cmds, invoke_shell, prompt, prompt_count, timeout, disable_auto_add_policy,
-               look_for_keys, inter_command_time):
+               look_for_keys, inter_command_time, crypto_profile):
     """
     SSH Client for running remote commands in string mode.
 
@@ -85,45 +93,6 @@ def main(host, user, password, cmds, invoke_shell, prompt, prompt_count, timeout
     else:
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-    # Modify the transport defaults for key exchange algorithms, ciphers, and host key algorithms
-    paramiko.Transport._preferred_kex = (
-        "diffie-hellman-group14-sha1",
-        "diffie-hellman-group-exchange-sha1",
-        "diffie-hellman-group-exchange-sha256",
-        "diffie-hellman-group1-sha1",
-        "ecdh-sha2-nistp256",
-        "ecdh-sha2-nistp384",
-        "ecdh-sha2-nistp521",
-        "curve25519-sha256",
-        "curve25519-sha256@libssh.org",
-        "diffie-hellman-group16-sha512",
-        "diffie-hellman-group18-sha512"
-    )
-    paramiko.Transport._preferred_ciphers = (
-        "aes128-cbc",
-        "aes128-ctr",
-        "aes192-ctr",
-        "aes256-ctr",
-        "aes256-cbc",
-        "3des-cbc",
-        "aes192-cbc",
-        "aes256-gcm@openssh.com",
-        "aes128-gcm@openssh.com",
-        "chacha20-poly1305@openssh.com",
-        "aes256-gcm",
-        "aes128-gcm"
-    )
-    paramiko.Transport._preferred_keys = (
-        "ssh-rsa",
-        "ssh-dss",
-        "ecdsa-sha2-nistp256",
-        "ecdsa-sha2-nistp384",
-        "ecdsa-sha2-nistp521",
-        "ssh-ed25519",
-        "rsa-sha2-256",
-        "rsa-sha2-512"
-    )
-
     try:
         # Connect to the SSH server
         hostname, port = host.split(':') if ':' in host else (host, 22)
@@ -134,9 +103,13 @@ def main(host, user, password, cmds, invoke_shell, prompt, prompt_count, timeout
             password=password,
             look_for_keys=look_for_keys,
             timeout=timeout,
-            allow_agent=False  # Ensure we don't use any other key authentication mechanisms
+            allow_agent=False,  # Ensure we don't use any other key authentication mechanisms
+            # Applies the profile to this connection only, leaving paramiko's defaults untouched
+            **connect_kwargs(crypto_profile)
         )
-        connect_msg = f"Connected to {host} using the specified algorithms.\n"
+        algorithms = negotiated_algorithms(client.get_transport())
+        connect_msg = (f"Connected to {host} using crypto profile {crypto_profile}: "
+                       f"{', '.join(f'{kind}={name}' for kind, name in algorithms.items())}\n")
         print(connect_msg)
         with open(log_file, 'a') as f:
             f.write(connect_msg)
@@ -230,8 +203,8 @@ def main(host, user, password, cmds, invoke_shell, prompt, prompt_count, timeout
 
             try:
                 stdin, stdout, stderr = client.exec_command(cmd, timeout=timeout)
-                output = stdout.read().decode('utf-8')
-                error = stderr.read().decode('utf-8')
+                output = stdout.read().decode('utf-8', errors='replace')
+                error = stderr.read().decode('utf-8', errors='replace')
                 if output:
                     print(output)
                     with open(log_file, 'a') as f:
@@ -36,6 +36,7 @@ setup(
             'vsndebug=simplenet.gui.vsndebug:main',
             'simplenet-gui=simplenet.main:main',
             'simplenet-runner=simplenet.cli.runner:main',  # Corrected runner entry point
+            'simplenet-worker=simplenet.cli.cluster:worker_main',
         ],
     },
     package_data={
@@ -0,0 +1,158 @@
+import socket
+import statistics
+import threading
+import time
+
+# Connection failure types that indicate the network, the devices or the AAA servers are overloaded.
+# Plain authentication failures (wrong password) say nothing about load and are not counted.
+CONGESTION_ERRORS = ('auth_timeout', 'timeout', 'refused')
+
+# 'failed' event reasons that are connection attempts: the SSH login, and the port 22 probe before it
+CONNECTION_FAILURES = ('connection', 'unreachable')
+
+
+def classify_connection_error(error):
+    """
+    Classify an exception raised while opening an SSH session.
+
+    Args:
+        error (Exception): Exception from ThreadSafeSSHConnection.connect().
+
+    Returns:
+        str: 'auth_timeout', 'auth', 'timeout', 'refused' or 'other'.
+    """
+    message = str(error).lower()
+    class_names = {cls.__name__ for cls in type(error).__mro__}
+    if 'AuthenticationException' in class_names:
+        return 'auth_timeout' if 'timeout' in message else 'auth'
+    if isinstance(error, (socket.timeout, TimeoutError)) or 'timed out' in message or 'timeout' in message:
+        return 'timeout'
+    if isinstance(error, ConnectionRefusedError) or 'refused' in message:
+        return 'refused'
+    if 'authentication' in message:
+        return 'auth'
+    return 'other'
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for the number of devices in flight.
+
+    The controller watches SSH connection attempts, and the port 22 probes made before them,
+    through the runner's event stream. After each window of attempts it compares the congestion
+    failure rate and the median handshake latency against healthy levels:
+
+    - healthy: the limit grows, doubling until the first back-off (slow start) and by a fixed
+      step afterwards;
+    - congested (failure rate above the threshold, or median handshake latency above
+      latency_factor times the best median seen): the limit is multiplied by decrease_factor.
+
+    Every change is recorded in decisions for the run summary.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=64, step=None, decrease_factor=0.5,
+                 failure_threshold=0.1, latency_factor=2.0, min_samples=5):
+        """
+        Args:
+            initial (int): Starting number of devices in flight.
+            minimum (int): Lowest limit the controller may choose.
+            maximum (int): Highest limit the controller may choose (normally the engine capacity).
+            step (int): Additive increase after slow start [default=maximum // 50, at least 1].
+            decrease_factor (float): Multiplier applied to the limit on congestion.
+            failure_threshold (float): Congestion failure rate per window that triggers a back-off.
+            latency_factor (float): Median handshake latency, relative to the best window, that triggers a back-off.
+            min_samples (int): Minimum connection attempts per decision window.
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self._limit = min(max(initial, self.minimum), self.maximum)
+        self.step = step or max(1, self.maximum // 50)
+        self.decrease_factor = decrease_factor
+        self.failure_threshold = failure_threshold
+        self.latency_factor = latency_factor
+        self.min_samples = min_samples
+        self.decisions = []
+        self.peak = self._limit
+        self._slow_start = True
+        self._baseline_latency = None
+        self._latencies = []
+        self._attempts = 0
+        self._congestion_failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        with self._lock:
+            return self._limit
+
+    def __call__(self):
+        """Return the current limit, so the controller can be passed to dispatch() as max_in_flight."""
+        return self.limit
+
+    def handle(self, event):
+        """Consume a runner event (connected or failed) and adjust the limit at the end of each window."""
+        event_type = event.get('type')
+        with self._lock:
+            if event_type == 'connected':
+                if event.get('reused'):
+                    return  # a pooled session says nothing about handshake load
+                self._attempts += 1
+                if event.get('duration') is not None:
+                    self._latencies.append(event['duration'])
+            elif event_type == 'failed' and event.get('reason') in CONNECTION_FAILURES:
+                self._attempts += 1
+                if event.get('error_type') in CONGESTION_ERRORS:
+                    self._congestion_failures += 1
+            else:
+                return
+
+            if self._attempts >= max(self.min_samples, self._limit // 2):
+                self._decide()
+
+    def _decide(self):
+        failure_rate = self._congestion_failures / self._attempts
+        latency = statistics.median(self._latencies) if self._latencies else None
+
+        reason = None
+        if failure_rate > self.failure_threshold:
+            reason = f"failure rate {failure_rate:.0%}"
+        elif latency is not None and self._baseline_latency and latency > self.latency_factor * self._baseline_latency:
+            reason = f"handshake p50 {latency:.2f}s > {self.latency_factor}x baseline {self._baseline_latency:.2f}s"
+
+        if latency is not None and reason is None:
+            self._baseline_latency = latency if self._baseline_latency is None else min(self._baseline_latency, latency)
+
+        previous = self._limit
+        if reason:
+            self._slow_start = False
+            self._limit = max(self.minimum, int(self._limit * self.decrease_factor))
+        elif self._slow_start:
+            self._limit = min(self.maximum, self._limit * 2)
+            reason = "healthy (slow start)"
+        else:
+            self._limit = min(self.maximum, self._limit + self.step)
+            reason = "healthy"
+        self.peak = max(self.peak, self._limit)
+
+        if self._limit != previous:
+            self.decisions.append({
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'from': previous,
+                'to': self._limit,
+                'reason': reason,
+                'attempts': self._attempts,
+                'failure_rate': round(failure_rate, 3),
+                'handshake_p50': round(latency, 3) if latency is not None else None,
+            })
+
+        self._attempts = 0
+        self._congestion_failures = 0
+        self._latencies = []
+
+    def summary(self):
+        """
+        Returns:
+            dict: Final and peak limits plus every recorded decision.
+        """
+        with self._lock:
+            return {'final_limit': self._limit, 'peak_limit': self.peak, 'decisions': list(self.decisions)}
@@ -0,0 +1,589 @@
+import base64
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+
+import click
+from ruamel.yaml import YAML
+
+# Protocol: newline-delimited JSON messages over a plain TCP connection.
+#
+#   worker -> coordinator: hello {worker_id, slots, token}, pull {count}, heartbeat, result {task_id, result}, event {event}
+#   coordinator -> worker: job {job} or error {error}, task {task_id, row}, shutdown
+#
+# The connection is neither encrypted nor authenticated beyond the shared token in 'hello'; a
+# connection whose first message is not a hello with the right token is closed before anything
+# is sent to it. Run it on a trusted network or through an SSH tunnel or VPN.
+#
+# A worker announces free capacity with 'pull'. The coordinator keeps a shard of queued
+# devices per worker; a worker with free capacity and an empty shard steals from the tail of
+# the busiest other shard. Workers that stop sending heartbeats are dropped and their queued
+# and in-flight devices are handed to the remaining workers. If no worker is left for
+# worker_grace seconds, the devices still waiting are failed.
+#
+# The inventory database, driver and vars file are sent inside the job, so worker nodes do
+# not need the coordinator's paths. The inventory is sent without its credentials; each worker
+# loads them from its own copy of the inventory YAML. Files the driver refers to (TTP
+# templates, scripts) must exist at the same relative paths on every worker.
+
+# Job keys holding files that are shipped to the workers
+JOB_FILES = ('db_file', 'driver', 'vars_file')
+
+# Inventory tables that never leave the coordinator
+CREDENTIAL_TABLES = ('credentials', 'device_credentials')
+
+DEFAULT_BIND_HOST = '127.0.0.1'
+
+
+def send_message(sock, lock, message):
+    """Serialize a message as one JSON line and send it atomically."""
+    data = (json.dumps(message, default=str) + '\n').encode('utf-8')
+    with lock:
+        sock.sendall(data)
+
+
+def read_messages(sock):
+    """Yield decoded messages from a socket until the peer closes the connection."""
+    with sock.makefile('r', encoding='utf-8') as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_inventory_without_credentials(db_file):
+    """
+    Return the bytes of a copy of an inventory database with its CREDENTIAL_TABLES emptied.
+
+    The tables are kept, empty, so queries against them still work on the worker. The copy is
+    vacuumed, so the deleted rows are not left behind in free pages.
+
+    Args:
+        db_file (str): Path to the inventory database.
+
+    Returns:
+        bytes: Contents of the stripped copy.
+    """
+    with tempfile.TemporaryDirectory(prefix='simplenet-job-') as directory:
+        copy_file = os.path.join(directory, os.path.basename(db_file))
+        source = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+        copy = sqlite3.connect(copy_file)
+        try:
+            source.backup(copy)
+            tables = {row[0] for row in copy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            with copy:
+                for table in CREDENTIAL_TABLES:
+                    if table in tables:
+                        copy.execute(f'DELETE FROM {table}')
+            copy.execute('VACUUM')
+        finally:
+            source.close()
+            copy.close()
+        with open(copy_file, 'rb') as f:
+            return f.read()
+
+
+def load_local_credentials(db_file, inventory_yaml):
+    """
+    Fill the credential tables of a shipped inventory from the worker's own inventory YAML.
+
+    Only the 'credentials' list and each device's 'credential_ids' are read, so the file may
+    hold just those.
+
+    Args:
+        db_file (str): The inventory database received from the coordinator.
+        inventory_yaml (str): Path to the worker's inventory YAML.
+    """
+    with open(inventory_yaml, 'r') as f:
+        data = YAML(typ='safe').load(f) or {}
+    conn = sqlite3.connect(db_file)
+    try:
+        with conn:
+            conn.executemany('INSERT INTO credentials VALUES (?, ?, ?, ?)',
+                             [(cred['id'], cred['name'], cred['username'], cred['password'])
+                              for cred in data.get('credentials') or []])
+            conn.executemany('INSERT INTO device_credentials VALUES (?, ?)',
+                             [(device['id'], cred_id) for device in data.get('devices') or []
+                              for cred_id in device.get('credential_ids', [])])
+    finally:
+        conn.close()
+
+
+def pack_job_files(job):
+    """
+    Return a copy of job with the contents of its JOB_FILES embedded, base64 encoded.
+
+    The inventory database is embedded without its credentials.
+
+    Args:
+        job (dict): Job definition whose file paths exist on the coordinator.
+
+    Returns:
+        dict: The job to send to workers.
+
+    Raises:
+        OSError: If a file cannot be read.
+        sqlite3.Error: If the inventory database cannot be copied.
+    """
+    packed = dict(job)
+    files = {}
+    for key in JOB_FILES:
+        path = job.get(key)
+        if path:
+            if key == 'db_file':
+                data = read_inventory_without_credentials(path)
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            files[key] = {'name': os.path.basename(path), 'data': base64.b64encode(data).decode('ascii')}
+    packed['files'] = files
+    return packed
+
+
+def unpack_job_files(job, directory):
+    """
+    Write the files embedded by pack_job_files() into directory and point the job at them.
+
+    Args:
+        job (dict): Job received from the coordinator.
+        directory (str): Directory to write the files to.
+
+    Returns:
+        dict: The job with local file paths and without the embedded contents.
+    """
+    unpacked = dict(job)
+    for key, entry in (unpacked.pop('files', None) or {}).items():
+        path = os.path.join(directory, os.path.basename(entry['name']))
+        with open(path, 'wb') as f:
+            f.write(base64.b64decode(entry['data']))
+        unpacked[key] = path
+    return unpacked
+
+
+def parse_address(address, default_port=9750, default_host=DEFAULT_BIND_HOST):
+    """
+    Split a 'host:port' string.
+
+    Args:
+        address (str): Address such as '0.0.0.0:9750', 'runner01', ':9750' or '9750'.
+        default_port (int): Port to use when none is given.
+        default_host (str): Host to use when only a port is given.
+
+    Returns:
+        tuple: (host, port)
+    """
+    host, separator, port = address.rpartition(':')
+    if not separator:
+        if address.isdigit():
+            return default_host, int(address)
+        return address, default_port
+    return host or default_host, int(port)
+
+
+class _WorkerState:
+    """Coordinator-side bookkeeping for one connected worker node."""
+
+    def __init__(self, worker_id, sock, slots):
+        self.worker_id = worker_id
+        self.sock = sock
+        self.slots = slots
+        self.send_lock = threading.Lock()
+        self.credits = 0
+        self.shard = deque()
+        self.in_flight = set()
+        self.last_seen = time.monotonic()
+        self.alive = True
+
+
+class ClusterCoordinator:
+    """
+    Distributes device runs to worker nodes connected over TCP.
+
+    The coordinator behaves like the local engines: submit() takes a device row and returns a
+    concurrent.futures.Future that resolves to the result record streamed back by whichever
+    worker ran the device, so the runner's scheduler and journal work unchanged.
+    """
+
+    def __init__(self, host, port, job, heartbeat_timeout=15.0, on_event=None, worker_grace=60.0, token=None):
+        """
+        Args:
+            host (str): Address to listen on.
+            port (int): TCP port to listen on.
+            job (dict): Job definition sent to each worker when it connects; its files are sent along.
+            token (str): Shared secret workers must send in their hello [default=a random token, see .token].
+            heartbeat_timeout (float): Seconds without any message before a worker is considered dead.
+            on_event (callable): Called with each device progress event streamed by a worker.
+            worker_grace (float): Seconds queued devices wait for a worker once none is connected,
+                before they are failed.
+
+        Raises:
+            OSError: If a file named in the job cannot be read.
+            ValueError: If worker_grace is negative.
+        """
+        if worker_grace < 0:
+            raise ValueError("worker_grace must not be negative")
+        self.host = host
+        self.port = port
+        self.job = job
+        self.token = token or secrets.token_urlsafe(24)
+        self._packed_job = pack_job_files(job)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_grace = worker_grace
+        self.on_event = on_event
+        self._lock = threading.RLock()
+        self._workers_changed = threading.Condition(self._lock)
+        self._workers = {}
+        self._unassigned = deque()
+        self._futures = {}
+        self._rows = {}
+        self._next_task_id = 0
+        # When the last worker left, or None while any worker is connected
+        self._no_workers_since = time.monotonic()
+        self._server = None
+        self._stopping = threading.Event()
+
+    @property
+    def capacity(self):
+        """Total device slots across all connected workers."""
+        with self._lock:
+            return sum(worker.slots for worker in self._workers.values())
+
+    def start(self):
+        if self._server is not None:
+            return self
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        print(f"Coordinator listening on {self.host}:{self.port}")
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._reap_loop, daemon=True).start()
+        return self
+
+    def wait_for_workers(self, count, timeout=None):
+        """
+        Block until at least count workers are connected.
+
+        Returns:
+            bool: True if enough workers connected before the timeout.
+        """
+        with self._workers_changed:
+            return self._workers_changed.wait_for(lambda: len(self._workers) >= count, timeout)
+
+    def submit(self, row):
+        """
+        Queue a device row on the least loaded worker's shard.
+
+        Args:
+            row (dict): Device row from the inventory query.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the device result record.
+        """
+        future = Future()
+        with self._lock:
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            self._futures[task_id] = future
+            self._rows[task_id] = dict(row)
+
+            target = min(self._workers.values(), key=lambda w: len(w.shard) + len(w.in_flight), default=None)
+            if target is not None:
+                target.shard.append(task_id)
+            else:
+                self._unassigned.append(task_id)
+            self._pump()
+        return future
+
+    def _next_task_for(self, worker):
+        if worker.shard:
+            return worker.shard.popleft()
+        if self._unassigned:
+            return self._unassigned.popleft()
+        # Work stealing: take from the tail of the busiest other shard
+        victim = max((w for w in self._workers.values() if w is not worker and w.shard),
+                     key=lambda w: len(w.shard), default=None)
+        if victim is not None:
+            return victim.shard.pop()
+        return None
+
+    def _pump(self):
+        """Send queued tasks to workers with free capacity. Must be called with the lock held."""
+        lost = []
+        for worker in list(self._workers.values()):
+            while worker.credits > 0:
+                task_id = self._next_task_for(worker)
+                if task_id is None:
+                    break
+                worker.credits -= 1
+                worker.in_flight.add(task_id)
+                try:
+                    send_message(worker.sock, worker.send_lock,
+                                 {'type': 'task', 'task_id': task_id, 'row': self._rows[task_id]})
+                except OSError:
+                    lost.append(worker)
+                    break
+        for worker in lost:
+            self._drop_worker(worker, "send failed")
+
+    def _complete(self, worker, task_id, result):
+        with self._lock:
+            worker.in_flight.discard(task_id)
+            future = self._futures.pop(task_id, None)
+            self._rows.pop(task_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def _drop_worker(self, worker, reason):
+        """Remove a worker and hand its queued and in-flight devices to the others."""
+        with self._lock:
+            if not worker.alive:
+                return
+            worker.alive = False
+            self._workers.pop(worker.worker_id, None)
+            orphaned = [task_id for task_id in list(worker.in_flight) + list(worker.shard) if task_id in self._futures]
+            worker.in_flight.clear()
+            worker.shard.clear()
+            self._unassigned.extendleft(reversed(orphaned))
+            if not self._workers:
+                self._no_workers_since = time.monotonic()
+            if not self._stopping.is_set():
+                print(f"Worker {worker.worker_id} lost ({reason}); reassigning {len(orphaned)} devices")
+            try:
+                worker.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            worker.sock.close()
+            self._workers_changed.notify_all()
+            self._pump()
+
+    def _accept_loop(self):
+        while not self._stopping.is_set():
+            try:
+                sock, addr = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle_connection, args=(sock, addr), daemon=True).start()
+
+    def _handle_connection(self, sock, addr):
+        worker = None
+        # A client that connects but never says hello is dropped
+        sock.settimeout(self.heartbeat_timeout)
+        try:
+            for message in read_messages(sock):
+                message_type = message.get('type')
+                if worker is None:
+                    if message_type != 'hello' or not self._authenticate(message.get('token')):
+                        print(f"Rejected connection from {addr[0]}:{addr[1]}: no valid token")
+                        send_message(sock, threading.Lock(), {'type': 'error', 'error': 'authentication failed'})
+                        return
+                    worker_id = f"{message.get('worker_id') or 'worker'}@{addr[0]}:{addr[1]}"
+                    sock.settimeout(None)
+                    worker = _WorkerState(worker_id, sock, int(message.get('slots', 1)))
+                    send_message(sock, worker.send_lock, {'type': 'job', 'job': self._packed_job})
+                    with self._lock:
+                        self._workers[worker_id] = worker
+                        self._no_workers_since = None
+                        self._workers_changed.notify_all()
+                    print(f"Worker {worker_id} joined with {worker.slots} slots")
+                    continue
+
+                worker.last_seen = time.monotonic()
+
+                if message_type == 'pull':
+                    with self._lock:
+                        worker.credits += int(message.get('count', 1))
+                        self._pump()
+                elif message_type == 'result':
+                    self._complete(worker, message['task_id'], message['result'])
+                elif message_type == 'event' and self.on_event:
+                    self.on_event(message['event'])
+        except (OSError, ValueError):
+            pass
+        finally:
+            if worker is not None:
+                self._drop_worker(worker, "connection closed")
+            else:
+                sock.close()
+
+    def _authenticate(self, token):
+        return isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+    def _reap_loop(self):
+        # A floor keeps a zero grace period from turning this into a busy loop
+        while not self._stopping.wait(max(0.1, min(1.0, self.worker_grace))):
+            now = time.monotonic()
+            with self._lock:
+                stale = [w for w in self._workers.values() if now - w.last_seen > self.heartbeat_timeout]
+            for worker in stale:
+                self._drop_worker(worker, f"no heartbeat for {self.heartbeat_timeout}s")
+            self._fail_unserved(now)
+
+    def _fail_unserved(self, now):
+        """Fail the queued devices once no worker has been connected for worker_grace seconds."""
+        with self._lock:
+            if self._no_workers_since is None or now - self._no_workers_since < self.worker_grace:
+                return
+            failed = []
+            while self._unassigned:
+                task_id = self._unassigned.popleft()
+                self._rows.pop(task_id, None)
+                future = self._futures.pop(task_id, None)
+                if future is not None:
+                    failed.append(future)
+        if failed:
+            print(f"No workers connected for {self.worker_grace}s; failing {len(failed)} queued devices")
+        for future in failed:
+            if not future.done():
+                future.set_exception(RuntimeError(f"no worker connected within {self.worker_grace}s"))
+
+    def shutdown(self):
+        """Tell all workers to exit and stop listening."""
+        self._stopping.set()
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            try:
+                send_message(worker.sock, worker.send_lock, {'type': 'shutdown'})
+            except OSError:
+                pass
+        if self._server is not None:
+            self._server.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+
+def run_worker(coordinator, engine='inprocess', num_processes=2, threads_per_process=8, worker_id=None,
+               heartbeat_interval=5.0, token=None, credentials=None):
+    """
+    Connect to a coordinator and run the devices it sends until told to shut down.
+
+    Devices run on a local engine exactly as they would under simplenet-runner; each result is
+    streamed back to the coordinator as soon as it completes.
+
+    Args:
+        coordinator (str): Coordinator address as host:port.
+        engine (str): Local engine, 'inprocess' or 'subprocess'.
+        num_processes (int): Local worker processes.
+        threads_per_process (int): Device sessions per process with the inprocess engine.
+        worker_id (str): Name reported to the coordinator [default=hostname].
+        heartbeat_interval (float): Seconds between heartbeats.
+        token (str): Shared secret the coordinator was started with.
+        credentials (str): Inventory YAML holding the credentials for the devices, or None to run
+            without any (devices then fail with no credentials found).
+
+    Raises:
+        RuntimeError: If the coordinator rejects the token.
+    """
+    # Imported here to avoid a circular import; runner imports this module for coordinator mode
+    from simplenet.cli.runner import build_executor
+
+    host, port = parse_address(coordinator)
+    sock = socket.create_connection((host, port))
+    send_lock = threading.Lock()
+    messages = read_messages(sock)
+
+    slots = num_processes * threads_per_process if engine == 'inprocess' else num_processes
+    send_message(sock, send_lock, {'type': 'hello', 'worker_id': worker_id or socket.gethostname(), 'slots': slots,
+                                   'token': token})
+
+    job_message = next(messages, None)
+    if job_message is None or job_message.get('type') != 'job':
+        sock.close()
+        reason = job_message.get('error') if job_message else 'connection closed'
+        raise RuntimeError(f"Coordinator {host}:{port} did not send a job: {reason}")
+    # The coordinator's inventory, driver and vars file are written locally for the engine
+    job_dir = tempfile.mkdtemp(prefix='simplenet-job-')
+    job = unpack_job_files(job_message['job'], job_dir)
+    if credentials and job.get('db_file'):
+        load_local_credentials(job['db_file'], credentials)
+    event_queue = multiprocessing.Queue()
+    executor, submit, capacity = build_executor(engine, job, num_processes, threads_per_process,
+                                                event_queue=event_queue)
+    print(f"Connected to coordinator {host}:{port} with {capacity} slots")
+
+    stop_heartbeat = threading.Event()
+
+    def forward_events():
+        while True:
+            event = event_queue.get()
+            if event is None:
+                return
+            try:
+                send_message(sock, send_lock, {'type': 'event', 'event': event})
+            except OSError:
+                return
+
+    def heartbeat():
+        while not stop_heartbeat.wait(heartbeat_interval):
+            try:
+                send_message(sock, send_lock, {'type': 'heartbeat'})
+            except OSError:
+                return
+
+    def report(task_id, row, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error occurred: {str(e)}")
+            result = {'hostname': row['hostname'], 'mgmt_ip': row['mgmt_ip'], 'status': 'failed', 'exit_code': None}
+        try:
+            send_message(sock, send_lock, {'type': 'result', 'task_id': task_id, 'result': result})
+            send_message(sock, send_lock, {'type': 'pull', 'count': 1})
+        except OSError:
+            print(f"Lost coordinator connection; result for {row['hostname']} not delivered")
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    event_forwarder = threading.Thread(target=forward_events, daemon=True)
+    event_forwarder.start()
+    try:
+        with executor:
+            send_message(sock, send_lock, {'type': 'pull', 'count': capacity})
+            for message in messages:
+                if message.get('type') == 'task':
+                    row = message['row']
+                    future = submit(row)
+                    future.add_done_callback(lambda f, task_id=message['task_id'], row=row: report(task_id, row, f))
+                elif message.get('type') == 'shutdown':
+                    break
+    finally:
+        stop_heartbeat.set()
+        event_queue.put(None)
+        event_forwarder.join(timeout=5)
+        sock.close()
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+@click.command()
+@click.option('--connect', 'coordinator', required=True, help='Coordinator address as host:port.')
+@click.option('--engine', type=click.Choice(['subprocess', 'inprocess']), default='inprocess',
+              help='Local execution engine [default=inprocess].')
+@click.option('--num-processes', default=2, help='Local worker processes [default=2].')
+@click.option('--threads-per-process', default=8, help='Device sessions per process with --engine inprocess [default=8].')
+@click.option('--worker-id', default=None, help='Name reported to the coordinator [default=hostname].')
+@click.option('--heartbeat-interval', default=5.0, help='Seconds between heartbeats [default=5].')
+@click.option('--token', envvar='SIMPLENET_CLUSTER_TOKEN', required=True,
+              help='Shared secret printed by the coordinator (or set SIMPLENET_CLUSTER_TOKEN).')
+@click.option('--credentials', required=False, type=click.Path(exists=True, dir_okay=False),
+              help="Inventory YAML with this node's credentials; the coordinator never sends them.")
+def worker_main(coordinator, engine, num_processes, threads_per_process, worker_id, heartbeat_interval, token,
+                credentials):
+    """Worker node for a simplenet-runner coordinator."""
+    run_worker(coordinator, engine, num_processes, threads_per_process,
+               worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:4]}", heartbeat_interval, token, credentials)
+
+
+if __name__ == '__main__':
+    worker_main()
@@ -605,7 +605,8 @@ def execute_commands(ssh_connection: ThreadSafeSSHConnection, actions, variables
                 print_pretty(pretty, timestamps, f"Executing command: {line}", Fore.LIGHTYELLOW_EX)
                 expect = action.get('expect', prompt)
                 try:
-                    action_output = ssh_connection.send_command(line, expect, timeout, expect_occurrences=20)
+                    action_output = ssh_connection.send_command(line, expect, timeout,
+                                                                expect_occurrences=int(action.get('expect_occurrences') or 20))
                     # print(f"DEBUG: Command execution output: {action_output}")
                 except Exception as e:
                     print_pretty(pretty, timestamps, f"Failed to execute command: {line}. Error: {e}", Fore.RED)
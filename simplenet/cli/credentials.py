@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from cryptography.fernet import Fernet
+
+DEFAULT_KEY_PATH = './crypto.key'
+DEFAULT_SECRET_TTL = 300.0
+DEFAULT_CREDENTIAL_CACHE_DIR = './credential_cache'
+
+# Process-wide service returned by get_credential_service()
+_service = None
+_service_lock = threading.Lock()
+
+
+def is_encrypted(secret):
+    """Checks if a secret is a Fernet token."""
+    return isinstance(secret, str) and secret.startswith('gAAAAA')
+
+
+class CredentialService:
+    """
+    Resolves the credentials to try for a device, in order, with their secrets decrypted.
+
+    The Fernet key is read once per key file. Each decrypted secret is kept in memory for ttl
+    seconds, so a process connecting to many devices with the same credential decrypts it once.
+    The id of the credential that last logged in to a device is stored on disk, one small JSON
+    file per device, and that credential is tried first on later runs. Only credential ids are
+    written to disk, never secrets.
+    """
+
+    def __init__(self, key_path=DEFAULT_KEY_PATH, ttl=DEFAULT_SECRET_TTL, cache_dir=DEFAULT_CREDENTIAL_CACHE_DIR):
+        """
+        Args:
+            key_path (str): File holding the Fernet key for encrypted passwords.
+            ttl (float): Seconds a decrypted secret is kept in memory, 0 to decrypt on every use.
+            cache_dir (str): Directory recording the last working credential per device, or None to disable.
+        """
+        self.key_path = key_path
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._fernets = {}  # key path -> Fernet
+        self._secrets = {}  # (key path, token) -> (plaintext, expires_at)
+        self.stats = {'decrypted': 0, 'cache_hits': 0}
+
+    def _fernet(self, key_path):
+        fernet = self._fernets.get(key_path)
+        if fernet is None:
+            with open(key_path, 'r') as fh:
+                fernet = Fernet(fh.read().strip())
+            self._fernets[key_path] = fernet
+        return fernet
+
+    def decrypt(self, secret, key_path=None):
+        """
+        Return the plaintext of a secret, decrypting Fernet tokens through the in-memory cache.
+
+        Args:
+            secret (str): Plain or Fernet-encrypted password.
+            key_path (str): Key file for this secret [default=the service's key_path].
+
+        Returns:
+            str: The plaintext secret.
+
+        Raises:
+            RuntimeError: If the key cannot be read or the token does not decrypt.
+        """
+        if not is_encrypted(secret):
+            return secret
+        key_path = key_path or self.key_path
+        cache_key = (key_path, secret)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._secrets.get(cache_key)
+            if entry is not None and entry[1] > now:
+                self.stats['cache_hits'] += 1
+                return entry[0]
+            try:
+                plaintext = self._fernet(key_path).decrypt(secret.encode()).decode()
+            except Exception as e:
+                print(f"Error decrypting password: {e}")
+                raise RuntimeError("Failed to decrypt password")
+            self.stats['decrypted'] += 1
+            if self.ttl:
+                self._secrets[cache_key] = (plaintext, now + self.ttl)
+            return plaintext
+
+    def clear(self):
+        """Forget the loaded keys and every decrypted secret."""
+        with self._lock:
+            self._fernets.clear()
+            self._secrets.clear()
+
+    def candidates(self, device_id, hostname, db_conn):
+        """
+        List the credentials to try for a device.
+
+        Credentials are returned in the order of the device's credential_ids, except that the
+        credential that last worked for the device comes first. Secrets are still encrypted;
+        pass each one to decrypt() just before it is used.
+
+        Args:
+            device_id (int): Device ID to look up credentials for.
+            hostname (str): Device hostname, the key of the last-working record.
+            db_conn (sqlite3.Connection): Connection to the SQLite database.
+
+        Returns:
+            list: (credential_id, username, password) tuples.
+        """
+        rows = db_conn.execute('''
+            SELECT c.id, c.username, c.password
+            FROM device_credentials dc
+            JOIN credentials c ON c.id = dc.credential_id
+            WHERE dc.device_id = ?
+            ORDER BY dc.rowid
+        ''', (device_id,)).fetchall()
+        credentials = [tuple(row) for row in rows]
+
+        preferred = self.last_working(hostname)
+        if preferred is not None:
+            credentials.sort(key=lambda credential: credential[0] != preferred)
+        return credentials
+
+    def _path(self, hostname):
+        safe_name = re.sub(r'[^\w.-]', '_', hostname)
+        return os.path.join(self.cache_dir, f"{safe_name}.json")
+
+    def last_working(self, hostname):
+        """
+        Returns:
+            int: Id of the credential that last logged in to hostname, or None.
+        """
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(hostname), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry.get('credential_id') if isinstance(entry, dict) else None
+
+    def remember(self, hostname, credential_id):
+        """
+        Record the credential that logged in to hostname, so it is tried first next time.
+
+        Args:
+            hostname (str): Device hostname.
+            credential_id (int): Id of the working credential.
+        """
+        if not self.cache_dir or self.last_working(hostname) == credential_id:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {'credential_id': credential_id, 'updated': time.time()}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(hostname))
+        except OSError as e:
+            print(f"Could not update credential cache for {hostname}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def get_credential_service(**kwargs):
+    """
+    Return the process-wide credential service, creating it on first use.
+
+    Args:
+        **kwargs: CredentialService arguments. A different cache_dir replaces the directory
+            used from then on; the key and secret caches are kept.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CredentialService(**kwargs)
+        elif 'cache_dir' in kwargs:
+            _service.cache_dir = kwargs['cache_dir']
+        return _service
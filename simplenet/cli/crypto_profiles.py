@@ -0,0 +1,233 @@
+import inspect
+
+import paramiko
+
+DEFAULT_CRYPTO_PROFILE = 'compatible'
+
+_MODERN = {
+    'kex': (
+        "curve25519-sha256@libssh.org",
+        "ecdh-sha2-nistp256",
+        "ecdh-sha2-nistp384",
+        "ecdh-sha2-nistp521",
+        "diffie-hellman-group16-sha512",
+        "diffie-hellman-group-exchange-sha256",
+        "diffie-hellman-group14-sha256",
+    ),
+    'ciphers': (
+        "aes128-gcm@openssh.com",
+        "aes256-gcm@openssh.com",
+        "aes128-ctr",
+        "aes192-ctr",
+        "aes256-ctr",
+    ),
+    'macs': (
+        "hmac-sha2-256-etm@openssh.com",
+        "hmac-sha2-512-etm@openssh.com",
+        "hmac-sha2-256",
+        "hmac-sha2-512",
+    ),
+    'keys': (
+        "ssh-ed25519",
+        "ecdsa-sha2-nistp256",
+        "ecdsa-sha2-nistp384",
+        "ecdsa-sha2-nistp521",
+        "rsa-sha2-512",
+        "rsa-sha2-256",
+        # OpenSSH host certificates, signed with the same key types
+        "ssh-ed25519-cert-v01@openssh.com",
+        "ecdsa-sha2-nistp256-cert-v01@openssh.com",
+        "ecdsa-sha2-nistp384-cert-v01@openssh.com",
+        "ecdsa-sha2-nistp521-cert-v01@openssh.com",
+        "rsa-sha2-512-cert-v01@openssh.com",
+        "rsa-sha2-256-cert-v01@openssh.com",
+    ),
+}
+
+_LEGACY = {
+    'kex': (
+        "diffie-hellman-group14-sha1",
+        "diffie-hellman-group-exchange-sha1",
+        "diffie-hellman-group1-sha1",
+    ),
+    'ciphers': (
+        "aes128-cbc",
+        "aes192-cbc",
+        "aes256-cbc",
+        "3des-cbc",
+    ),
+    'macs': (
+        "hmac-sha1",
+        "hmac-sha1-96",
+        "hmac-md5",
+    ),
+    'keys': (
+        "ssh-rsa",
+        "ssh-dss",
+    ),
+}
+
+# Algorithms in order of preference per profile. The server picks the first algorithm in the
+# client's list that it also supports, so modern algorithms lead wherever they are allowed.
+CRYPTO_PROFILES = {
+    # Current OpenSSH, IOS-XE 16+, NX-OS 9+, EOS, Junos
+    'modern': _MODERN,
+    # Modern first, falling back to SHA-1 key exchange, CBC ciphers and ssh-rsa host keys
+    'compatible': {kind: _MODERN[kind] + _LEGACY[kind] for kind in _MODERN},
+    # Classic IOS 12.x/15.x: group14/group1 key exchange, CBC or CTR ciphers, ssh-rsa host keys
+    'legacy-ios': {
+        'kex': _LEGACY['kex'] + ("diffie-hellman-group-exchange-sha256",),
+        'ciphers': ("aes128-ctr", "aes256-ctr") + _LEGACY['ciphers'],
+        'macs': ("hmac-sha2-256",) + _LEGACY['macs'],
+        'keys': ("ssh-rsa", "rsa-sha2-256", "rsa-sha2-512"),
+    },
+}
+
+# paramiko's table of implemented algorithms for each kind, keyed as in disabled_algorithms
+_ALGORITHM_TABLES = {
+    'kex': '_kex_info',
+    'ciphers': '_cipher_info',
+    'macs': '_mac_info',
+    'keys': '_key_info',
+}
+
+# Profiles already warned about in this process, so each missing algorithm is reported once
+_warned_profiles = set()
+
+# SecurityOptions attribute that holds each kind's preference order on one transport
+_SECURITY_OPTIONS = {
+    'kex': 'kex',
+    'ciphers': 'ciphers',
+    'macs': 'digests',
+    'keys': 'key_types',
+}
+
+
+def get_profile(name):
+    """
+    Look up a crypto profile.
+
+    Args:
+        name (str): Profile name, or None for the default profile.
+
+    Returns:
+        dict: Algorithm tuples keyed by 'kex', 'ciphers', 'macs' and 'keys'.
+
+    Raises:
+        ValueError: If the profile does not exist.
+    """
+    name = name or DEFAULT_CRYPTO_PROFILE
+    if name not in CRYPTO_PROFILES:
+        raise ValueError(f"Unknown crypto profile '{name}'; choose from {', '.join(CRYPTO_PROFILES)}")
+    return CRYPTO_PROFILES[name]
+
+
+def _implemented(kind):
+    return getattr(paramiko.Transport, _ALGORITHM_TABLES[kind])
+
+
+def unavailable_algorithms(name):
+    """
+    List the algorithms of a crypto profile that the installed paramiko does not implement.
+
+    paramiko 5 removed the SHA-1 key exchanges and the ssh-rsa and ssh-dss host keys, so on it
+    'legacy-ios' and the fallbacks of 'compatible' are partly unavailable.
+
+    Args:
+        name (str): Profile name, or None for the default profile.
+
+    Returns:
+        dict: Missing algorithms keyed by 'kex', 'ciphers', 'macs' and 'keys'; kinds with none missing are left out.
+    """
+    profile = get_profile(name)
+    missing = {}
+    for kind in _ALGORITHM_TABLES:
+        implemented = _implemented(kind)
+        absent = [algorithm for algorithm in profile[kind] if algorithm not in implemented]
+        if absent:
+            missing[kind] = absent
+    return missing
+
+
+def connect_kwargs(name):
+    """
+    Return SSHClient.connect() keyword arguments that apply a crypto profile to that connection only.
+
+    Algorithms outside the profile are passed as disabled_algorithms. Where paramiko supports
+    a transport_factory (3.2 and later), the profile's preference order is also set on the new
+    transport's security options. Older versions keep paramiko's own order, which already
+    lists modern algorithms first. paramiko.Transport class attributes are never modified, so
+    concurrent connections with different profiles do not affect each other.
+
+    Profile algorithms the installed paramiko does not implement are reported once per process
+    with a warning, since devices that need them will fail to negotiate.
+
+    Args:
+        name (str): Profile name, or None for the default profile.
+
+    Returns:
+        dict: Keyword arguments for SSHClient.connect().
+
+    Raises:
+        ValueError: If paramiko implements none of the profile's algorithms of some kind.
+    """
+    profile = get_profile(name)
+    name = name or DEFAULT_CRYPTO_PROFILE
+    disabled = {}
+    order = {}
+    for kind in _ALGORITHM_TABLES:
+        implemented = _implemented(kind)
+        wanted = tuple(algorithm for algorithm in profile[kind] if algorithm in implemented)
+        if not wanted:
+            raise ValueError(f"Crypto profile '{name}' cannot be used with paramiko {paramiko.__version__}: "
+                             f"none of its {kind} algorithms are implemented")
+        disabled[kind] = [algorithm for algorithm in implemented if algorithm not in wanted]
+        order[kind] = wanted
+
+    missing = unavailable_algorithms(name)
+    if missing and name not in _warned_profiles:
+        _warned_profiles.add(name)
+        listed = '; '.join(f"{kind} {', '.join(algorithms)}" for kind, algorithms in missing.items())
+        print(f"WARNING: crypto profile '{name}': paramiko {paramiko.__version__} does not implement {listed}. "
+              f"Devices that only offer these will fail to connect.")
+
+    kwargs = {'disabled_algorithms': disabled}
+    if 'transport_factory' in inspect.signature(paramiko.SSHClient.connect).parameters:
+        kwargs['transport_factory'] = _transport_factory(order)
+    return kwargs
+
+
+def _transport_factory(order):
+    def factory(sock, **kwargs):
+        transport = paramiko.Transport(sock, **kwargs)
+        options = transport.get_security_options()
+        for kind, algorithms in order.items():
+            setattr(options, _SECURITY_OPTIONS[kind], algorithms)
+        return transport
+
+    return factory
+
+
+def negotiated_algorithms(transport):
+    """
+    Report the algorithms a connected transport agreed on with the server.
+
+    Args:
+        transport (paramiko.Transport): An active transport.
+
+    Returns:
+        dict: kex, cipher, mac and host_key names; a value is None if paramiko did not record it.
+    """
+    if transport is None:
+        return {}
+    engine = getattr(transport, 'kex_engine', None)
+    kex = getattr(engine, 'name', None)
+    if kex is None and engine is not None:
+        kex = next((name for name in transport.preferred_kex
+                    if isinstance(engine, _implemented('kex').get(name, ()))), None)
+    return {
+        'kex': kex,
+        'cipher': getattr(transport, 'remote_cipher', None) or None,
+        'mac': getattr(transport, 'remote_mac', None) or None,
+        'host_key': getattr(transport, 'host_key_type', None),
+    }
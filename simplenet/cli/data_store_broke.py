@@ -1,5 +1,6 @@
 import json
 import logging
+from collections import namedtuple
 
 from PyQt6.QtCore import pyqtSignal, QObject
 
@@ -101,8 +102,29 @@ class SessionBasedDataStore:
         return var_fetch
 
 
+class DataStoreChange(namedtuple('DataStoreChange', ['device', 'path', 'action_index', 'key', 'value'])):
+    """
+    A single change to the data store.
+
+    Attributes:
+        device (str): Device whose session changed.
+        path (str): TTP path, or 'action_variables', 'command_results' or 'audit_report'.
+        action_index (int): Index of the action that produced the data, or None.
+        key (str): Variable name for 'action_variables', otherwise None.
+        value: The new value. It is shared with the store and must not be modified.
+    """
+    __slots__ = ()
+
+    def to_json(self, indent=2):
+        """Serialize the change, including only the changed value."""
+        return json.dumps(self._asdict(), indent=indent, default=str)
+
+
 class GlobalDataStoreWrapper(QObject):
+    # Legacy notification carrying a JSON document, emitted only while something is connected
     signal_global_data_updated = pyqtSignal(str)
+    # Fine-grained notification carrying a DataStoreChange
+    signal_data_changed = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()  # Ensure QObject is initialized
@@ -136,11 +158,59 @@ class GlobalDataStoreWrapper(QObject):
         """
         return self.toDict().items()
 
+    def has_subscribers(self, signal=None):
+        """
+        Check whether anything is connected to a signal.
+
+        Args:
+            signal: Bound signal to check [default=signal_data_changed].
+
+        Returns:
+            bool: True if the signal has at least one receiver.
+        """
+        if signal is None:
+            signal = self.signal_data_changed
+        return self.receivers(signal) > 0
+
+    def _publish_change(self, device_name, path, action_index=None, key=None, value=None):
+        if self.has_subscribers():
+            self.signal_data_changed.emit(DataStoreChange(device_name, path, action_index, key, value))
+
+    def emit_data_updated(self, data):
+        """
+        Emit signal_global_data_updated with data as JSON, serializing it only if something is connected.
+
+        Args:
+            data: JSON-serializable data to send.
+
+        Returns:
+            bool: True if the signal was emitted.
+        """
+        if not self.has_subscribers(self.signal_global_data_updated):
+            return False
+        self.signal_global_data_updated.emit(json.dumps(data, indent=2))
+        return True
+
+    def publish_snapshot(self):
+        """
+        Emit the whole store on signal_global_data_updated.
+
+        Listeners of signal_data_changed already received every change made through this
+        wrapper; the snapshot is only serialized for code still connected to the legacy signal.
+        It is sent after every publishing action, since handlers may also change the data
+        returned by get_device_data() or session_store in place.
+
+        Returns:
+            bool: True if a snapshot was emitted.
+        """
+        return self.emit_data_updated(self.get_all_data())
+
     def update(self, device_name, ttp_path, action_index, parsed_data):
         if debug:
             logging.debug(
                 f"Updating data for device: {device_name}, ttp_path: {ttp_path}, action_index: {action_index}")
         self.session_store.update(device_name, ttp_path, action_index, parsed_data)
+        self._publish_change(device_name, ttp_path, action_index, value=parsed_data)
 
         session = self.session_store.get_or_create_session(device_name)
         if debug:
@@ -172,10 +242,12 @@ class GlobalDataStoreWrapper(QObject):
         session = self.session_store.get_or_create_session(device_name)
         if 'command_results' not in session.data:
             session.data['command_results'] = []
-        session.data['command_results'].append({
+        result = {
             'command': command,
             'output': output
-        })
+        }
+        session.data['command_results'].append(result)
+        self._publish_change(device_name, 'command_results', value=result)
         if debug:
             logging.debug(f"Command result added for {device_name}")
 
@@ -224,7 +296,8 @@ class GlobalDataStoreWrapper(QObject):
         if debug:
             logging.debug(f"Adding audit report for current device: {self.current_device}")
         self.session_store.add_audit_report(self.current_device, audit_result)
-        self.signal_global_data_updated.emit(json.dumps(audit_result, indent=2))
+        self._publish_change(self.current_device, 'audit_report', value=audit_result)
+        self.emit_data_updated(audit_result)
 
     def get_audit_report(self, device_name=None):
         """
@@ -259,6 +332,7 @@ class GlobalDataStoreWrapper(QObject):
 
         # Store the variable in the device session
         self.session_store.set_variable(self.current_device, variable_name, value)
+        self._publish_change(self.current_device, 'action_variables', key=variable_name, value=value)
 
         if debug:
             logging.debug(f"Set variable '{variable_name}' with value: {value} for device {self.current_device}.")
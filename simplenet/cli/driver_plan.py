@@ -0,0 +1,524 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+from collections import namedtuple
+from types import MappingProxyType
+
+import jmespath
+from colorama import Fore
+from jinja2 import Template
+from ruamel.yaml import YAML as yaml
+
+from simplenet.cli import events
+from simplenet.cli.lib.audit_actions import print_pretty, handle_audit_action, handle_print_audit_action
+from simplenet.cli.lib.audit_loop_actions import handle_audit_action_loop
+from simplenet.cli.lib.config_actions import execute_send_config
+from simplenet.cli.lib.handle_restapi import handle_rest_api_action
+from simplenet.cli.lib.handle_restapi_loop import handle_rest_api_loop
+from simplenet.cli.lib.handle_send_config_loop import handle_send_config_loop
+from simplenet.cli.lib import ttp_cache
+from simplenet.cli.lib.query_cache import compile_query
+from simplenet.cli.lib.send_command_loop_actions import handle_send_command_loop
+from simplenet.cli.lib.send_commands_action import handle_send_command_action
+from simplenet.cli.lib.utils import check_run_if_condition, resolve_action_vars, resolve_template_vars
+from simplenet.gui.action_schema import schema as ACTION_SCHEMA
+
+debug_output = True
+
+# Action name -> ActionHandler, filled by register_action()
+ACTION_HANDLERS = {}
+
+ActionHandler = namedtuple('ActionHandler', 'func device_command publishes_store')
+
+# One validated action. action is a read-only copy of the driver's action; compiled holds the
+# templates, JMESPath expressions, loaded TTP templates and regexes prepared for it at compile time.
+PlanStep = namedtuple('PlanStep', 'index action_type display_name action handler run_if compiled')
+
+# A compiled driver. Plans are never modified after compile_driver(), so one plan can be
+# executed by any number of devices and threads.
+DriverPlan = namedtuple('DriverPlan', 'steps error_string transport_mode sentinel')
+
+# Markers of values that are filled in per device, which cannot be checked or compiled up front
+_TEMPLATE_MARKERS = ('{{', '{%', '{[', '[%', '[{')
+
+_SHELL_ACTIONS = ('send_command', 'send_command_loop')
+
+_CONDITION_TYPES = ('pass_if', 'pass_if_not', 'fail_if', 'fail_if_not')
+
+
+class DriverCompileError(ValueError):
+    """Raised when a driver fails validation against the action schema."""
+
+
+def register_action(name, device_command=False, publishes_store=False):
+    """
+    Register the handler for an action type.
+
+    The handler is called as func(step, context) with a PlanStep and the device's
+    ExecutionContext.
+
+    Args:
+        name (str): Value of the action's 'action' field.
+        device_command (bool): The action talks to the device and is skipped once the device stopped accepting commands.
+        publishes_store (bool): Publish a snapshot of the data store to legacy listeners after the action runs.
+    """
+    def decorator(func):
+        ACTION_HANDLERS[name] = ActionHandler(func, device_command, publishes_store)
+        return func
+    return decorator
+
+
+class ExecutionContext:
+    """Mutable per-device state threaded through the steps of a plan."""
+
+    def __init__(self, ssh_connection, variables, inter_command_time, log_file, error_string, prompt,
+                 global_prompt_count, global_data_store, pretty=False, timestamps=False, global_audit=None,
+                 automation_wrapper=None):
+        self.ssh_connection = ssh_connection
+        self.variables = variables
+        self.device_name = variables.get('hostname', 'not_provided')
+        self.inter_command_time = inter_command_time
+        self.log_file = log_file
+        self.error_string = error_string
+        self.prompt = prompt
+        self.global_prompt_count = global_prompt_count
+        self.global_data_store = global_data_store
+        self.pretty = pretty
+        self.timestamps = timestamps
+        self.global_audit = global_audit if global_audit is not None else {}
+        self.automation_wrapper = automation_wrapper
+        self.global_output = ""
+        self.stop_device_commands = False
+        self.resolved_vars = {}
+
+
+def _is_templated(value):
+    return isinstance(value, str) and any(marker in value for marker in _TEMPLATE_MARKERS)
+
+
+def _plain(value):
+    """Copy ruamel containers into plain dicts and lists, so the plan owns its data."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _compile_jmespath(expression, where):
+    try:
+        return compile_query(str(expression))
+    except jmespath.exceptions.JMESPathError as e:
+        raise DriverCompileError(f"{where}: invalid JMESPath expression '{expression}': {e}")
+
+
+def _check_query(expression, where):
+    if isinstance(expression, str) and expression.strip() and not _is_templated(expression):
+        _compile_jmespath(expression, where)
+
+
+def _load_ttp_template(ttp_path, where, compiled, key):
+    try:
+        compiled[key] = ttp_cache.load_template(ttp_path)
+    except OSError as e:
+        # Left to the handler, which reports it if the action ever parses output
+        print(f"WARNING: {where}: cannot read TTP template '{ttp_path}': {e}")
+
+
+def _validate_fields(action, action_type, where):
+    fields = ACTION_SCHEMA['actions'].get(action_type, {}).get('fields', [])
+    for field in fields:
+        name = field['name']
+        if name not in action:
+            if field.get('required'):
+                raise DriverCompileError(f"{where}: missing required field '{name}' for action '{action_type}'")
+            continue
+        value = action[name]
+        if value is None or _is_templated(value):
+            continue
+        if field.get('type') == 'choice' and field.get('choices') and value not in field['choices']:
+            raise DriverCompileError(f"{where}: '{name}' must be one of {field['choices']}, not '{value}'")
+        if field.get('type') == 'number' and value != '':
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                raise DriverCompileError(f"{where}: '{name}' must be a number, not '{value}'")
+
+
+def _precompile(action, where):
+    """Prepare everything in an action that does not change from one device to the next."""
+    compiled = {}
+
+    # For shell commands expect is literal prompt text; for REST actions it is an HTTP status
+    expect = action.get('expect')
+    if action.get('action') in _SHELL_ACTIONS and isinstance(expect, str) and expect and not _is_templated(expect):
+        compiled['expect'] = re.compile(re.escape(expect))
+
+    ttp_path = action.get('ttp_path')
+    if ttp_path and not _is_templated(ttp_path):
+        _load_ttp_template(ttp_path, where, compiled, 'ttp_template')
+
+    store_query = action.get('store_query')
+    if isinstance(store_query, dict) and store_query.get('query') and not _is_templated(store_query['query']):
+        compiled['store_query'] = _compile_jmespath(store_query['query'], where)
+
+    named_list = action.get('use_named_list')
+    if isinstance(named_list, dict):
+        named_ttp_path = named_list.get('ttp_path')
+        if named_ttp_path and not _is_templated(named_ttp_path):
+            _load_ttp_template(named_ttp_path, where, compiled, 'named_list_ttp_template')
+        named_query = (named_list.get('store_query') or {}).get('query')
+        if named_query and not _is_templated(named_query):
+            compiled['named_list_store_query'] = _compile_jmespath(named_query, where)
+
+    # Queries evaluated while the action runs are parsed now, so a bad one fails the driver up front.
+    # The compiled forms stay in the shared query cache for the handlers.
+    run_if = action.get('run_if')
+    if isinstance(run_if, dict) and run_if.get('check_type') == 'jmespath':
+        _check_query(run_if.get('query'), f"{where} run_if")
+    for condition_type in _CONDITION_TYPES:
+        conditions = action.get(condition_type)
+        if isinstance(conditions, list):
+            for condition in conditions:
+                if isinstance(condition, dict) and condition.get('check_type') in (None, '', 'jmespath'):
+                    _check_query(condition.get('query'), f"{where} {condition_type}")
+    use_condition = action.get('use_condition')
+    if isinstance(use_condition, dict):
+        _check_query(use_condition.get('condition_query'), f"{where} use_condition")
+
+    action_vars = action.get('action_vars')
+    if action_vars:
+        compiled['action_vars'] = {key: _compile_jmespath(query, where)
+                                   for var in action_vars for key, query in var.items()}
+
+    if action.get('action') == 'send_config' and action.get('config'):
+        config = action['config'].replace("{[", "{{").replace("]}", "}}")
+        # None marks a static config that needs no rendering
+        compiled['config_template'] = Template(config) if any(m in config for m in ('{{', '{%', '{#')) else None
+
+    return MappingProxyType(compiled)
+
+
+def compile_actions(actions, driver_name=None, strict=False):
+    """
+    Validate a list of driver actions and resolve each one to its handler.
+
+    An action type without a handler is skipped with a warning, as drivers with custom or
+    unsupported actions have always run their other actions. With strict=True it is an error.
+
+    Args:
+        actions (list): The driver's actions.
+        driver_name (str): Driver name used in error messages.
+        strict (bool): Raise for action types that have no handler.
+
+    Returns:
+        tuple: PlanStep objects in driver order.
+
+    Raises:
+        DriverCompileError: If an action has no 'action' field, misses a required field, has an
+            invalid value, or contains a JMESPath expression that does not compile; with strict,
+            also if an action has no handler.
+    """
+    steps = []
+    for index, action in enumerate(actions or []):
+        where = f"drivers.{driver_name}.actions[{index}]" if driver_name else f"actions[{index}]"
+        if not isinstance(action, dict) or not action.get('action'):
+            raise DriverCompileError(f"{where}: 'action' field is missing")
+        action_type = action['action']
+        handler = ACTION_HANDLERS.get(action_type)
+        if handler is None:
+            if strict:
+                raise DriverCompileError(f"{where}: unknown action type '{action_type}'")
+            print(f"WARNING: {where}: unknown action type '{action_type}', skipping it")
+            continue
+        action = _plain(action)
+        _validate_fields(action, action_type, where)
+
+        run_if = action.get('run_if')
+        if not isinstance(run_if, dict) or run_if.get('check_type') in (None, ""):
+            run_if = None
+        steps.append(PlanStep(index, action_type, action.get('display_name'), MappingProxyType(action), handler,
+                              run_if, _precompile(action, where)))
+    return tuple(steps)
+
+
+def compile_driver(driver_config, driver_name=None, strict=False):
+    """
+    Compile one driver (the value under drivers.<name>) into an execution plan.
+
+    Args:
+        driver_config (dict): Driver configuration with its 'actions' list.
+        driver_name (str): Driver name used in error messages.
+        strict (bool): Reject action types that have no handler instead of skipping them.
+
+    Returns:
+        DriverPlan: The compiled plan.
+
+    Raises:
+        DriverCompileError: If the driver is invalid.
+    """
+    if not isinstance(driver_config, dict) or 'actions' not in driver_config:
+        raise DriverCompileError(f"Driver '{driver_name}' has no 'actions' list")
+    return DriverPlan(compile_actions(driver_config['actions'], driver_name, strict),
+                      driver_config.get('error_string', ''), driver_config.get('transport_mode', 'shell'),
+                      driver_config.get('sentinel'))
+
+
+def execute_plan(plan_steps, context):
+    """
+    Run compiled steps for one device.
+
+    Args:
+        plan_steps (tuple): PlanStep objects, e.g. DriverPlan.steps.
+        context (ExecutionContext): The device's state.
+
+    Returns:
+        bool: True if the device stopped early because the prompt count was reached.
+    """
+    global_data_store = context.global_data_store
+    stopped_on_prompt_count = False
+    action_tracker = events.ActionTracker()
+
+    for step in plan_steps:
+        action_tracker.finish()
+        if debug_output:
+            print(dict(step.action))
+            print(global_data_store.get_all_data())
+
+        if step.run_if is not None:
+            audit_context = {
+                'global_data_store': global_data_store,
+                'current_device_name': context.variables['hostname'],
+                'all_devices': global_data_store.get_all_data(),
+                'current_device': global_data_store.get_device_data(context.variables['hostname'])
+            }
+            if not check_run_if_condition(audit_context, step.run_if):
+                print_pretty(context.pretty, context.timestamps,
+                             f"Skipping action {step.action_type} due to run_if condition.", Fore.YELLOW)
+                continue
+
+        if context.global_prompt_count[0] >= context.global_prompt_count[1]:
+            print_pretty(context.pretty, context.timestamps, "Prompt count reached, stopping device command execution.",
+                         Fore.YELLOW)
+            context.stop_device_commands = True
+            stopped_on_prompt_count = True
+            break
+
+        if step.handler.device_command and context.stop_device_commands:
+            continue
+        action_tracker.start(step.index, step.action_type, step.display_name)
+        step.handler.func(step, context)
+        if step.handler.publishes_store:
+            global_data_store.publish_snapshot()
+
+    action_tracker.finish()
+    return stopped_on_prompt_count
+
+
+@register_action('sleep')
+def _run_sleep(step, context):
+    sleep_seconds = step.action.get('seconds', 1)
+    print_pretty(context.pretty, context.timestamps, f"Sleeping for {sleep_seconds} seconds.", Fore.CYAN)
+    time.sleep(sleep_seconds)
+
+
+@register_action('python_script')
+def _run_python_script(step, context):
+    action = step.action
+    pretty, timestamps = context.pretty, context.timestamps
+
+    # Use sys.executable if use_parent_path is True, to use the same venv as the main app
+    if action.get('use_parent_path', False):
+        path_to_python = sys.executable
+    else:
+        path_to_python = action.get('path_to_python')
+
+    path_to_script = action.get('path_to_script')
+    arguments_string = action.get('arguments_string', '')
+    log_file = action.get('log_file')
+
+    # Check for missing required fields
+    if not path_to_python or not path_to_script:
+        print_pretty(pretty, timestamps, "ERROR: Missing path_to_python or path_to_script.", Fore.RED)
+        return
+
+    if not log_file:
+        print_pretty(pretty, timestamps, "ERROR: log_file is missing.", Fore.RED)
+        return
+
+    # Construct command to execute
+    command = [path_to_python, path_to_script] + arguments_string.split()
+    print_pretty(pretty, timestamps, f"Executing Python script: {' '.join(command)}", Fore.CYAN)
+
+    try:
+        # Run the subprocess and capture both stdout and stderr
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+
+        print_pretty(pretty, timestamps, f"Script output: {result.stdout}", Fore.GREEN)
+        print_pretty(pretty, timestamps, f"Script errors: {result.stderr}", Fore.RED)
+
+        # Write the output and errors to the log file
+        with open(log_file, 'a') as f:
+            f.write(f"Script output: {result.stdout}\n")
+            f.write(f"Script errors: {result.stderr}\n")
+            f.flush()
+
+    except subprocess.CalledProcessError as e:
+        print_pretty(pretty, timestamps, f"Script execution failed with error: {e}", Fore.RED)
+        if e.stderr:
+            print_pretty(pretty, timestamps, f"Script stderr: {e.stderr}", Fore.RED)
+
+        with open(log_file, 'a') as f:
+            f.write(f"Script execution failed with error: {e}\n")
+            if e.stderr:
+                f.write(f"Script stderr: {e.stderr}\n")
+            f.flush()
+
+
+@register_action('send_config', device_command=True)
+def _run_send_config(step, context):
+    context.resolved_vars = resolve_action_vars(step.action, context.global_data_store.get_all_data(),
+                                                queries=step.compiled.get('action_vars'))
+    execute_send_config(context.ssh_connection, step.action, context.resolved_vars, context.log_file, context.prompt,
+                        context.pretty, context.timestamps, context.stop_device_commands, context.global_output,
+                        context.global_prompt_count, context.inter_command_time, error_string=context.error_string,
+                        compiled=step.compiled)
+
+
+@register_action('send_config_loop', device_command=True, publishes_store=True)
+def _run_send_config_loop(step, context):
+    context.global_output, context.stop_device_commands = handle_send_config_loop(
+        step.index, context.ssh_connection, step.action, context.resolved_vars, context.log_file, context.prompt,
+        context.pretty, context.timestamps, context.stop_device_commands, context.global_output,
+        context.global_prompt_count, context.inter_command_time, context.error_string, context.device_name,
+        context.global_data_store, debug_output
+    )
+
+
+@register_action('rest_api', device_command=True, publishes_store=True)
+def _run_rest_api(step, context):
+    context.global_output, context.stop_device_commands = handle_rest_api_action(
+        step.action, context.resolved_vars, context.log_file, context.pretty, context.timestamps,
+        context.stop_device_commands, context.global_output, context.error_string, context.global_data_store,
+        debug_output
+    )
+
+
+@register_action('rest_api_loop', device_command=True, publishes_store=True)
+def _run_rest_api_loop(step, context):
+    context.global_output, context.stop_device_commands = handle_rest_api_loop(
+        step.index, step.action, context.resolved_vars, context.log_file, context.pretty, context.timestamps,
+        context.stop_device_commands, context.global_output, context.global_prompt_count,
+        context.inter_command_time, context.error_string, context.device_name, context.global_data_store,
+        debug_output
+    )
+
+
+@register_action('send_command', device_command=True, publishes_store=True)
+def _run_send_command(step, context):
+    context.global_output, context.stop_device_commands = handle_send_command_action(
+        step.index, context.ssh_connection, step.action, context.resolved_vars, context.log_file, context.prompt,
+        context.pretty, context.timestamps, context.stop_device_commands, context.global_output,
+        context.global_prompt_count, context.inter_command_time, context.error_string, context.device_name,
+        context.global_data_store, debug_output, compiled=step.compiled
+    )
+
+
+@register_action('send_command_loop', device_command=True, publishes_store=True)
+def _run_send_command_loop(step, context):
+    context.global_output, context.stop_device_commands = handle_send_command_loop(
+        step.index, context.ssh_connection, step.action, context.resolved_vars, context.log_file, context.prompt,
+        context.pretty, context.timestamps, context.stop_device_commands, context.global_output,
+        context.global_prompt_count, context.inter_command_time, context.error_string, context.device_name,
+        context.global_data_store, debug_output, compiled=step.compiled
+    )
+
+
+@register_action('audit')
+def _run_audit(step, context):
+    audit_result = handle_audit_action(step.action, context.global_data_store, context.global_audit,
+                                       context.pretty, context.timestamps)
+    # Emit signal to update the GUI
+    context.global_data_store.emit_data_updated(audit_result)
+    if context.automation_wrapper:
+        context.automation_wrapper.emit_audit_result(json.dumps(audit_result, indent=2))
+
+
+@register_action('audit_loop')
+def _run_audit_loop(step, context):
+    try:
+        handle_audit_action_loop(
+            action=step.action,
+            global_data_store=context.global_data_store,
+            global_audit=context.global_audit,
+            pretty=context.pretty,
+            timestamps=context.timestamps,
+            debug_output=debug_output,
+            variables=context.variables
+        )
+    except Exception as e:
+        print(f"Error executing handle_audit_action_loop {e}")
+        traceback.print_exc()
+        return
+    context.global_data_store.emit_data_updated(context.global_audit)
+    if context.automation_wrapper:
+        context.automation_wrapper.emit_audit_result(json.dumps(context.global_audit, indent=2))
+
+
+@register_action('print_audit')
+def _run_print_audit(step, context):
+    handle_print_audit_action(step.action, context.global_audit, context.pretty, context.timestamps)
+
+
+@register_action('dump_datastore')
+def _run_dump_datastore(step, context):
+    action = step.action
+    pretty, timestamps = context.pretty, context.timestamps
+    print("DEBUG: Processing 'dump_datastore' action")
+    format_type = action.get('format', 'json').lower()
+    raw_output_path = action.get('output_file_path', './output-tests/cdp_one_command_datastore_output.json')
+
+    # Resolve template variables in the output path
+    output_path = resolve_template_vars(raw_output_path, context.variables)
+    if not isinstance(output_path, str):
+        print_pretty(pretty, timestamps, f"Resolved output_path is not a string: {output_path}", Fore.RED)
+        return
+
+    output_as = action.get('output_as', 'json').lower()
+    output_mode = action.get('output_mode', 'w')
+
+    if debug_output:
+        print(f"DEBUG: Dumping datastore as {format_type} to {output_path}")
+
+    try:
+        data = context.global_data_store.get_all_data()
+
+        # Serialize data based on the specified format
+        if format_type == 'json':
+            serialized_data = json.dumps(data, indent=2)
+        elif format_type == 'yaml':
+            serialized_data = yaml.dump(data, sort_keys=False)
+        else:
+            print_pretty(pretty, timestamps, f"Unsupported format: {format_type}", Fore.RED)
+            return
+
+        # Ensure the output directory exists
+        output_dir = os.path.dirname(output_path)
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            print_pretty(pretty, timestamps, f"Created directory: {output_dir}", Fore.GREEN)
+
+        with open(output_path, output_mode) as f:
+            f.write(serialized_data)
+            print_pretty(pretty, timestamps, f"Datastore dumped to {output_path}", Fore.GREEN)
+
+        if output_as == 'both':
+            print_pretty(pretty, timestamps, serialized_data, Fore.BLUE)
+
+    except Exception as e:
+        print_pretty(pretty, timestamps, f"Failed to dump datastore: {e}", Fore.RED)
+        print(traceback.format_exc())
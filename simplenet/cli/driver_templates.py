@@ -0,0 +1,228 @@
+import os
+import threading
+
+from jinja2 import Template
+from ruamel.yaml import YAML
+
+from simplenet.cli.driver_plan import compile_driver
+
+# Jinja markers that make a driver value depend on the device's variables
+_JINJA_MARKERS = ('{{', '{%', '{#')
+
+# Process-wide caches, keyed by file path and validated against the file's mtime and size
+_cache_lock = threading.Lock()
+_driver_cache = {}  # path -> (mtime_ns, size, DriverTemplate)
+_vars_cache = {}  # path -> (mtime_ns, size, variables)
+_template_cache = {}  # template source -> jinja2.Template
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_yaml(text):
+    # The safe loader uses the C extension when available and skips round-trip bookkeeping
+    return YAML(typ='safe').load(text)
+
+
+def _is_jinja(value):
+    return isinstance(value, str) and any(marker in value for marker in _JINJA_MARKERS)
+
+
+def get_template(source):
+    """Return a compiled jinja2.Template for source, compiling each distinct source once per process."""
+    template = _template_cache.get(source)
+    if template is None:
+        # Keep a value's final newline (e.g. a '|' block scalar), as rendering the whole file before parsing did
+        template = Template(source, keep_trailing_newline=True)
+        with _cache_lock:
+            template = _template_cache.setdefault(source, template)
+    return template
+
+
+def _compile_node(node):
+    """
+    Build a renderer for a parsed YAML node.
+
+    Returns:
+        callable: Takes the variables and returns a rendered copy of node, or None if nothing
+            in node contains Jinja. Containers without Jinja are shared, not copied.
+    """
+    if isinstance(node, str):
+        if not _is_jinja(node):
+            return None
+        template = get_template(node)
+        return template.render
+
+    if isinstance(node, dict):
+        renderers = {}
+        for key, value in node.items():
+            renderer = _compile_node(value)
+            if renderer is not None:
+                renderers[key] = renderer
+        if not renderers:
+            return None
+
+        def render_dict(variables):
+            rendered = dict(node)
+            for key, renderer in renderers.items():
+                rendered[key] = renderer(variables)
+            return rendered
+        return render_dict
+
+    if isinstance(node, list):
+        renderers = []
+        for index, value in enumerate(node):
+            renderer = _compile_node(value)
+            if renderer is not None:
+                renderers.append((index, renderer))
+        if not renderers:
+            return None
+
+        def render_list(variables):
+            rendered = list(node)
+            for index, renderer in renderers:
+                rendered[index] = renderer(variables)
+            return rendered
+        return render_list
+
+    return None
+
+
+def _count_markers(node):
+    if isinstance(node, str):
+        return node.count('{{')
+    if isinstance(node, dict):
+        return sum(_count_markers(key) + _count_markers(value) for key, value in node.items())
+    if isinstance(node, list):
+        return sum(_count_markers(value) for value in node)
+    return 0
+
+
+class DriverTemplate:
+    """
+    A driver file parsed once and rendered per device.
+
+    When every Jinja expression in the file sits inside a YAML string value, only those values
+    are rendered for a device and the rest of the parsed driver is shared. Files that use Jinja
+    to build YAML structure ({% %} blocks, unquoted expressions, templated keys) are rendered
+    as a whole and parsed for every device, from a template compiled once.
+
+    Rendered drivers share unchanged parts with the template and must be treated as read-only.
+    """
+
+    def __init__(self, path, text):
+        """
+        Args:
+            path (str): Driver file path, used in messages.
+            text (str): Contents of the driver file.
+        """
+        self.path = path
+        self._data = None
+        self._renderer = None
+        self._file_template = None
+        self._plans = {}
+        self._plans_lock = threading.Lock()
+
+        data = None
+        if '{%' not in text and '{#' not in text:
+            try:
+                data = _load_yaml(text)
+            except Exception:
+                data = None
+        # Every '{{' must be inside a parsed value, otherwise Jinja shapes the YAML itself
+        if isinstance(data, dict) and _count_markers(data) == text.count('{{'):
+            self._data = data
+            self._renderer = _compile_node(data)
+        else:
+            self._file_template = get_template(text)
+
+    @property
+    def per_value(self):
+        """True if only the Jinja-bearing values are rendered per device."""
+        return self._data is not None
+
+    def render(self, variables):
+        """
+        Render the driver for one device.
+
+        Args:
+            variables (dict): Template variables, including hostname and mgmt_ip.
+
+        Returns:
+            dict: The rendered driver document.
+        """
+        if self._data is None:
+            return _load_yaml(self._file_template.render(variables))
+        if self._renderer is None:
+            return self._data
+        return self._renderer(variables)
+
+    def plan(self, driver_name, driver_config, strict=False):
+        """
+        Compile a rendered driver into a DriverPlan, reusing the plan when the driver has no Jinja.
+
+        Args:
+            driver_name (str): Name of the driver under 'drivers'.
+            driver_config (dict): The driver as returned in render()['drivers'][driver_name].
+            strict (bool): Reject unknown action types; a strict check is never served from the cache.
+
+        Returns:
+            DriverPlan: The compiled plan.
+
+        Raises:
+            DriverCompileError: If the driver is invalid.
+        """
+        static = self._data is not None and driver_config is (self._data.get('drivers') or {}).get(driver_name)
+        if strict or not static:
+            return compile_driver(driver_config, driver_name, strict)
+        with self._plans_lock:
+            plan = self._plans.get(driver_name)
+            if plan is None:
+                plan = self._plans[driver_name] = compile_driver(driver_config, driver_name)
+            return plan
+
+
+def get_driver_template(driver_file):
+    """
+    Return the parsed driver template for a file, re-reading it only when it changed on disk.
+
+    Args:
+        driver_file (str): Path to the driver YAML file.
+
+    Returns:
+        DriverTemplate: The cached template.
+    """
+    version = _file_version(driver_file)
+    cached = _driver_cache.get(driver_file)
+    if cached is not None and cached[:2] == version:
+        return cached[2]
+    with open(driver_file, 'r') as f:
+        driver_template = DriverTemplate(driver_file, f.read())
+    with _cache_lock:
+        _driver_cache[driver_file] = version + (driver_template,)
+    return driver_template
+
+
+def load_variables(vars_file):
+    """
+    Load a variables YAML file, re-reading it only when it changed on disk.
+
+    Args:
+        vars_file (str): Path to the variables file, or None.
+
+    Returns:
+        dict: The variables, shared between callers; copy before modifying.
+    """
+    if not vars_file:
+        return {}
+    version = _file_version(vars_file)
+    cached = _vars_cache.get(vars_file)
+    if cached is not None and cached[:2] == version:
+        return cached[2]
+    with open(vars_file, 'r') as f:
+        variables = _load_yaml(f) or {}
+    with _cache_lock:
+        _vars_cache[vars_file] = version + (variables,)
+    return variables
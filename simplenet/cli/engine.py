@@ -0,0 +1,272 @@
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from simplenet.cli import events, metrics
+
+# Sentinel placed on the task queue to tell a worker thread to exit
+_STOP = None
+
+
+def run_device_inprocess(row, db_file, driver, vars_file, driver_name, options, local):
+    """
+    Run the automation for a single device inside the current worker process.
+
+    Args:
+        row (dict): Device row already fetched by the runner's inventory query.
+        db_file (str): Path to the SQLite inventory database (used for credential lookups).
+        driver (str): Path to the driver YAML file.
+        vars_file (str): Path to the variables YAML file, or None.
+        driver_name (str): Name of the driver to execute.
+        options (dict): Keyword options passed through to run_automation_for_device.
+        local (threading.local): Per-thread storage holding the thread's SQLite connection.
+
+    Returns:
+        dict: Result record with hostname, mgmt_ip, status, exit_code and duration.
+    """
+    # Imported here so the parent runner never pays for PyQt6/ttp/jinja2 imports
+    from simplenet.cli.simplenet import run_automation_for_device
+    from simplenet.cli.data_store_broke import GlobalDataStoreWrapper as GlobalDataStore
+
+    hostname = row['hostname']
+    result = {'hostname': hostname, 'mgmt_ip': row['mgmt_ip'], 'status': 'failed', 'exit_code': 1}
+    start = time.perf_counter()
+
+    # sqlite3 connections may not be shared between threads, so each worker thread keeps its own
+    db_conn = getattr(local, 'db_conn', None)
+    if db_conn is None:
+        db_conn = sqlite3.connect(db_file)
+        db_conn.row_factory = sqlite3.Row
+        local.db_conn = db_conn
+
+    try:
+        # A fresh data store per device keeps current_device state from leaking between threads
+        completed = run_automation_for_device(row, driver, vars_file, driver_name,
+                                              db_conn=db_conn,
+                                              global_data_store=GlobalDataStore(),
+                                              **options)
+        if completed:
+            result['status'] = 'completed'
+            result['exit_code'] = 0
+    except Exception as e:
+        print(f"Error during in-process execution for device {hostname}: {str(e)}")
+        traceback.print_exc()
+
+    result['duration'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _worker_thread(task_queue, result_queue, job, local, running, slot):
+    """
+    Pull device rows off the shared task queue until a stop sentinel arrives.
+
+    The id of each task taken is written to running[slot] before the device runs. Shared
+    memory is written immediately, unlike a queue message, so the parent knows which device
+    to fail if this process is killed.
+    """
+    from simplenet.cli.runner import probe_ssh_port
+
+    while True:
+        task = task_queue.get()
+        if task is _STOP:
+            break
+        task_id, row = task
+        running[slot] = task_id
+        probe_error = None
+        if job.get('check_reachability'):
+            with metrics.timed('tcp_probe', device=row['hostname']):
+                probe_error = probe_ssh_port(row['mgmt_ip'])
+        if probe_error:
+            events.emit('failed', device=row['hostname'], reason='unreachable', error_type=probe_error)
+            result_queue.put((task_id, {'hostname': row['hostname'], 'mgmt_ip': row['mgmt_ip'],
+                                        'status': 'unreachable', 'exit_code': None}))
+            continue
+        result = run_device_inprocess(row, job['db_file'], job['driver'], job['vars_file'],
+                                      job['driver_name'], job['options'], local)
+        result_queue.put((task_id, result))
+
+
+def _worker_process(task_queue, result_queue, threads_per_process, job, event_queue=None, running=None, first_slot=0):
+    """
+    Entry point of a long-lived worker process.
+
+    Imports the automation stack once and then runs a pool of threads, each handling one
+    device session at a time. Progress events are sent to event_queue when one is given.
+    Thread n records the task it is running in running[first_slot + n].
+    """
+    import simplenet.cli.simplenet  # noqa: F401  (warm the import once per process)
+    from simplenet.cli.ssh_pool import close_pool
+
+    events.set_queue_sink(event_queue)
+    if job.get('quiet'):
+        # Progress is reported through events; skip writing per-device console output
+        sys.stdout = open(os.devnull, 'w')
+
+    threads = []
+    for index in range(threads_per_process):
+        local = threading.local()
+        thread = threading.Thread(target=_worker_thread,
+                                  args=(task_queue, result_queue, job, local, running, first_slot + index),
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    # Log out of sessions kept for reuse_connections
+    close_pool()
+
+
+class InProcessEngine:
+    """
+    Runs device automations inside a small set of long-lived worker processes.
+
+    Each process imports simplenet once and services devices from a shared task queue with a
+    pool of threads, so the per-device cost is the SSH session itself rather than interpreter
+    startup and module imports. The engine exposes a submit() method returning a
+    concurrent.futures.Future, which lets the runner treat it like any other executor.
+    """
+
+    def __init__(self, num_processes, threads_per_process, job, event_queue=None):
+        """
+        Args:
+            num_processes (int): Number of worker processes to start.
+            threads_per_process (int): Number of concurrent device sessions per process.
+            job (dict): Job definition (db_file, driver, vars_file, driver_name, options).
+            event_queue (multiprocessing.Queue): Destination for device progress events, or None.
+        """
+        self.num_processes = num_processes
+        self.threads_per_process = threads_per_process
+        self.job = job
+        self.event_queue = event_queue
+        self._task_queue = multiprocessing.Queue()
+        self._result_queue = multiprocessing.Queue()
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+        # Task id each worker thread took last, one slot per thread; -1 until it takes one
+        self._running = multiprocessing.RawArray('q', [-1] * self.capacity)
+        self._reaped = set()  # indexes of worker processes whose exit was handled
+        self._next_task_id = 0
+        self._processes = []
+        self._collector = None
+        self._closing = False
+
+    @property
+    def capacity(self):
+        """Total number of device sessions the engine can run at once."""
+        return self.num_processes * self.threads_per_process
+
+    def start(self):
+        for index in range(self.num_processes):
+            process = multiprocessing.Process(target=_worker_process,
+                                              args=(self._task_queue, self._result_queue,
+                                                    self.threads_per_process, self.job, self.event_queue,
+                                                    self._running, index * self.threads_per_process),
+                                              daemon=True)
+            process.start()
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        return self
+
+    def submit(self, row):
+        """
+        Queue a device row for execution.
+
+        Args:
+            row (dict): Device row from the inventory query.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the device result record.
+        """
+        future = Future()
+        with self._futures_lock:
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            self._futures[task_id] = future
+        self._task_queue.put((task_id, dict(row)))
+        return future
+
+    def _collect_results(self):
+        """
+        Resolve futures as results arrive.
+
+        When a worker process dies, the devices it was running fail at once and the other
+        processes keep serving the queue. If every process is gone, all pending devices fail.
+        """
+        last_check = time.monotonic()
+        while True:
+            try:
+                self._resolve(*self._result_queue.get(timeout=1))
+            except queue.Empty:
+                if self._closing and not self._futures:
+                    return
+            if time.monotonic() - last_check < 1:
+                continue
+            last_check = time.monotonic()
+            self._reap_dead_processes()
+            if self._processes and not any(p.is_alive() for p in self._processes):
+                self._fail_pending(RuntimeError("All in-process workers exited unexpectedly"))
+                return
+
+    def _resolve(self, task_id, result):
+        with self._futures_lock:
+            future = self._futures.pop(task_id, None)
+        if future is not None:
+            future.set_result(result)
+
+    def _reap_dead_processes(self):
+        """Fail the devices that were running in worker processes that exited, e.g. killed for memory."""
+        dead = [index for index, process in enumerate(self._processes)
+                if index not in self._reaped and not process.is_alive()]
+        if not dead:
+            return
+        # Results a process sent before it died still count
+        while True:
+            try:
+                self._resolve(*self._result_queue.get_nowait())
+            except queue.Empty:
+                break
+        for index in dead:
+            self._reaped.add(index)
+            process = self._processes[index]
+            first_slot = index * self.threads_per_process
+            error = RuntimeError(f"Worker process {process.pid} exited with code {process.exitcode}")
+            with self._futures_lock:
+                # A slot still holds a finished task whose result was already handled; that one is skipped
+                lost = [self._futures.pop(task_id) for task_id in
+                        self._running[first_slot:first_slot + self.threads_per_process] if task_id in self._futures]
+            if lost:
+                print(f"{error}; failing {len(lost)} devices it was running")
+            for future in lost:
+                future.set_exception(error)
+
+    def _fail_pending(self, error):
+        with self._futures_lock:
+            pending = list(self._futures.values())
+            self._futures.clear()
+        for future in pending:
+            future.set_exception(error)
+
+    def shutdown(self):
+        """Stop all worker threads and processes once queued work has drained."""
+        self._closing = True
+        for _ in range(self.capacity):
+            self._task_queue.put(_STOP)
+        for process in self._processes:
+            process.join()
+        if self._collector:
+            self._collector.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Prefix marking event lines in a child process's stdout, so events and console output can share the pipe
+EVENT_PREFIX = '@@simplenet-event@@ '
+
+EVENT_TYPES = ('connected', 'action_started', 'action_finished', 'parsed_records', 'audit_result', 'failed', 'metric')
+
+# Process-wide destination for events: a callable taking an event dict, or None when events are disabled
+_sink = None
+_local = threading.local()
+
+
+def set_sink(sink):
+    """Send all events emitted in this process to sink, a callable taking one event dict."""
+    global _sink
+    _sink = sink
+
+
+def set_queue_sink(event_queue):
+    """Send events to a multiprocessing queue. Used as a worker process initializer."""
+    set_sink(event_queue.put if event_queue is not None else None)
+
+
+def set_stream_sink(stream):
+    """Write events to a text stream as prefixed NDJSON lines (used by the single-device CLI)."""
+    lock = threading.Lock()
+
+    def write(event):
+        line = EVENT_PREFIX + json.dumps(event, default=str) + '\n'
+        with lock:
+            stream.write(line)
+            stream.flush()
+
+    set_sink(write)
+
+
+def set_device(hostname):
+    """Set the device that events emitted from the current thread belong to."""
+    _local.device = hostname
+
+
+def get_device():
+    """Return the device set for the current thread, or None."""
+    return getattr(_local, 'device', None)
+
+
+def emit(event_type, device=None, **fields):
+    """
+    Emit a typed event for the current device.
+
+    Args:
+        event_type (str): One of EVENT_TYPES.
+        device (str): Device hostname [default=the device set for this thread].
+        **fields: Event-specific fields; must be JSON serializable.
+    """
+    if _sink is None:
+        return
+    event = {'type': event_type, 'ts': time.time(), 'device': device or getattr(_local, 'device', None)}
+    event.update(fields)
+    try:
+        _sink(event)
+    except Exception:
+        # Event delivery must never break a device run
+        pass
+
+
+def forward(event):
+    """Pass an already-built event (e.g. parsed from a child process) to this process's sink."""
+    if _sink is not None:
+        _sink(event)
+
+
+def count_records(parsed_data):
+    """Count the leaf records in a TTP result (nested lists of dicts or lists)."""
+    if isinstance(parsed_data, list):
+        return sum(count_records(item) for item in parsed_data)
+    if isinstance(parsed_data, dict):
+        return 1 if parsed_data else 0
+    return 0
+
+
+def parse_event_line(line):
+    """
+    Decode an event line written by set_stream_sink().
+
+    Returns:
+        dict: The event, or None if the line is ordinary console output.
+    """
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+
+
+class ActionTracker:
+    """Emits action_started/action_finished pairs for the driver's action loop."""
+
+    def __init__(self):
+        self._current = None
+
+    def start(self, index, action_type, display_name=None):
+        self.finish()
+        self._current = (index, action_type, display_name, time.perf_counter())
+        emit('action_started', index=index, action=action_type, display_name=display_name)
+
+    def finish(self):
+        if self._current is None:
+            return
+        index, action_type, display_name, start = self._current
+        self._current = None
+        emit('action_finished', index=index, action=action_type, display_name=display_name,
+             duration=round(time.perf_counter() - start, 3))
+
+
+class EventAggregator:
+    """
+    Collects events from all device workers into a run summary, optionally appending them to an NDJSON file.
+
+    Events arrive on a multiprocessing queue that is drained by a background thread.
+    """
+
+    def __init__(self, events_file=None, listeners=()):
+        """
+        Args:
+            events_file (str): Path of an NDJSON file to append every event to, or None.
+            listeners (iterable): Objects with a handle(event) method that also receive every event.
+        """
+        self._lock = threading.Lock()
+        self.listeners = list(listeners)
+        self._file = open(events_file, 'a') if events_file else None
+        self._thread = None
+        self._queue = None
+        self.counts = Counter()
+        self.connected = set()
+        self.action_durations = defaultdict(list)
+        self.parsed_records = 0
+        self.audits = Counter()
+        self.failures = Counter()
+
+    def handle(self, event):
+        with self._lock:
+            event_type = event.get('type')
+            self.counts[event_type] += 1
+            if event_type == 'connected':
+                self.connected.add(event.get('device'))
+            elif event_type == 'action_finished':
+                self.action_durations[event.get('action')].append(event.get('duration') or 0)
+            elif event_type == 'parsed_records':
+                self.parsed_records += event.get('records', 0)
+            elif event_type == 'audit_result':
+                self.audits[event.get('result')] += 1
+            elif event_type == 'failed':
+                self.failures[event.get('reason')] += 1
+
+            for listener in self.listeners:
+                listener.handle(event)
+
+            if self._file:
+                self._file.write(json.dumps(event, default=str) + '\n')
+
+    def add_listener(self, listener):
+        with self._lock:
+            self.listeners.append(listener)
+
+    def _drain(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            self.handle(event)
+
+    def start(self, event_queue):
+        self._queue = event_queue
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Process any queued events and close the events file. Safe to call more than once."""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def summary(self):
+        """
+        Returns:
+            dict: Event counts, connected devices, per-action timings, parsed record total, audit results and failure reasons.
+        """
+        with self._lock:
+            actions = {name: {'count': len(durations), 'total': round(sum(durations), 3),
+                              'mean': round(sum(durations) / len(durations), 3)}
+                       for name, durations in self.action_durations.items() if durations}
+            return {
+                'events': dict(self.counts),
+                'devices_connected': len(self.connected),
+                'actions': actions,
+                'parsed_records': self.parsed_records,
+                'audits': dict(self.audits),
+                'failures': dict(self.failures),
+            }
@@ -0,0 +1,169 @@
+import datetime
+import os
+import sqlite3
+import uuid
+
+# Device statuses that count as finished for --resume purposes
+FINAL_STATUSES = ('completed',)
+
+# Weight of the latest run in the per-device duration average
+DURATION_SMOOTHING = 0.3
+
+
+def new_run_id():
+    """Return a sortable, unique run identifier such as 20240924-221503-3f9a1c."""
+    return f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def default_journal_path(output_root):
+    """
+    Return the default journal location: a simplenet_runs.db file next to the output root directory.
+
+    Args:
+        output_root (str): The runner's --output-root.
+
+    Returns:
+        str: Path to the journal database.
+    """
+    parent = os.path.dirname(os.path.abspath(output_root))
+    return os.path.join(parent, 'simplenet_runs.db')
+
+
+class RunJournal:
+    """
+    On-disk journal of runner jobs and the status of every device in them.
+
+    Each run gets a run_id. Every device selected by the run's query is recorded with its
+    status (pending, running, completed, failed, unreachable, deferred), exit code, attempt
+    count, duration and output location, so an interrupted or partially failed job can be
+    resumed with only the devices that have not completed. Durations of completed runs are
+    also kept per device and driver to predict how long the next run will take.
+    """
+
+    def __init__(self, journal_path):
+        """
+        Args:
+            journal_path (str): Path to the SQLite journal file (created if missing).
+        """
+        self.journal_path = journal_path
+        journal_dir = os.path.dirname(os.path.abspath(journal_path))
+        os.makedirs(journal_dir, exist_ok=True)
+        self.conn = sqlite3.connect(journal_path)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS runs
+                                 (run_id TEXT PRIMARY KEY, started_at TEXT, finished_at TEXT, inventory TEXT,
+                                 query TEXT, driver TEXT, driver_name TEXT, output_root TEXT)''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS run_devices
+                                 (run_id TEXT, hostname TEXT, device_id INTEGER, mgmt_ip TEXT, status TEXT,
+                                 exit_code INTEGER, attempts INTEGER DEFAULT 0, duration REAL,
+                                 output_location TEXT, started_at TEXT, updated_at TEXT,
+                                 PRIMARY KEY (run_id, hostname))''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS device_durations
+                                 (hostname TEXT, driver_name TEXT, expected REAL, last REAL,
+                                 samples INTEGER, updated_at TEXT, PRIMARY KEY (hostname, driver_name))''')
+
+    def start_run(self, run_id, inventory, query, driver, driver_name, output_root, rows):
+        """
+        Register a run and its devices. Devices already journaled for this run_id are left untouched.
+
+        Args:
+            run_id (str): Identifier of the run (new or resumed).
+            inventory (str): Inventory path used by the run.
+            query (str): SQL query that selected the devices.
+            driver (str): Driver file path.
+            driver_name (str): Driver name.
+            output_root (str): Output root directory.
+            rows (list): Device rows selected by the query.
+        """
+        now = str(datetime.datetime.now())
+        with self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO runs VALUES (?, ?, NULL, ?, ?, ?, ?, ?)',
+                              (run_id, now, inventory, query, driver, driver_name, output_root))
+            self.conn.executemany('''INSERT OR IGNORE INTO run_devices
+                                     (run_id, hostname, device_id, mgmt_ip, status, updated_at)
+                                     VALUES (?, ?, ?, ?, 'pending', ?)''',
+                                  [(run_id, row['hostname'], row.get('id'), row['mgmt_ip'], now) for row in rows])
+
+    def get_run(self, run_id):
+        """Return the runs row for run_id as a dict, or None if it does not exist."""
+        row = self.conn.execute('SELECT * FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def mismatched_settings(self, run_id, **settings):
+        """
+        Compare the settings of a new invocation with those stored for run_id.
+
+        Args:
+            run_id (str): Identifier of the run being resumed.
+            **settings: runs columns and their new values, e.g. query='select ...'.
+
+        Returns:
+            dict: column -> (stored value, new value) for every setting that differs.
+        """
+        run = self.get_run(run_id) or {}
+        return {column: (run.get(column), value) for column, value in settings.items() if run.get(column) != value}
+
+    def completed_hostnames(self, run_id):
+        """Return the set of hostnames that already finished successfully in run_id."""
+        placeholders = ', '.join('?' for _ in FINAL_STATUSES)
+        cursor = self.conn.execute(f'SELECT hostname FROM run_devices WHERE run_id = ? AND status IN ({placeholders})',
+                                   (run_id, *FINAL_STATUSES))
+        return {row['hostname'] for row in cursor}
+
+    def mark_running(self, run_id, hostname):
+        now = str(datetime.datetime.now())
+        with self.conn:
+            self.conn.execute('''UPDATE run_devices SET status = 'running', attempts = attempts + 1,
+                                 started_at = ?, updated_at = ? WHERE run_id = ? AND hostname = ?''',
+                              (now, now, run_id, hostname))
+
+    def record_result(self, run_id, result, output_location=None):
+        """
+        Store the outcome of a device run.
+
+        Args:
+            run_id (str): Identifier of the run.
+            result (dict): Result record (hostname, status, exit_code and optionally duration).
+            output_location (str): Where the device's output was written.
+        """
+        with self.conn:
+            self.conn.execute('''UPDATE run_devices SET status = ?, exit_code = ?, duration = ?,
+                                 output_location = ?, updated_at = ? WHERE run_id = ? AND hostname = ?''',
+                              (result['status'], result.get('exit_code'), result.get('duration'), output_location,
+                               str(datetime.datetime.now()), run_id, result['hostname']))
+
+    def record_duration(self, hostname, driver_name, duration):
+        """
+        Fold a completed device run's duration into its expected duration for the driver.
+
+        The expected duration is an exponentially weighted moving average, so it follows
+        devices whose output grows over time without overreacting to a single slow run.
+        """
+        now = str(datetime.datetime.now())
+        with self.conn:
+            self.conn.execute('''INSERT INTO device_durations VALUES (?, ?, ?, ?, 1, ?)
+                                 ON CONFLICT (hostname, driver_name) DO UPDATE SET
+                                 expected = expected + ? * (excluded.last - expected),
+                                 last = excluded.last, samples = samples + 1, updated_at = excluded.updated_at''',
+                              (hostname, driver_name, duration, duration, now, DURATION_SMOOTHING))
+
+    def expected_durations(self, driver_name):
+        """Return a dict of hostname -> expected duration in seconds for driver_name."""
+        cursor = self.conn.execute('SELECT hostname, expected FROM device_durations WHERE driver_name = ?',
+                                   (driver_name,))
+        return {row['hostname']: row['expected'] for row in cursor}
+
+    def finish_run(self, run_id):
+        with self.conn:
+            self.conn.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?',
+                              (str(datetime.datetime.now()), run_id))
+
+    def status_counts(self, run_id):
+        """Return a dict of status -> device count for run_id."""
+        cursor = self.conn.execute('SELECT status, COUNT(*) AS n FROM run_devices WHERE run_id = ? GROUP BY status',
+                                   (run_id,))
+        return {row['status']: row['n'] for row in cursor}
+
+    def close(self):
+        self.conn.close()
@@ -4,6 +4,9 @@ import time
 import jmespath
 from ruamel.yaml import YAML as yaml
 from colorama import Fore, Style
+
+from simplenet.cli import events
+from simplenet.cli.lib import query_cache
 debug_output = True
 
 def print_pretty(pretty, timestamps, msg, color=Fore.WHITE):
@@ -64,7 +67,7 @@ def execute_audit_action(action, global_data_store, current_device_name, pretty=
 
                         if debug_output:
                             print(f"DEBUG: Flattened data for JSMespath: {json.dumps(new_current_data, indent=2)}")
-                        parsed_result = jmespath.search(str(query).strip(), new_current_data)
+                        parsed_result = query_cache.search(query, new_current_data)
                         jpath_data_dump = action.get('jpath_data_dump', None)
                         if jpath_data_dump:
                             try:
@@ -114,6 +117,7 @@ def execute_audit_action(action, global_data_store, current_device_name, pretty=
         'overall_result': overall_result
     }
     global_data_store.add_audit_report(audit_report_entry)
+    events.emit('audit_result', policy_name=policy_name, display_name=display_name, result=overall_result)
 
     print_pretty(pretty, timestamps, f"Overall Audit Result: {overall_result}",
                  Fore.GREEN if audit_passed else Fore.RED)
@@ -158,7 +162,7 @@ def handle_audit_action(action, global_data_store, global_audit, pretty, timesta
             operator_value = check.get('operator', {}).get('value')
 
             # Evaluate check using JMESPath or other methods
-            query_result = jmespath.search(check_query, entry) if check_type == 'jmespath' else None
+            query_result = query_cache.search(check_query, entry) if check_type == 'jmespath' else None
             check_passed = (query_result == operator_value) if operator_type == 'is_equal' else False
 
             audit_results.append({
@@ -176,6 +180,8 @@ def handle_audit_action(action, global_data_store, global_audit, pretty, timesta
 
     # Update global audit store
     global_audit[policy_name] = audit_results
+    events.emit('audit_result', policy_name=policy_name,
+                result="PASSED" if all(r['check_passed'] for r in audit_results) else "FAILED")
     return audit_results
 
 
@@ -210,7 +216,7 @@ def check_run_if_condition(current_device_data, run_if):
     # Handle JMESPath checks
     elif check_type == 'jmespath':
         query = run_if.get('query')
-        target_value = jmespath.search(query, current_device_data)
+        target_value = query_cache.search(query, current_device_data)
 
         if target_value is None:
             print(f"DEBUG: JMESPath query '{query}' did not return any results.")
@@ -1,7 +1,9 @@
 import json
 import traceback
 from colorama import Fore
+from simplenet.cli import events
 from simplenet.cli.lib.audit_actions import print_pretty
+from simplenet.cli.lib import query_cache
 import jmespath
 
 def check_run_if_condition(current_device_data, run_if, pretty, timestamps):
@@ -48,7 +50,7 @@ def check_run_if_condition(current_device_data, run_if, pretty, timestamps):
 
             try:
                 # Execute JMESPath query
-                parsed_result = jmespath.search(query, current_device_data.get('parsed_result', {}))
+                parsed_result = query_cache.search(query, current_device_data.get('parsed_result', {}))
                 print(f"DEBUG: JMESPath query result: {parsed_result}")
             except jmespath.exceptions.JMESPathError as jp_err:
                 print_pretty(pretty, timestamps, f"JMESPath Error in query '{query}': {str(jp_err)}", Fore.RED)
@@ -247,6 +249,7 @@ def handle_audit_action_loop(action, global_data_store, global_audit, pretty, ti
             'parsed_data': entry_list
         }
         global_audit[audit_entry_key] = audit_report_entry
+        events.emit('audit_result', policy_name=policy_name, display_name=display_name, result=overall_result)
 
         # Print the final result
         color = Fore.GREEN if audit_passed else Fore.RED
@@ -7,7 +7,8 @@ from simplenet.cli.lib.utils import load_variables_from_file, render_template, l
 
 
 def execute_send_config(ssh_connection, action, resolved_vars, log_file, prompt, pretty, timestamps,
-                        stop_device_commands, global_output, global_prompt_count, inter_command_time, error_string):
+                        stop_device_commands, global_output, global_prompt_count, inter_command_time, error_string,
+                        compiled=None):
     """
     Handle the 'send_config' action, which sends configuration commands to a device.
 
@@ -24,6 +25,8 @@ def execute_send_config(ssh_connection, action, resolved_vars, log_file, prompt,
         global_prompt_count (list): List containing current and max prompt counts.
         inter_command_time (float): Time to wait between commands.
         error_string (str): Error string to detect.
+        compiled (dict): Artifacts prepared by the driver compiler; 'config_template' is the inline
+            config as a jinja2.Template, or None when it has no template markers.
     """
     variables = {}
     # Load variables and render the configuration if variables_path is provided
@@ -57,7 +60,12 @@ def execute_send_config(ssh_connection, action, resolved_vars, log_file, prompt,
 
     # Render inline configuration with variables if config content is present
     if config_content and resolved_vars:
-        config_content = render_template(config_content, resolved_vars)
+        if compiled and 'config_template' in compiled:
+            config_template = compiled['config_template']
+            if config_template is not None:
+                config_content = config_template.render(resolved_vars)
+        else:
+            config_content = render_template(config_content, resolved_vars)
 
     # If still no configuration content, notify and exit
     if not config_content:
@@ -69,13 +77,30 @@ def execute_send_config(ssh_connection, action, resolved_vars, log_file, prompt,
     # Send each configuration line (device is already in config mode)
     config_lines = config_content.strip().split('\n')
 
-    for line in config_lines:
+    # With a pipeline window, lines are written ahead and their outputs split apart afterwards
+    pipeline_window = int(action.get('pipeline_window') or 1)
+    pipelined_outputs = None
+    if pipeline_window > 1 and len(config_lines) > 1:
+        print_pretty(pretty, timestamps, f"Sending {len(config_lines)} config lines, {pipeline_window} ahead",
+                     Fore.LIGHTYELLOW_EX)
+        pipelined_outputs = ssh_connection.send_commands_pipelined(config_lines, window=pipeline_window,
+                                                                   timeout=10, error_string=error_string)
+
+    for line_index, line in enumerate(config_lines):
         if stop_device_commands:
             break
+        if pipelined_outputs is not None and line_index >= len(pipelined_outputs):
+            break  # the batch stopped at an error
 
         print_pretty(pretty, timestamps, f"Sending config: {line}", Fore.LIGHTYELLOW_EX)
         try:
-            action_output = ssh_connection.send_command(line, prompt, timeout=10)
+            if pipelined_outputs is None:
+                # Configuration mode is a property of the interactive session, so config always uses the shell
+                action_output = ssh_connection.send_command(line, prompt, timeout=10, transport_mode='shell')
+            else:
+                action_output = pipelined_outputs[line_index]
+                if isinstance(action_output, Exception):
+                    raise action_output
             log_command_output(log_file, line, action_output)
 
             # Check for error string in output
@@ -89,4 +114,5 @@ def execute_send_config(ssh_connection, action, resolved_vars, log_file, prompt,
             log_command_execution(log_file, f"Failed to send config: {line}. Error: {e}")
             continue
 
-        time.sleep(inter_command_time)
+        if pipelined_outputs is None:
+            time.sleep(inter_command_time)
@@ -3,11 +3,11 @@ import re
 import requests
 import json
 import time
-import jmespath
 import sys
 import io
 import os
 import logging
+from simplenet.cli.lib import query_cache
 
 def dereference_placeholders(text, resolved_vars):
     """
@@ -122,7 +122,7 @@ def handle_rest_api_action(action, resolved_vars, log_file, pretty, timestamps,
             store_query = action.get('store_query', {})
             if store_query:
                 print(f"Store query detected: {store_query}")
-                query_result = jmespath.search(store_query['query'],
+                query_result = query_cache.search(store_query['query'],
                                                response_json if 'response_json' in locals() else {})
                 print(f"Query result: {query_result}")
                 if query_result is not None:
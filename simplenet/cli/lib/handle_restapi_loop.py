@@ -3,10 +3,10 @@ import re
 import requests
 import json
 import time
-import jmespath
 from pprint import pprint
 from colorama import Fore
 from jinja2 import Template
+from simplenet.cli.lib import query_cache
 
 
 # Utility Functions
@@ -89,7 +89,7 @@ def handle_response(response, expected_status, log_file, url, pretty):
 def store_variables(store_query, response_json, global_data_store):
     """Stores variables from the response using the store_query field."""
     if store_query:
-        query_result = jmespath.search(store_query['query'], response_json)
+        query_result = query_cache.search(store_query['query'], response_json)
         if query_result is not None:
             variable_name = store_query.get('variable_name')
             if variable_name:
@@ -229,7 +229,7 @@ def handle_rest_api_loop(action_index, action, resolved_vars, log_file, pretty,
                 # Handle storing variables via store_query
                 store_query = action.get('store_query', {})
                 if store_query:
-                    query_result = jmespath.search(store_query['query'], response_json)
+                    query_result = query_cache.search(store_query['query'], response_json)
                     if query_result is not None:
                         variable_name = store_query.get('variable_name')
                         if variable_name:
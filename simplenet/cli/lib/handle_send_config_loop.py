@@ -10,6 +10,7 @@ from colorama import Fore
 from simplenet.cli.lib.audit_actions import print_pretty
 from simplenet.cli.lib.utils import scrub_esc_codes, log_command_output, render_template
 from simplenet.cli.lib.utils import check_run_if_condition, resolve_action_vars
+from simplenet.cli.lib import query_cache
 
 def handle_send_config_loop(action_index, ssh_connection, action, resolved_vars, log_file, prompt, pretty,
                             timestamps, stop_device_commands, global_output, global_prompt_count, inter_command_time,
@@ -91,7 +92,8 @@ def handle_send_config_loop(action_index, ssh_connection, action, resolved_vars,
 
             print_pretty(pretty, timestamps, f"Sending config: {line}", Fore.LIGHTYELLOW_EX)
             try:
-                action_output = ssh_connection.send_command(line, expect, timeout=10)
+                # Configuration mode is a property of the interactive session, so config always uses the shell
+                action_output = ssh_connection.send_command(line, expect, timeout=10, transport_mode='shell')
                 action_output = scrub_esc_codes(action_output, prompt)
                 log_command_output(log_file, line, action_output)
 
@@ -172,7 +174,7 @@ def check_loop_condition(condition, loop_vars, global_data_store, debug_output):
 
     # Perform JMESPath query
     try:
-        target_value = jmespath.search(query.strip(), flattened_data)
+        target_value = query_cache.search(query, flattened_data)
     except jmespath.exceptions.JMESPathError as e:
         print(f"DEBUG: Error in JMESPath query '{query}': {str(e)}")
         return False
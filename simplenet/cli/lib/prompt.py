@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import tempfile
+import time
+
+DEFAULT_PROMPT_CACHE_DIR = './prompt_cache'
+
+# A prompt-like line at the very end of the output received so far. Prompts end in '#' or '>' on
+# network devices and in '$', '#' or '%' on Unix shells.
+PROMPT_AT_END = re.compile(r'[\w)\]~/.:@-][#>$%][ \t]*\Z')
+
+# Escape sequences and carriage returns some shells write before the prompt on its line
+_LINE_PREFIX = r'(?:\x1b\[[0-9;?]*[A-Za-z]|\r)*'
+_ANSI_ESCAPE = re.compile(r'\x1B[@-_][0-?]*[ -/]*[@-~]')
+_PROMPT_LINE = re.compile(r'^\S[^\n]{0,127}[#>$%]$')
+
+
+def find_prompt(text):
+    """
+    Return the prompt from device output: its last non-empty line, if that line looks like a prompt.
+
+    Args:
+        text (str): Output ending at a prompt, e.g. the login banner.
+
+    Returns:
+        str: The prompt without trailing whitespace, or None.
+    """
+    lines = _ANSI_ESCAPE.sub('', text).replace('\r', '\n').split('\n')
+    for line in reversed(lines):
+        line = line.strip()
+        if line:
+            return line if _PROMPT_LINE.match(line) else None
+    return None
+
+
+def prompt_regex(prompt):
+    """
+    Build an anchored, multiline regex matching a device's prompt in any of its modes.
+
+    Network prompts keep the hostname literal and allow a mode suffix, so 'usa1-rtr-1#' gives
+    ^usa1-rtr-1(\\([^)\\n]*\\))?[#>]\\s*$ which also matches 'usa1-rtr-1(config-if)#' and
+    'usa1-rtr-1>'. Unix prompts ('admin@host:~$', '[admin@host ~]$') keep the user@host part
+    literal and allow any working directory.
+
+    Args:
+        prompt (str): A prompt as returned by find_prompt().
+
+    Returns:
+        str: The regex source; compile it with re.MULTILINE.
+    """
+    prompt = prompt.strip()
+    terminator = prompt[-1]
+    body = prompt[:-1]
+    if terminator == '$' or terminator == '%' or '@' in body:
+        # The part after the host name changes with the working directory
+        host = re.match(r'^[^:\s~]*', body).group(0) or body
+        return rf'^{_LINE_PREFIX}{re.escape(host)}[^\n]*?[$#%>]\s*$'
+    # Drop the mode suffix, e.g. '(config-if)', so the regex matches the device in every mode
+    base = re.sub(r'\([^)]*\)$', '', body)
+    return rf'^{_LINE_PREFIX}{re.escape(base)}(\([^)\n]*\))?[#>]\s*$'
+
+
+def prompt_head(pattern):
+    """
+    Drop the end-of-line anchor from a prompt regex.
+
+    The result also matches a prompt followed by typed-ahead input on the same line, e.g.
+    'usa1-rtr-1#show version', which is how devices echo pipelined commands.
+    """
+    for anchor in (r'\s*$', '$'):
+        if pattern.endswith(anchor):
+            return pattern[:-len(anchor)]
+    return pattern
+
+
+def compile_prompt(pattern):
+    """Compile a prompt regex from prompt_regex() or the prompt cache."""
+    return re.compile(pattern, re.MULTILINE)
+
+
+class PromptCache:
+    """
+    Learned prompt regexes kept on disk, one small JSON file per device.
+
+    Separate files let concurrent device processes update the cache without locking; each file
+    is written to a temporary name and renamed into place, so readers never see a partial file.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_PROMPT_CACHE_DIR):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache files.
+        """
+        self.cache_dir = cache_dir
+
+    def _path(self, device):
+        safe_name = re.sub(r'[^\w.-]', '_', device)
+        return os.path.join(self.cache_dir, f"{safe_name}.json")
+
+    def get(self, device):
+        """
+        Returns:
+            dict: The cache entry for device (pattern, updated), or None.
+        """
+        try:
+            with open(self._path(device), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or 'pattern' not in entry:
+            return None
+        return entry
+
+    def set(self, device, pattern):
+        """
+        Store the prompt regex learned for device.
+
+        Args:
+            device (str): Device hostname.
+            pattern (str): Regex source from prompt_regex().
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {'pattern': pattern, 'updated': time.time()}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(device))
+        except OSError as e:
+            print(f"Could not update prompt cache for {device}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
@@ -0,0 +1,57 @@
+import functools
+
+import jmespath
+
+# Distinct expressions kept compiled per process; the least recently used is dropped beyond this
+DEFAULT_MAX_EXPRESSIONS = 1024
+
+
+@functools.lru_cache(maxsize=DEFAULT_MAX_EXPRESSIONS)
+def _compile(expression):
+    return jmespath.compile(expression)
+
+
+def compile_query(expression):
+    """
+    Return the compiled form of a JMESPath expression, parsing each distinct expression once.
+
+    Args:
+        expression (str): The JMESPath expression. Surrounding whitespace is ignored.
+
+    Returns:
+        jmespath.parser.ParsedResult: The compiled expression; call .search(data) on it.
+
+    Raises:
+        jmespath.exceptions.JMESPathError: If the expression is invalid. Invalid expressions are not cached.
+    """
+    if isinstance(expression, str):
+        expression = expression.strip()
+    return _compile(expression)
+
+
+def search(expression, data):
+    """
+    Drop-in replacement for jmespath.search() that reuses compiled expressions.
+
+    Args:
+        expression (str): The JMESPath expression.
+        data: The data to search.
+
+    Returns:
+        The query result, or None if nothing matched.
+    """
+    return compile_query(expression).search(data)
+
+
+def cache_stats():
+    """
+    Returns:
+        dict: hits, misses, size and maxsize of the expression cache.
+    """
+    info = _compile.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
+
+
+def clear_cache():
+    """Forget every compiled expression and reset the counters."""
+    _compile.cache_clear()
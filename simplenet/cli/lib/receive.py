@@ -0,0 +1,94 @@
+import codecs
+
+# paramiko returns whatever is available up to this many bytes, so a large size costs nothing on small outputs
+DEFAULT_RECV_SIZE = 65536
+DEFAULT_ENCODING = 'utf-8'
+DEFAULT_ERRORS = 'replace'
+
+
+class ReceiveBuffer:
+    """
+    Byte-level receive pipeline shared by the SSH read loops.
+
+    Raw bytes from the channel go through an incremental decoder, so a multibyte character split
+    across two recv() calls is decoded once both halves arrive instead of raising. Decoded text is
+    kept as a list of chunks and joined once when the output is requested.
+    """
+
+    def __init__(self, recv_size=DEFAULT_RECV_SIZE, encoding=DEFAULT_ENCODING, errors=DEFAULT_ERRORS,
+                 accumulate=True):
+        """
+        Args:
+            recv_size (int): Maximum bytes requested per channel.recv() call.
+            encoding (str): Text encoding of the device output.
+            errors (str): Decoder error policy: 'strict', 'replace', 'ignore', 'backslashreplace', ...
+            accumulate (bool): Keep the decoded text; streaming readers that hand chunks to a queue can disable it.
+        """
+        self.recv_size = recv_size
+        self.encoding = encoding
+        self.errors = errors
+        self.accumulate = accumulate
+        self.bytes_received = 0
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        self._chunks = []
+        self._length = 0
+
+    def recv(self, channel):
+        """
+        Read one chunk from a paramiko channel (or any object with recv(n)).
+
+        Returns:
+            str: Newly decoded text; may be empty if only part of a multibyte character arrived.
+
+        Raises:
+            EOFError: If the remote side closed the channel.
+        """
+        data = channel.recv(self.recv_size)
+        if not data:
+            raise EOFError("Connection closed by remote host")
+        return self.feed(data)
+
+    def feed(self, data):
+        """Decode raw bytes, append the text and return it."""
+        self.bytes_received += len(data)
+        text = self._decoder.decode(data)
+        if text and self.accumulate:
+            self._chunks.append(text)
+            self._length += len(text)
+        return text
+
+    def finish(self):
+        """Flush any incomplete trailing character (per the error policy) and return the full text."""
+        text = self._decoder.decode(b'', final=True)
+        if text and self.accumulate:
+            self._chunks.append(text)
+            self._length += len(text)
+        return self.getvalue()
+
+    def getvalue(self):
+        """Return all decoded text, joining the chunks once."""
+        if len(self._chunks) > 1:
+            self._chunks = [''.join(self._chunks)]
+        return self._chunks[0] if self._chunks else ''
+
+    def tail(self, size):
+        """Return the last size characters without joining the whole buffer."""
+        parts = []
+        collected = 0
+        for chunk in reversed(self._chunks):
+            parts.append(chunk)
+            collected += len(chunk)
+            if collected >= size:
+                break
+        text = ''.join(reversed(parts))
+        return text[-size:] if size else ''
+
+    def reset(self):
+        """Discard accumulated text and decoder state, keeping the byte counter."""
+        self._decoder.reset()
+        self._chunks = []
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
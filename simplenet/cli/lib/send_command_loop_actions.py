@@ -2,11 +2,13 @@ import json
 import time
 from pprint import pprint
 
-import jmespath
 from colorama import Fore
 
+from simplenet.cli import events, metrics
 from simplenet.cli.lib.audit_actions import print_pretty
-from simplenet.cli.lib.utils import scrub_esc_codes, parse_output_with_ttp, log_command_output, log_command_execution
+from simplenet.cli.lib.utils import scrub_esc_codes, parse_output_with_ttp, parse_outputs_with_ttp, log_command_output, \
+    log_command_execution
+from simplenet.cli.lib import query_cache
 
 
 def replace_custom_placeholders(template_string, variables):
@@ -28,10 +30,13 @@ def replace_custom_placeholders(template_string, variables):
 
 def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars, log_file, prompt, pretty, timestamps,
                              stop_device_commands, global_output, global_prompt_count, inter_command_time,
-                             error_string, device_name, global_data_store, debug_output):
+                             error_string, device_name, global_data_store, debug_output, compiled=None):
     """
     Handles the 'send_command_loop' action, sending commands in a loop using a list of values and processing outputs.
+
+    compiled holds the templates, JMESPath expressions and regexes prepared by the driver compiler.
     """
+    compiled = compiled or {}
     if debug_output:
         debug_global_output = dict(global_data_store)
         pprint(debug_global_output)
@@ -40,12 +45,18 @@ def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars
     variable_name = action.get('variable_name')  # Variable to retrieve from global data store
     key_to_loop = action.get('key_to_loop')  # Key within each entry to loop over
     command_template = action.get('command_template')  # Command template to be filled with data
-    expect = action.get('expect', prompt)
+    expect = compiled.get('expect') or action.get('expect', prompt)
     output_file_path = action.get('output_path', '')
     output_mode = action.get('output_mode', 'a')
     output_mode = "w" if output_mode == "overwrite" else "a"
     use_named_list = action.get('use_named_list', {})
     parse_output = action.get('parse_output', True)
+    timeout = float(action.get('timeout') or 10)
+    expect_occurrences = int(action.get('expect_occurrences') or 20)
+    parallel_channels = int(action.get('parallel_channels') or 1)  # channels on the device's transport
+    parallel_setup_commands = action.get('parallel_setup_commands') or []
+    if isinstance(parallel_setup_commands, str):
+        parallel_setup_commands = [line.strip() for line in parallel_setup_commands.splitlines() if line.strip()]
 
     # Retrieve the list of dictionaries from the global data store
     entry_list = global_data_store.get_variable(variable_name)
@@ -68,10 +79,8 @@ def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars
     if debug_output:
         print(f"DEBUG: Starting loop through entries: {entry_list}")
 
+    commands = []
     for entry in entry_list:
-        if stop_device_commands:
-            break
-
         if key_to_loop not in entry:
             print_pretty(pretty, timestamps, f"ERROR: Key '{key_to_loop}' not found in entry: {entry}", Fore.RED)
             continue
@@ -79,13 +88,42 @@ def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars
         loop_value = entry[key_to_loop]
 
         # Replace the custom placeholders in the command template with the loop value, driven by schema
-        command = replace_custom_placeholders(command_template, {key_to_loop: loop_value})
-
-        print_pretty(pretty, timestamps, f"Executing command: {command}", Fore.LIGHTYELLOW_EX)
+        commands.append(replace_custom_placeholders(command_template, {key_to_loop: loop_value}))
+
+    # Loop commands are independent, so they can run concurrently on several channels of the same transport
+    parallel_outputs = None
+    if parallel_channels > 1 and len(commands) > 1 and not stop_device_commands:
+        print_pretty(pretty, timestamps, f"Executing {len(commands)} commands on up to {parallel_channels} channels",
+                     Fore.LIGHTYELLOW_EX)
+        parallel_outputs = ssh_connection.send_commands_parallel(
+            commands, expect, timeout=timeout, expect_occurrences=expect_occurrences, channels=parallel_channels,
+            mode=action.get('parallel_mode', 'shell'), setup_commands=parallel_setup_commands)
+        parallel_outputs = [output if isinstance(output, Exception) else scrub_esc_codes(output, prompt)
+                            for output in parallel_outputs]
+
+    # Outputs that are all available up front are parsed in one batch with a single parser
+    parsed_outputs = {}
+    named_ttp_path = use_named_list.get('ttp_path') if parse_output and use_named_list else None
+    if parallel_outputs is not None and named_ttp_path:
+        indexes = [index for index, output in enumerate(parallel_outputs) if not isinstance(output, Exception)]
+        results = parse_outputs_with_ttp(named_ttp_path, [parallel_outputs[index] for index in indexes],
+                                         compiled.get('named_list_ttp_template'))
+        parsed_outputs = dict(zip(indexes, results))
+
+    for command_index, command in enumerate(commands):
+        if stop_device_commands:
+            break
 
         try:
-            action_output = ssh_connection.send_command(command, expect, timeout=10, expect_occurrences=20)
-            action_output = scrub_esc_codes(action_output, prompt)
+            if parallel_outputs is None:
+                print_pretty(pretty, timestamps, f"Executing command: {command}", Fore.LIGHTYELLOW_EX)
+                action_output = ssh_connection.send_command(command, expect, timeout=timeout, expect_occurrences=expect_occurrences,
+                                                            transport_mode=action.get('transport_mode'))
+                action_output = scrub_esc_codes(action_output, prompt)
+            else:
+                action_output = parallel_outputs[command_index]
+                if isinstance(action_output, Exception):
+                    raise action_output
             print(f"DEBUG: Command execution output: {action_output}")
         except Exception as e:
             print_pretty(pretty, timestamps, f"Failed to execute command: {command}. Error: {e}", Fore.RED)
@@ -98,16 +136,24 @@ def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars
         if parse_output and use_named_list:
             ttp_path = use_named_list.get('ttp_path')
             if ttp_path:
-                parsed_data = parse_output_with_ttp(ttp_path, action_output)
+                if command_index in parsed_outputs:
+                    parsed_data = parsed_outputs[command_index]
+                else:
+                    parsed_data = parse_output_with_ttp(ttp_path, action_output, compiled.get('named_list_ttp_template'))
                 if parsed_data:
                     print(f"TTP Parser results:\n{json.dumps(parsed_data, indent=2)}")
 
                     # Always update the global data store with parsed data
                     global_data_store.update(device_name, ttp_path, action_index, parsed_data)
+                    events.emit('parsed_records', template=ttp_path, command=command,
+                                records=events.count_records(parsed_data))
 
                     store_query = use_named_list.get('store_query')
                     if store_query:
-                        query_result = jmespath.search(store_query['query'], parsed_data)
+                        if 'named_list_store_query' in compiled:
+                            query_result = compiled['named_list_store_query'].search(parsed_data)
+                        else:
+                            query_result = query_cache.search(store_query['query'], parsed_data)
                         if query_result is not None:
                             # Append each result to the named list with the specified key from the schema
                             named_list.append({item_key: query_result})
@@ -120,7 +166,7 @@ def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars
         # Write output to file if necessary
         if output_file_path:
             try:
-                with open(output_file_path, output_mode) as f:
+                with metrics.timed('file_write', label='output'), open(output_file_path, output_mode) as f:
                     f.write(f"Command: {command}\nOutput:\n{scrub_esc_codes(action_output, prompt)}\n\n")
             except Exception as e:
                 print(f"Unable to save files - {output_file_path}")
@@ -136,6 +182,7 @@ def handle_send_command_loop(action_index, ssh_connection, action, resolved_vars
             break
 
         # Pause between commands if required
-        time.sleep(inter_command_time)
+        if parallel_outputs is None:
+            time.sleep(inter_command_time)
 
     return global_output, stop_device_commands
@@ -2,16 +2,20 @@ import json
 import time
 import traceback
 
-import jmespath
 from colorama import Fore
 
+from simplenet.cli import events, metrics
 from simplenet.cli.lib.audit_actions import print_pretty
 from simplenet.cli.lib.utils import scrub_esc_codes, parse_output_with_ttp, log_command_output, log_command_execution, \
     dereference_placeholders
+from simplenet.cli.lib import query_cache
 
 def handle_send_command_action(action_index, ssh_connection, action, resolved_vars, log_file, prompt, pretty,
                                timestamps, stop_device_commands, global_output, global_prompt_count,
-                               inter_command_time, error_string, device_name, global_data_store, debug_output):
+                               inter_command_time, error_string, device_name, global_data_store, debug_output,
+                               compiled=None):
+    # Templates, JMESPath expressions and regexes prepared by the driver compiler
+    compiled = compiled or {}
     # Set the current device to ensure global_data_store works correctly
     global_data_store.set_current_device(device_name)
 
@@ -27,16 +31,40 @@ def handle_send_command_action(action_index, ssh_connection, action, resolved_va
         print(f"DEBUG: Executing command with resolved variables: {command}")
 
     command_lines = command.strip().split('\n')
-
-    for line in command_lines:
+    # The learned prompt ends each read; timeout only bounds a device that never returns it
+    timeout = float(action.get('timeout') or 10)
+    expect_occurrences = int(action.get('expect_occurrences') or 20)
+
+    # With a pipeline window, shell commands are written ahead and their outputs split apart afterwards
+    pipeline_window = int(action.get('pipeline_window') or 1)
+    pipelined_outputs = None
+    if (pipeline_window > 1 and len(command_lines) > 1
+            and (action.get('transport_mode') or ssh_connection.transport_mode) == 'shell'):
+        print_pretty(pretty, timestamps, f"Executing {len(command_lines)} commands, {pipeline_window} ahead",
+                     Fore.LIGHTYELLOW_EX)
+        pipelined_outputs = ssh_connection.send_commands_pipelined(command_lines, window=pipeline_window,
+                                                                   timeout=timeout, error_string=error_string)
+
+    for line_index, line in enumerate(command_lines):
         if stop_device_commands:
             break
+        if pipelined_outputs is not None and line_index >= len(pipelined_outputs):
+            break  # the batch stopped at an error
 
         print_pretty(pretty, timestamps, f"Executing command: {line}", Fore.LIGHTYELLOW_EX)
-        expect = action.get('expect', prompt)
+        expect = compiled.get('expect') or action.get('expect', prompt)
         try:
-            action_output = ssh_connection.send_command(line, expect, timeout=10, expect_occurrences=20)
+            if pipelined_outputs is None:
+                action_output = ssh_connection.send_command(line, expect, timeout=timeout, expect_occurrences=expect_occurrences,
+                                                            transport_mode=action.get('transport_mode'))
+            else:
+                action_output = pipelined_outputs[line_index]
+                if isinstance(action_output, Exception):
+                    raise action_output
             action_output = scrub_esc_codes(action_output, prompt)
+            if ssh_connection.last_exit_status and (action.get('transport_mode') or ssh_connection.transport_mode) == 'exec':
+                print_pretty(pretty, timestamps, f"Command exited with status {ssh_connection.last_exit_status}: {line}", Fore.RED)
+                log_command_execution(log_file, f"Command exited with status {ssh_connection.last_exit_status}: {line}")
 
             # Check if the error string is present in the output
             if error_string and error_string in action_output:
@@ -60,17 +88,21 @@ def handle_send_command_action(action_index, ssh_connection, action, resolved_va
         parsed_data = None
         if ttp_path:
             print(f"DEBUG: Raw output before TTP parsing:\n{action_output}")
-            parsed_data = parse_output_with_ttp(ttp_path, action_output)
+            parsed_data = parse_output_with_ttp(ttp_path, action_output, compiled.get('ttp_template'))
             print(f"DEBUG: Parsed data after TTP parsing:\n{json.dumps(parsed_data, indent=2)}")
 
             if parsed_data and parsed_data != [{}]:  # Check if parsed data is not an empty dictionary
                 global_data_store.update(device_name, ttp_path, action_index, parsed_data)
+                events.emit('parsed_records', template=ttp_path, command=line, records=events.count_records(parsed_data))
 
                 # Handle storing variables if 'store_query' is specified
                 store_query = action.get('store_query', {})
                 if store_query:
                     print(f"DEBUG: Processing store_query: {store_query}")
-                    query_result = jmespath.search(store_query['query'], parsed_data)
+                    if 'store_query' in compiled:
+                        query_result = compiled['store_query'].search(parsed_data)
+                    else:
+                        query_result = query_cache.search(store_query['query'], parsed_data)
                     print(f"DEBUG: JMESPath query result: {query_result}")
                     if query_result is not None:
                         variable_name = store_query.get('variable_name')
@@ -91,16 +123,17 @@ def handle_send_command_action(action_index, ssh_connection, action, resolved_va
             output_format = action.get('output_format', 'text')
 
             try:
-                if output_format in ['text', 'both']:
-                    with open(output_path, output_mode) as f:
-                        f.write(f"Command: {command}\nOutput:\n{action_output}\n\n")
-                    print(f"DEBUG: Output written to {output_path}")
-
-                if parsed_data and output_format == 'both':
-                    parsed_output_path = f"{output_path}_parsed.json"
-                    with open(parsed_output_path, "w") as fh:
-                        fh.write(json.dumps(parsed_data, indent=2))
-                    print(f"DEBUG: Parsed data written to {parsed_output_path}")
+                with metrics.timed('file_write', label='output'):
+                    if output_format in ['text', 'both']:
+                        with open(output_path, output_mode) as f:
+                            f.write(f"Command: {command}\nOutput:\n{action_output}\n\n")
+                        print(f"DEBUG: Output written to {output_path}")
+
+                    if parsed_data and output_format == 'both':
+                        parsed_output_path = f"{output_path}_parsed.json"
+                        with open(parsed_output_path, "w") as fh:
+                            fh.write(json.dumps(parsed_data, indent=2))
+                        print(f"DEBUG: Parsed data written to {parsed_output_path}")
             except Exception as e:
                 print(f"Unable to save files - {output_path}. Error: {e}")
                 print(traceback.format_exc())
@@ -115,6 +148,7 @@ def handle_send_command_action(action_index, ssh_connection, action, resolved_va
             stop_device_commands = True
             break
 
-        time.sleep(inter_command_time)
+        if pipelined_outputs is None:
+            time.sleep(inter_command_time)
 
     return global_output, stop_device_commands
@@ -0,0 +1,107 @@
+import gzip
+import os
+from collections import deque
+
+# Characters of session output kept in memory per connection
+DEFAULT_TRANSCRIPT_SIZE = 1000000
+DEFAULT_PAGE_SIZE = 65536
+
+
+class TranscriptBuffer:
+    """
+    Bounded session transcript.
+
+    Output is kept in memory as a queue of chunks up to max_size characters. When the limit is
+    exceeded the oldest text is trimmed. If spill_path is set, the trimmed text is first appended
+    to a gzip file, so the complete transcript survives on disk while memory stays bounded.
+    Without a spill file, trimmed text is dropped and only counted.
+    """
+
+    def __init__(self, max_size=DEFAULT_TRANSCRIPT_SIZE, spill_path=None):
+        """
+        Args:
+            max_size (int): Maximum characters held in memory; 0 or None keeps everything.
+            spill_path (str): gzip file that receives text trimmed from memory, or None to drop it.
+        """
+        self.max_size = max_size
+        self.spill_path = spill_path
+        self.spilled_chars = 0
+        self.dropped_chars = 0
+        self._chunks = deque()
+        self._length = 0
+        if spill_path:
+            directory = os.path.dirname(os.path.abspath(spill_path))
+            os.makedirs(directory, exist_ok=True)
+            # Each session starts a fresh transcript file
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+
+    def append(self, text):
+        if not text:
+            return
+        self._chunks.append(text)
+        self._length += len(text)
+        if self.max_size and self._length > self.max_size:
+            self._trim()
+
+    def _trim(self):
+        # Trim to three quarters of the limit so that spills happen in blocks, not on every chunk
+        target = self.max_size * 3 // 4
+        excess = self._length - target
+        removed = []
+        while excess > 0 and self._chunks:
+            chunk = self._chunks.popleft()
+            if len(chunk) > excess:
+                removed.append(chunk[:excess])
+                self._chunks.appendleft(chunk[excess:])
+                self._length -= excess
+                break
+            removed.append(chunk)
+            self._length -= len(chunk)
+            excess -= len(chunk)
+
+        text = ''.join(removed)
+        if self.spill_path:
+            # Every spill is a complete gzip member, so the file is readable at any time
+            with gzip.open(self.spill_path, 'at', encoding='utf-8') as f:
+                f.write(text)
+            self.spilled_chars += len(text)
+        else:
+            self.dropped_chars += len(text)
+
+    def getvalue(self):
+        """Return the text held in memory, joining the chunks once."""
+        if len(self._chunks) > 1:
+            joined = ''.join(self._chunks)
+            self._chunks.clear()
+            self._chunks.append(joined)
+        return self._chunks[0] if self._chunks else ''
+
+    def pages(self, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterate over the transcript lazily, spilled text first and then the text in memory.
+
+        Args:
+            page_size (int): Characters per page.
+
+        Yields:
+            str: Consecutive pages of the transcript.
+        """
+        if self.spill_path and self.spilled_chars:
+            with gzip.open(self.spill_path, 'rt', encoding='utf-8') as f:
+                while True:
+                    page = f.read(page_size)
+                    if not page:
+                        break
+                    yield page
+        text = self.getvalue()
+        for start in range(0, len(text), page_size):
+            yield text[start:start + page_size]
+
+    def clear(self):
+        """Discard the text in memory. Text already spilled to disk is kept."""
+        self._chunks.clear()
+        self._length = 0
+
+    def __len__(self):
+        return self._length
@@ -0,0 +1,168 @@
+import copy
+import os
+import threading
+
+from ttp import ttp
+
+# Idle parsers kept per template; more are built when several threads parse at once
+DEFAULT_IDLE_PARSERS = 4
+
+_cache_lock = threading.Lock()
+_path_cache = {}  # path -> (mtime_ns, size, TtpTemplate)
+_text_cache = {}  # template text -> TtpTemplate
+_stats = {'loaded': 0, 'cache_hits': 0, 'parsers_built': 0, 'parses': 0}
+
+
+class TtpTemplate:
+    """
+    A TTP template loaded once per process, with a pool of parser objects built from it.
+
+    Building a ttp parser parses the template and compiles its regexes. Parsers are kept after
+    use and given new input for the next output, so that work is done once per template and
+    thread instead of once per command output.
+    """
+
+    def __init__(self, text, max_idle=DEFAULT_IDLE_PARSERS):
+        """
+        Args:
+            text (str): The TTP template.
+            max_idle (int): Parsers kept for reuse once they are released.
+        """
+        self.text = text
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        parser = ttp(template=self.text)
+        with _cache_lock:
+            _stats['parsers_built'] += 1
+        return parser
+
+    def _release(self, parser):
+        parser.clear_input()
+        parser.clear_result()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(parser)
+
+    @staticmethod
+    def _parse_one(parser, output):
+        parser.clear_input()
+        parser.clear_result()
+        parser.add_input(output)
+        parser.parse(one=True)
+        # result() returns the parser's own lists, which are emptied when the parser is cleared for reuse
+        return copy.deepcopy(parser.result())
+
+    def parse(self, output):
+        """
+        Parse one command output.
+
+        Args:
+            output (str): Text to parse.
+
+        Returns:
+            list: The ttp results, as returned by ttp.result().
+        """
+        return self.parse_many([output])[0]
+
+    def parse_many(self, outputs):
+        """
+        Parse several outputs with one parser, one after the other.
+
+        Args:
+            outputs (list): Texts to parse.
+
+        Returns:
+            list: One ttp result per output, in the same order.
+        """
+        parser = self._acquire()
+        try:
+            results = [self._parse_one(parser, output) for output in outputs]
+        except Exception:
+            # A parser that failed part way is not reused
+            parser = None
+            raise
+        finally:
+            if parser is not None:
+                self._release(parser)
+        with _cache_lock:
+            _stats['parses'] += len(outputs)
+        return results
+
+
+def template_from_text(text):
+    """Return the TtpTemplate for a template's text, creating it once per distinct text."""
+    template = _text_cache.get(text)
+    if template is None:
+        with _cache_lock:
+            template = _text_cache.setdefault(text, TtpTemplate(text))
+    return template
+
+
+def load_template(ttp_path):
+    """
+    Return the TtpTemplate for a file, reading it again only when its mtime or size changed.
+
+    Args:
+        ttp_path (str): Path to the .ttp file.
+
+    Returns:
+        TtpTemplate: The cached template.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    stat = os.stat(ttp_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _path_cache.get(ttp_path)
+    if cached is not None and cached[:2] == version:
+        with _cache_lock:
+            _stats['cache_hits'] += 1
+        return cached[2]
+    with open(ttp_path, 'r') as template_file:
+        template = template_from_text(template_file.read())
+    with _cache_lock:
+        _path_cache[ttp_path] = version + (template,)
+        _stats['loaded'] += 1
+    return template
+
+
+def get_template(ttp_path, ttp_template=None):
+    """
+    Resolve the template to parse with.
+
+    Args:
+        ttp_path (str): Path to the .ttp file, used when ttp_template is not given.
+        ttp_template (TtpTemplate or str): A loaded template or the template text.
+
+    Returns:
+        TtpTemplate: The template.
+    """
+    if isinstance(ttp_template, TtpTemplate):
+        return ttp_template
+    if ttp_template is not None:
+        return template_from_text(ttp_template)
+    return load_template(ttp_path)
+
+
+def cache_stats():
+    """
+    Returns:
+        dict: Templates loaded from disk, cache hits, parsers built and outputs parsed so far.
+    """
+    with _cache_lock:
+        return dict(_stats, templates=len(_text_cache))
+
+
+def clear_cache():
+    """Forget every loaded template and its parsers, and reset the counters."""
+    with _cache_lock:
+        _path_cache.clear()
+        _text_cache.clear()
+        for name in _stats:
+            _stats[name] = 0
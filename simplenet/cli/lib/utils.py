@@ -7,9 +7,12 @@ import jmespath
 from ruamel.yaml import YAML as yaml
 from colorama import Fore
 from jinja2 import Template
-from ttp import ttp
 from ruamel.yaml import YAML
 
+from simplenet.cli import metrics
+from simplenet.cli.lib.receive import ReceiveBuffer
+from simplenet.cli.lib import query_cache, ttp_cache
+
 debug = False
 def strip_ansi_escape_codes(text):
     """
@@ -93,7 +96,7 @@ def check_run_if_condition(current_device_data, run_if):
     # Handle JMESPath checks
     elif check_type == 'jmespath':
         query = run_if.get('query')
-        target_value = jmespath.search(query, current_device_data)
+        target_value = query_cache.search(query, current_device_data)
 
         if target_value is None:
 
@@ -166,13 +169,43 @@ def dereference_placeholders(text, resolved_vars):
     return placeholder_pattern.sub(replace_placeholder, text)
 
 
-def parse_output_with_ttp(ttp_path, output):
-    with open(ttp_path, 'r') as template_file:
-        ttp_template = template_file.read()
-    parser = ttp(data=output, template=ttp_template)
-    parser.parse()
-    result = parser.result()
-    return result
+def parse_output_with_ttp(ttp_path, output, ttp_template=None):
+    """
+    Parse command output with a TTP template, reusing the template's cached parsers.
+
+    Args:
+        ttp_path (str): Path to the .ttp file.
+        output (str): Text to parse.
+        ttp_template (TtpTemplate or str): Template already loaded by the driver compiler, or its text.
+
+    Returns:
+        list: The ttp results.
+    """
+    with metrics.timed('ttp_parse', label=ttp_path):
+        return ttp_cache.get_template(ttp_path, ttp_template).parse(output)
+
+
+def parse_outputs_with_ttp(ttp_path, outputs, ttp_template=None):
+    """
+    Parse several command outputs with the same TTP template in one call.
+
+    Args:
+        ttp_path (str): Path to the .ttp file.
+        outputs (list): Texts to parse.
+        ttp_template (TtpTemplate or str): Template already loaded by the driver compiler, or its text.
+
+    Returns:
+        list: One ttp result per output, in the same order.
+    """
+    if not outputs:
+        return []
+    start = time.perf_counter()
+    results = ttp_cache.get_template(ttp_path, ttp_template).parse_many(outputs)
+    elapsed = time.perf_counter() - start
+    # One sample per output, so ttp_parse timings compare with single parses
+    for _ in outputs:
+        metrics.observe('ttp_parse', elapsed / len(outputs), label=ttp_path)
+    return results
 
 
 
@@ -181,22 +214,25 @@ def log_command_execution(log_file, message):
         f.write(f"{message}\n")
         f.flush()
 def log_command_output(log_file, command, output):
-    with open(log_file, 'a') as f:
-        f.write(f"Raw output for command '{command}':\n{output}\n")
-        f.flush()
+    with metrics.timed('file_write', label='log'):
+        with open(log_file, 'a') as f:
+            f.write(f"Raw output for command '{command}':\n{output}\n")
+            f.flush()
 
 
 def send_command(channel, command, expect, output_queue, output_buffer, buffer_lock, timeout, maxpolls):
     channel.send(command + '\n')
     start_time = time.time()
-    output = ""
+    receiver = ReceiveBuffer()
+    found = False  # expect seen in the output so far; only the newest text is searched on each read
     last_read_time = start_time
     current_polls = 0
     while time.time() - start_time < timeout:
         current_polls += 1
         print(f"polling [{current_polls}]...." + channel.hostname)
         if current_polls > maxpolls:
-            if expect in output:
+            output = receiver.getvalue()
+            if found:
                 print(f"DEBUG: Expected prompt found after max polls. Command completed.")
                 output_queue.put("Command completed.")
                 return True, scrub_esc_codes(output, expect)
@@ -204,28 +240,23 @@ def send_command(channel, command, expect, output_queue, output_buffer, buffer_l
                 output_queue.put("DEBUG: Max polls reached, output may be incomplete.")
                 return True, scrub_esc_codes(output, expect)
         if channel.recv_ready():
-            chunk = channel.recv(4096).decode('utf-8')
+            chunk = receiver.feed(channel.recv(receiver.recv_size))
             # print(f"DEBUG: Received chunk: {chunk}")
-            output += chunk
+            found = found or expect in receiver.tail(len(chunk) + len(expect))
             with buffer_lock:
                 output_buffer.put(chunk)
             last_read_time = time.time()
         else:
-            if expect in output:
+            if found:
                 print(f"DEBUG: Expected prompt found. Command completed.")
                 output_queue.put("Command completed.")
-                return True, scrub_esc_codes(output, expect)
-            elif time.time() - last_read_time > 2:
-                # If no new data for 2 seconds, check if we're done
-                if expect in output:
-                    print(f"DEBUG: Expected prompt found after delay. Command completed.")
-                    output_queue.put("Command completed.")
-                    return True, scrub_esc_codes(output, expect)
+                return True, scrub_esc_codes(receiver.getvalue(), expect)
 
             time.sleep(0.1)
 
+    output = receiver.getvalue()
     print(f"DEBUG: Timeout reached. Last output: {output[-200:]}")
-    if expect in output:
+    if found:
         print(f"DEBUG: Expected prompt found, but timeout reached. Treating as success.")
         output_queue.put("Command completed (timeout reached).")
         return True, scrub_esc_codes(output, expect)
@@ -244,13 +275,14 @@ def dump_yaml_to_file(data, output_file_path):
 
 
 
-def resolve_action_vars(action, context):
+def resolve_action_vars(action, context, queries=None):
     """
     Resolves variables in action_vars using JMESPath queries within the context.
 
     Args:
         action (dict): The action containing action_vars with JMESPath queries.
         context (dict): The context data used for resolving JMESPath queries.
+        queries (dict): Expressions already compiled with query_cache.compile_query(), keyed by variable name.
 
     Returns:
         dict: The resolved variables for use in the action.
@@ -261,7 +293,10 @@ def resolve_action_vars(action, context):
             for key, query in var.items():
                 try:
                     # Resolve the variable using JMESPath
-                    resolved_vars[key] = jmespath.search(query, context)
+                    if queries and key in queries:
+                        resolved_vars[key] = queries[key].search(context)
+                    else:
+                        resolved_vars[key] = query_cache.search(query, context)
                 except jmespath.exceptions.JMESPathError as e:
                     print(f"Error resolving JMESPath query '{query}': {e}")
                     resolved_vars[key] = None  # Set to None if there's an error
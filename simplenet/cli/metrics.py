@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from simplenet.cli import events
+
+# Histogram bucket upper bounds in seconds, shared by every phase
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, float('inf'))
+
+# Timed phases of a device run. 'action' is also reported per action type via action_finished events.
+PHASES = ('tcp_probe', 'ssh_connect', 'driver_render', 'action', 'prompt_wait', 'ttp_parse', 'file_write')
+
+
+def observe(phase, seconds, device=None, label=None):
+    """
+    Record one timing sample for the current device.
+
+    Args:
+        phase (str): Phase name, normally one of PHASES.
+        seconds (float): Elapsed time.
+        device (str): Device hostname [default=the device set for this thread].
+        label (str): Optional sub-label, e.g. the TTP template or action type.
+    """
+    events.emit('metric', device=device, phase=phase, value=round(seconds, 6), label=label)
+
+
+def count(name, value, device=None):
+    """Add value to a per-device counter such as bytes_received."""
+    events.emit('metric', device=device, phase=name, value=value, kind='counter')
+
+
+@contextmanager
+def timed(phase, device=None, label=None):
+    """Context manager that records the time spent in its block as a sample for phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, time.perf_counter() - start, device=device, label=label)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.bucket_counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.bucket_counts):
+            seen += n
+            if seen >= rank:
+                return self.max if bound == float('inf') else min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(BUCKETS, self.bucket_counts):
+            cumulative += n
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': buckets,
+        }
+
+
+class MetricsCollector:
+    """
+    Aggregates metric and action_finished events into per-phase histograms and per-device totals.
+    """
+
+    def __init__(self):
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+        self.devices = defaultdict(lambda: defaultdict(float))
+
+    def handle(self, event):
+        event_type = event.get('type')
+        device = event.get('device')
+        if event_type == 'action_finished':
+            phase, label, value, kind = 'action', event.get('action'), event.get('duration') or 0, None
+        elif event_type == 'metric':
+            phase, label, value, kind = event.get('phase'), event.get('label'), event.get('value') or 0, event.get('kind')
+        else:
+            return
+
+        if kind == 'counter':
+            self.counters[phase] += value
+        else:
+            self.histograms[(phase, None)].add(value)
+            if label is not None:
+                self.histograms[(phase, label)].add(value)
+        if device:
+            self.devices[device][phase] += value
+
+    def phase_summary(self):
+        """Return {phase: histogram dict} for the unlabelled histograms."""
+        return {phase: histogram.to_dict() for (phase, label), histogram in sorted(self.histograms.items(),
+                key=lambda item: (item[0][0], item[0][1] or '')) if label is None}
+
+    def report(self, run_info=None):
+        """
+        Build the JSON metrics report.
+
+        Args:
+            run_info (dict): Run-level fields (run id, start/stop time, device counts) to include.
+
+        Returns:
+            dict: The report.
+        """
+        labelled = defaultdict(dict)
+        for (phase, label), histogram in self.histograms.items():
+            if label is not None:
+                labelled[phase][label] = histogram.to_dict()
+        return {
+            'run': run_info or {},
+            'phases': self.phase_summary(),
+            'phases_by_label': dict(labelled),
+            'counters': dict(self.counters),
+            'devices': {device: {phase: round(value, 6) for phase, value in phases.items()}
+                        for device, phases in sorted(self.devices.items())},
+        }
+
+    def write_json(self, path, run_info=None):
+        _atomic_write(path, json.dumps(self.report(run_info), indent=2))
+
+    def write_prometheus(self, path, run_info=None):
+        """
+        Write the metrics in Prometheus text exposition format, for the node_exporter textfile collector.
+
+        Args:
+            path (str): Output .prom file; written to a temporary file and renamed into place.
+            run_info (dict): Run-level fields; numeric 'devices_*' entries are exported as gauges.
+        """
+        lines = ['# HELP simplenet_phase_duration_seconds Time spent in each phase of a device run.',
+                 '# TYPE simplenet_phase_duration_seconds histogram']
+        for (phase, label), histogram in sorted(self.histograms.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+            labels = f'phase="{phase}"' + (f',label="{_escape(label)}"' if label is not None else '')
+            cumulative = 0
+            for bound, n in zip(BUCKETS, histogram.bucket_counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'simplenet_phase_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'simplenet_phase_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'simplenet_phase_duration_seconds_count{{{labels}}} {histogram.count}')
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'# TYPE simplenet_{name}_total counter')
+            lines.append(f'simplenet_{name}_total {value:g}')
+
+        for key, value in sorted((run_info or {}).items()):
+            if key.startswith('devices_') and isinstance(value, (int, float)):
+                lines.append(f'# TYPE simplenet_{key} gauge')
+                lines.append(f'simplenet_{key} {value}')
+
+        _atomic_write(path, '\n'.join(lines) + '\n')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _atomic_write(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
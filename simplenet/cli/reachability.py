@@ -0,0 +1,99 @@
+import asyncio
+import datetime
+import errno
+import time
+
+
+async def probe_device(host, port=22, timeout=3.0):
+    """
+    Probe a single TCP port without blocking the event loop.
+
+    Args:
+        host (str): Hostname or IP address to probe.
+        port (int): TCP port to connect to.
+        timeout (float): Seconds to wait for the connection to complete.
+
+    Returns:
+        dict: {'status': 'open'|'refused'|'timeout'|'error', 'latency_ms': float or None, 'error': str or None}
+    """
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        latency_ms = (time.perf_counter() - start) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return {'status': 'open', 'latency_ms': round(latency_ms, 2), 'error': None}
+    except asyncio.TimeoutError:
+        return {'status': 'timeout', 'latency_ms': None, 'error': f"No response within {timeout}s"}
+    except ConnectionRefusedError as e:
+        return {'status': 'refused', 'latency_ms': round((time.perf_counter() - start) * 1000, 2), 'error': str(e)}
+    except OSError as e:
+        status = 'timeout' if e.errno in (errno.ETIMEDOUT, errno.EHOSTUNREACH, errno.ENETUNREACH) else 'error'
+        return {'status': status, 'latency_ms': None, 'error': str(e)}
+
+
+async def _scan(rows, port, timeout, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_probe(row):
+        async with semaphore:
+            return await probe_device(row['mgmt_ip'], port, timeout)
+
+    return await asyncio.gather(*(bounded_probe(row) for row in rows))
+
+
+def scan_devices(rows, port=22, timeout=3.0, concurrency=500):
+    """
+    Probe every device concurrently before any work is dispatched.
+
+    Args:
+        rows (list): Device rows (dicts with 'id', 'hostname' and 'mgmt_ip').
+        port (int): TCP port to probe [default=22].
+        timeout (float): Per-device connect timeout in seconds [default=3.0].
+        concurrency (int): Maximum number of probes in flight at once [default=500].
+
+    Returns:
+        list: One dict per row with hostname, mgmt_ip, status, latency_ms and error, in row order.
+    """
+    if not rows:
+        return []
+    probes = asyncio.run(_scan(rows, port, timeout, concurrency))
+    checked_at = str(datetime.datetime.now())
+
+    results = []
+    for row, probe in zip(rows, probes):
+        results.append({
+            'device_id': row.get('id'),
+            'hostname': row['hostname'],
+            'mgmt_ip': row['mgmt_ip'],
+            'port': port,
+            'status': probe['status'],
+            'latency_ms': probe['latency_ms'],
+            'error': probe['error'],
+            'checked_at': checked_at,
+        })
+    return results
+
+
+def write_reachability_table(conn, results):
+    """
+    Store pre-scan results in the 'reachability' table of the inventory database.
+
+    The table is replaced on every scan so it always reflects the latest run.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the inventory database.
+        results (list): Records returned by scan_devices().
+    """
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS reachability
+                 (device_id INTEGER, hostname TEXT, mgmt_ip TEXT, port INTEGER, status TEXT,
+                 latency_ms REAL, error TEXT, checked_at TEXT)''')
+    c.execute('DELETE FROM reachability')
+    c.executemany('INSERT INTO reachability VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                  [(r['device_id'], r['hostname'], r['mgmt_ip'], r['port'], r['status'], r['latency_ms'],
+                    r['error'], r['checked_at']) for r in results])
+    conn.commit()
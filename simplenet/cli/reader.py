@@ -4,6 +4,8 @@ from colorama import Fore, Style, init
 from queue import Queue, Empty
 from threading import Lock
 
+from simplenet.cli.lib.receive import ReceiveBuffer
+
 
 def read_and_process_output(channel, output_queue, buffer, expect, prompt, log_file, error_string, buffer_lock,
                             global_prompt_count, pretty=False, timestamps=False, timeout=120):
@@ -29,13 +31,14 @@ def read_and_process_output(channel, output_queue, buffer, expect, prompt, log_f
             print(f"{timestamp} {msg}")
 
     start_time = time.time()
+    receiver = ReceiveBuffer(accumulate=False)  # chunks go to the queue, so only decode
     first_prompt_received = False
     prompt_received_event = threading.Event()
 
     with open(log_file, 'a') as f:
         while True:
             if channel.recv_ready():
-                output_chunk = channel.recv(4096).decode('utf-8').replace('\r', '')
+                output_chunk = receiver.feed(channel.recv(receiver.recv_size)).replace('\r', '')
                 timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
                 f.write(f"{timestamp} - {output_chunk}")
                 f.flush()
@@ -1,4 +1,7 @@
 import datetime
+import hashlib
+import statistics
+import time
 import click
 import sqlite3
 from ruamel.yaml import YAML
@@ -6,8 +9,24 @@ import subprocess
 import sys
 import os
 import socket
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from multiprocessing import Manager
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from simplenet.cli import events, metrics
+from simplenet.cli.cluster import ClusterCoordinator, parse_address
+from simplenet.cli.adaptive import AdaptiveConcurrency, classify_connection_error
+from simplenet.cli.engine import InProcessEngine
+from simplenet.cli.events import EventAggregator
+from simplenet.cli.metrics import MetricsCollector
+from simplenet.cli.journal import RunJournal, default_journal_path, new_run_id
+from simplenet.cli.lib.transcript import DEFAULT_TRANSCRIPT_SIZE
+from simplenet.cli.lib.prompt import DEFAULT_PROMPT_CACHE_DIR
+from simplenet.cli.crypto_profiles import CRYPTO_PROFILES, DEFAULT_CRYPTO_PROFILE
+from simplenet.cli.credentials import DEFAULT_CREDENTIAL_CACHE_DIR
+from simplenet.cli.driver_plan import DriverCompileError
+from simplenet.cli.driver_templates import get_driver_template, load_variables
+from simplenet.cli.reachability import scan_devices, write_reachability_table
+from simplenet.cli.scheduler import DeviceScheduler, dispatch, load_resource_limits, plan_deadline
 
 
 import sqlite3
@@ -15,90 +34,181 @@ import os
 from ruamel.yaml import YAML
 
 
-def create_sqlite_db(yaml_file, db_file):
+# Exit status of simplenet-runner: 1 when any device ended failed or unreachable, 2 when the run
+# itself could not start or aborted (unknown or mismatched --resume id, invalid driver, unexpected error)
+EXIT_DEVICES_FAILED = 1
+EXIT_RUN_ERROR = 2
+
+# Bump when INVENTORY_SCHEMA changes, so databases built by older versions are rebuilt
+INVENTORY_SCHEMA_VERSION = '2'
+
+INVENTORY_SCHEMA = [
+    '''CREATE TABLE devices
+       (id INTEGER PRIMARY KEY, hostname TEXT, mgmt_ip TEXT, model TEXT,
+       serial_number TEXT, timestamp TEXT, platform_id INTEGER, role_id INTEGER,
+       site_id INTEGER, vendor_id INTEGER, crypto_profile TEXT)''',
+    'CREATE TABLE credentials (id INTEGER PRIMARY KEY, name TEXT, username TEXT, password TEXT)',
+    'CREATE TABLE platforms (id INTEGER PRIMARY KEY, name TEXT, crypto_profile TEXT)',
+    'CREATE TABLE roles (id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE sites (id INTEGER PRIMARY KEY, name TEXT, location TEXT)',
+    'CREATE TABLE vendors (id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE device_credentials (device_id INTEGER, credential_id INTEGER)',
+    'CREATE TABLE inventory_meta (key TEXT PRIMARY KEY, value TEXT)',
+    # Create a view that joins devices with related tables
+    '''
+    CREATE VIEW device_details AS
+    SELECT
+        d.id, d.hostname, d.mgmt_ip, d.model, d.serial_number, d.timestamp,
+        p.name AS platform_name,
+        r.name AS role_name,
+        s.name AS site_name, s.location AS site_location,
+        v.name AS vendor_name,
+        COALESCE(d.crypto_profile, p.crypto_profile) AS crypto_profile
+    FROM devices d
+    LEFT JOIN platforms p ON d.platform_id = p.id
+    LEFT JOIN roles r ON d.role_id = r.id
+    LEFT JOIN sites s ON d.site_id = s.id
+    LEFT JOIN vendors v ON d.vendor_id = v.id
+    ''',
+    'CREATE INDEX idx_devices_hostname ON devices (hostname)',
+    'CREATE INDEX idx_devices_mgmt_ip ON devices (mgmt_ip)',
+    'CREATE INDEX idx_devices_site_id ON devices (site_id)',
+    'CREATE INDEX idx_devices_role_id ON devices (role_id)',
+    'CREATE INDEX idx_devices_platform_id ON devices (platform_id)',
+    'CREATE INDEX idx_device_credentials_device_id ON device_credentials (device_id)',
+]
+
+
+def inventory_fingerprint(yaml_file):
     """
-    Create a SQLite database file from a YAML file.
+    Compute the SHA-256 content hash of an inventory YAML file.
+
+    Args:
+        yaml_file (str): Path to the YAML file containing the inventory.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(yaml_file, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_inventory_meta(db_file):
+    """Return the inventory_meta table of an existing database as a dict, or None if unusable."""
+    try:
+        conn = sqlite3.connect(db_file)
+        try:
+            return dict(conn.execute('SELECT key, value FROM inventory_meta').fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def _build_inventory_db(yaml_file, db_file, meta):
+    """
+    Build the inventory database from YAML into db_file using bulk inserts in one transaction.
+
+    Args:
+        yaml_file (str): Path to the YAML file containing the inventory.
+        db_file (str): Path to the SQLite database file to write.
+        meta (dict): Values stored in the inventory_meta table (schema version, source hash, mtime, size).
+    """
+    # The safe loader uses the C extension when available and skips round-trip bookkeeping
+    yaml_loader = YAML(typ='safe')
+    with open(yaml_file, 'r') as file:
+        data = yaml_loader.load(file) or {}
+
+    devices = data.get('devices', [])
+    conn = sqlite3.connect(db_file)
+    try:
+        with conn:
+            c = conn.cursor()
+            for statement in INVENTORY_SCHEMA:
+                c.execute(statement)
+
+            c.executemany('INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                          [(device['id'], device['hostname'], device['mgmt_ip'], device['model'],
+                            device['serial_number'], device['timestamp'], device['platform_id'],
+                            device['role_id'], device['site_id'], device['vendor_id'],
+                            device.get('crypto_profile')) for device in devices])
+            c.executemany('INSERT INTO device_credentials VALUES (?, ?)',
+                          [(device['id'], cred_id) for device in devices
+                           for cred_id in device.get('credential_ids', [])])
+            c.executemany('INSERT INTO credentials VALUES (?, ?, ?, ?)',
+                          [(cred['id'], cred['name'], cred['username'], cred['password'])
+                           for cred in data.get('credentials', [])])
+            c.executemany('INSERT INTO platforms VALUES (?, ?, ?)',
+                          [(platform['id'], platform['name'], platform.get('crypto_profile'))
+                           for platform in data.get('platforms', [])])
+            c.executemany('INSERT INTO roles VALUES (?, ?)',
+                          [(role['id'], role['name']) for role in data.get('roles', [])])
+            c.executemany('INSERT INTO sites VALUES (?, ?, ?)',
+                          [(site['id'], site['name'], site['location']) for site in data.get('sites', [])])
+            c.executemany('INSERT INTO vendors VALUES (?, ?)',
+                          [(vendor['id'], vendor['name']) for vendor in data.get('vendors', [])])
+            c.executemany('INSERT INTO inventory_meta VALUES (?, ?)', [(k, str(v)) for k, v in meta.items()])
+    finally:
+        conn.close()
+
+
+def create_sqlite_db(yaml_file, db_file, force_rebuild=False):
+    """
+    Open the SQLite inventory database for a YAML file, rebuilding it only when the YAML has changed.
+
+    The database records the schema version and the source file's mtime, size and SHA-256 hash.
+    A database with another schema version is always rebuilt. If the mtime and size are
+    unchanged the database is reused as-is; otherwise the hash decides. A rebuild is written
+    to a temporary file and moved into place, so an interrupted build never leaves a partial DB.
 
     Args:
         yaml_file (str): Path to the YAML file containing the inventory.
         db_file (str): Path to the SQLite database file to create.
+        force_rebuild (bool): Rebuild even if the database is up to date.
 
     Returns:
         sqlite3.Connection: SQLite connection object to the created database.
     """
     try:
-        # Remove the existing database file if it exists
-        if os.path.exists(db_file):
-            os.remove(db_file)
+        stat = os.stat(yaml_file)
+        meta = {'schema_version': INVENTORY_SCHEMA_VERSION, 'source_mtime': stat.st_mtime_ns,
+                'source_size': stat.st_size}
+
+        stored = None if force_rebuild or not os.path.exists(db_file) else _read_inventory_meta(db_file)
+        if stored and stored.get('schema_version') != INVENTORY_SCHEMA_VERSION:
+            print(f"Inventory DB schema is outdated, rebuilding {db_file}")
+            stored = None
+        if stored:
+            if stored.get('source_mtime') == str(meta['source_mtime']) and \
+                    stored.get('source_size') == str(meta['source_size']):
+                print(f"Inventory unchanged, reusing SQLite DB at {db_file}")
+                return sqlite3.connect(db_file)
+
+            meta['source_sha256'] = inventory_fingerprint(yaml_file)
+            if stored.get('source_sha256') == meta['source_sha256']:
+                # Touched but not modified: refresh the recorded mtime and keep the data
+                conn = sqlite3.connect(db_file)
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO inventory_meta VALUES (?, ?)',
+                                     [(k, str(v)) for k, v in meta.items()])
+                print(f"Inventory content unchanged, reusing SQLite DB at {db_file}")
+                return conn
+        else:
+            meta['source_sha256'] = inventory_fingerprint(yaml_file)
 
         # Create a new SQLite database file
         print(f"Creating new SQLite DB at {db_file}")
-        conn = sqlite3.connect(db_file)
-        c = conn.cursor()
-
-        # Create tables based on the YAML structure
-        c.execute('''CREATE TABLE devices
-                     (id INTEGER PRIMARY KEY, hostname TEXT, mgmt_ip TEXT, model TEXT,
-                     serial_number TEXT, timestamp TEXT, platform_id INTEGER, role_id INTEGER,
-                     site_id INTEGER, vendor_id INTEGER)''')
-        c.execute('CREATE TABLE credentials (id INTEGER PRIMARY KEY, name TEXT, username TEXT, password TEXT)')
-        c.execute('CREATE TABLE platforms (id INTEGER PRIMARY KEY, name TEXT)')
-        c.execute('CREATE TABLE roles (id INTEGER PRIMARY KEY, name TEXT)')
-        c.execute('CREATE TABLE sites (id INTEGER PRIMARY KEY, name TEXT, location TEXT)')
-        c.execute('CREATE TABLE vendors (id INTEGER PRIMARY KEY, name TEXT)')
-        c.execute('CREATE TABLE device_credentials (device_id INTEGER, credential_id INTEGER)')
-
-        # Create a view that joins devices with related tables
-        c.execute('''
-        CREATE VIEW device_details AS
-        SELECT 
-            d.id, d.hostname, d.mgmt_ip, d.model, d.serial_number, d.timestamp,
-            p.name AS platform_name,
-            r.name AS role_name,
-            s.name AS site_name, s.location AS site_location,
-            v.name AS vendor_name
-        FROM devices d
-        LEFT JOIN platforms p ON d.platform_id = p.id
-        LEFT JOIN roles r ON d.role_id = r.id
-        LEFT JOIN sites s ON d.site_id = s.id
-        LEFT JOIN vendors v ON d.vendor_id = v.id
-        ''')
-
-        # Load YAML data using ruamel.yaml
-        yaml_loader = YAML()
-        yaml_loader.preserve_quotes = True  # Preserve quotes if necessary
-
-        with open(yaml_file, 'r') as file:
-            data = yaml_loader.load(file)
-
-        # Insert data into tables
-        for device in data.get('devices', []):
-            c.execute('''INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (device['id'], device['hostname'], device['mgmt_ip'], device['model'],
-                       device['serial_number'], device['timestamp'], device['platform_id'],
-                       device['role_id'], device['site_id'], device['vendor_id']))
-            for cred_id in device.get('credential_ids', []):
-                c.execute('INSERT INTO device_credentials VALUES (?, ?)', (device['id'], cred_id))
-
-        for cred in data.get('credentials', []):
-            c.execute('INSERT INTO credentials VALUES (?, ?, ?, ?)',
-                      (cred['id'], cred['name'], cred['username'], cred['password']))
-
-        for platform in data.get('platforms', []):
-            c.execute('INSERT INTO platforms VALUES (?, ?)', (platform['id'], platform['name']))
-
-        for role in data.get('roles', []):
-            c.execute('INSERT INTO roles VALUES (?, ?)', (role['id'], role['name']))
-
-        for site in data.get('sites', []):
-            c.execute('INSERT INTO sites VALUES (?, ?, ?)', (site['id'], site['name'], site['location']))
-
-        for vendor in data.get('vendors', []):
-            c.execute('INSERT INTO vendors VALUES (?, ?)', (vendor['id'], vendor['name']))
-
-        conn.commit()
+        tmp_file = f"{db_file}.tmp"
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        _build_inventory_db(yaml_file, tmp_file, meta)
+        os.replace(tmp_file, db_file)
+
         print("Database created and data inserted successfully.")
-        return conn
+        return sqlite3.connect(db_file)
 
     except sqlite3.Error as e:
         print(f"SQLite error occurred: {e}")
@@ -109,26 +219,37 @@ def create_sqlite_db(yaml_file, db_file):
         return None
 
 
-
-
-def check_device_reachability(hostname):
+def check_device_reachability(hostname, timeout=10):
     """
     Check if a device is reachable on port 22 (SSH).
 
     Args:
         hostname (str): The hostname or IP address of the device.
+        timeout (float): Connect timeout in seconds [default=10].
 
     Returns:
         bool: True if the device is reachable, False otherwise.
     """
-    port = 22
-    timeout = 10  # Timeout in seconds
+    return probe_ssh_port(hostname, timeout) is None
+
 
+def probe_ssh_port(hostname, timeout=10):
+    """
+    Probe port 22 (SSH) on a device and classify a failure.
+
+    Args:
+        hostname (str): The hostname or IP address of the device.
+        timeout (float): Connect timeout in seconds [default=10].
+
+    Returns:
+        str: None if the port accepted the connection, otherwise the error type from
+            classify_connection_error(), e.g. 'refused' or 'timeout'.
+    """
     try:
-        with socket.create_connection((hostname, port), timeout):
-            return True
-    except (socket.timeout, socket.error):
-        return False
+        with socket.create_connection((hostname, 22), timeout):
+            return None
+    except (socket.timeout, socket.error) as e:
+        return classify_connection_error(e)
 
 
 def log_message(log_file, hostname, reason):
@@ -145,24 +266,43 @@ def log_message(log_file, hostname, reason):
 
 
 def run_for_device(row, db_file, driver, vars_file, driver_name, timeout, prompt, prompt_count, inter_command_time,
-                   pretty, look_for_keys, timestamps, output_root, query, counters, error_log, connection_failures):
+                   pretty, look_for_keys, timestamps, output_root, query, check_reachability=True, echo_output=True,
+                   transcript_size=None, transcript_dir=None, prompt_cache_dir=None, learn_prompt=True,
+                   crypto_profile=None, credential_cache_dir=None):
     """
     Run the new utility for a single device.
 
+    The child writes progress events to stdout as prefixed NDJSON lines; they are forwarded to
+    the runner's event sink and everything else is echoed to the console.
+
     Args:
-        row: Device details from the SQL query.
+        row (dict): Device details from the SQL query.
+        check_reachability (bool): Probe port 22 first; disabled when a pre-scan already ran.
+        echo_output (bool): Echo the child's console output.
+        transcript_size (int): Characters of session transcript the child keeps in memory [default=the child's default].
+        transcript_dir (str): Directory for spilled transcripts, or None to drop overflow.
+        prompt_cache_dir (str): Directory caching learned prompt regexes [default=the child's default].
+        learn_prompt (bool): Learn the device prompt after login.
+        crypto_profile (str): SSH crypto profile for devices whose inventory entry sets none.
+        credential_cache_dir (str): Directory recording each device's working credential [default=the child's default].
         Other args are the Click parameters to pass to the new utility.
+
+    Returns:
+        dict: Result record with hostname, mgmt_ip, status, exit_code and duration.
     """
-    hostname = row[1]  # Assuming the hostname is the second column in the results
-    mgmt_ip = row[2]
+    hostname = row['hostname']
+    mgmt_ip = row['mgmt_ip']
     print(f"Running tool for device: {hostname}")
+    start = time.perf_counter()
 
     # Pre-check for device reachability on port 22
-    if not check_device_reachability(mgmt_ip):
-        print(f"Device {hostname}:{mgmt_ip} is not reachable on port 22.")
-        log_message(connection_failures, hostname + ":" + mgmt_ip, "Unreachable on port 22")
-        counters['failed'] += 1  # Increment failed counter
-        return
+    probe_error = None
+    if check_reachability:
+        with metrics.timed('tcp_probe', device=hostname):
+            probe_error = probe_ssh_port(mgmt_ip)
+    if probe_error:
+        events.emit('failed', device=hostname, reason='unreachable', error_type=probe_error)
+        return {'hostname': hostname, 'mgmt_ip': mgmt_ip, 'status': 'unreachable', 'exit_code': None}
 
     # Construct the command to run the utility
     cmd = [
@@ -175,7 +315,8 @@ def run_for_device(row, db_file, driver, vars_file, driver_name, timeout, prompt
         '--prompt', prompt,
         '--prompt-count', str(prompt_count),
         '--inter-command-time', str(inter_command_time),
-        '--output-root', output_root
+        '--output-root', output_root,
+        '--event-stream'
     ]
 
     # Optional arguments
@@ -187,28 +328,184 @@ def run_for_device(row, db_file, driver, vars_file, driver_name, timeout, prompt
         cmd.append('--look-for-keys')
     if timestamps:
         cmd.append('--timestamps')
+    if transcript_size is not None:
+        cmd.extend(['--transcript-size', str(transcript_size)])
+    if transcript_dir:
+        cmd.extend(['--transcript-dir', transcript_dir])
+    if prompt_cache_dir:
+        cmd.extend(['--prompt-cache-dir', prompt_cache_dir])
+    if not learn_prompt:
+        cmd.append('--no-learn-prompt')
+    if crypto_profile:
+        cmd.extend(['--crypto-profile', crypto_profile])
+    if credential_cache_dir:
+        cmd.extend(['--credential-cache-dir', credential_cache_dir])
 
     # Run the command and capture stdout/stderr
     process = subprocess.Popen(
         cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
     )
 
-    # Stream the output line by line
+    # Stream the output line by line, separating events from console output
     for line in iter(process.stdout.readline, ''):
-        print(line, end='')
+        event = events.parse_event_line(line)
+        if event is not None:
+            events.forward(event)
+        elif echo_output:
+            print(line, end='')
 
     process.stdout.close()
     exit_code = process.wait()
 
-    # Check for non-zero exit code and log it
-    if exit_code != 0:
-        print(f"Device {hostname} returned a non-zero exit code: {exit_code}")
-        log_message(error_log, hostname, f"Non-zero exit code: {exit_code}")
-        counters['failed'] += 1  # Increment failed counter
+    print(f"\n{'=' * 50}\nCompleted tool run for device: {hostname}\n{'=' * 50}\n")
+    return {'hostname': hostname, 'mgmt_ip': mgmt_ip, 'status': 'completed' if exit_code == 0 else 'failed',
+            'exit_code': exit_code, 'duration': round(time.perf_counter() - start, 3)}
+
+
+def record_result(result, counters, error_log, connection_failures):
+    """
+    Update the run counters and failure logs from a device result record.
+
+    Args:
+        result (dict): Result record returned by a device run.
+        counters (dict): Run counters ('processed' and 'failed').
+        error_log (str): Path to the error log file.
+        connection_failures (str): Path to the connection failures log file.
+    """
+    hostname = result['hostname']
+    if result['status'] == 'unreachable':
+        print(f"Device {hostname}:{result['mgmt_ip']} is not reachable on port 22.")
+        log_message(connection_failures, hostname + ":" + result['mgmt_ip'], result.get('reason', "Unreachable on port 22"))
+        counters['failed'] += 1
+    elif result['status'] != 'completed':
+        print(f"Device {hostname} returned a non-zero exit code: {result['exit_code']}")
+        log_message(error_log, hostname, f"Non-zero exit code: {result['exit_code']}")
+        counters['failed'] += 1
     else:
-        counters['processed'] += 1  # Increment processed counter
+        counters['processed'] += 1
 
-    print(f"\n{'=' * 50}\nCompleted tool run for device: {hostname}\n{'=' * 50}\n")
+
+def validate_driver(driver, vars_file, driver_name, row):
+    """
+    Compile the driver as it renders for one device, before any device logs in.
+
+    Unlike a device's own compile, an unknown action type is an error here, so a typo stops the
+    run up front instead of being skipped on every device.
+
+    Only drivers whose Jinja sits inside YAML values are checked. Where Jinja builds the YAML
+    structure the driver may differ per device, so it is left to each device's own compile.
+
+    Args:
+        driver (str): Path to the driver YAML file.
+        vars_file (str): Path to the variables YAML file, or None.
+        driver_name (str): Name of the driver to check.
+        row (dict): A device row to render the driver for.
+
+    Returns:
+        str: The compile error, or None if the driver compiled or was not checked.
+    """
+    driver_template = get_driver_template(driver)
+    if not driver_template.per_value:
+        return None
+    variables = dict(load_variables(vars_file), hostname=row['hostname'], mgmt_ip=row['mgmt_ip'])
+    driver_config = ((driver_template.render(variables) or {}).get('drivers') or {}).get(driver_name)
+    try:
+        driver_template.plan(driver_name, driver_config, strict=True)
+    except DriverCompileError as e:
+        return str(e)
+    return None
+
+
+def prescan_devices(conn, rows, timeout, concurrency):
+    """
+    Probe all devices concurrently and split them into live rows and unreachable results.
+
+    Args:
+        conn (sqlite3.Connection): Inventory database connection, used to store the reachability table.
+        rows (list): Device rows returned by the inventory query.
+        timeout (float): Per-device connect timeout in seconds.
+        concurrency (int): Maximum number of probes in flight.
+
+    Returns:
+        tuple: (live_rows, unreachable_results)
+    """
+    scan_start = datetime.datetime.now()
+    scan_results = scan_devices(rows, timeout=timeout, concurrency=concurrency)
+    write_reachability_table(conn, scan_results)
+
+    live_rows = []
+    unreachable = []
+    for row, probe in zip(rows, scan_results):
+        if probe['latency_ms'] is not None:
+            metrics.observe('tcp_probe', probe['latency_ms'] / 1000, device=row['hostname'])
+        if probe['status'] == 'open':
+            live_rows.append(row)
+        else:
+            unreachable.append({'hostname': row['hostname'], 'mgmt_ip': row['mgmt_ip'], 'status': 'unreachable',
+                                'exit_code': None, 'reason': f"Pre-scan {probe['status']} on port 22",
+                                'error_type': probe['status'] if probe['status'] in ('refused', 'timeout') else 'other'})
+
+    print(f"Reachability pre-scan: {len(live_rows)} reachable, {len(unreachable)} unreachable "
+          f"({datetime.datetime.now() - scan_start})")
+    return live_rows, unreachable
+
+
+def build_executor(engine, job, num_processes, threads_per_process, event_queue=None):
+    """
+    Create the local execution engine for a job.
+
+    Args:
+        engine (str): 'subprocess' to run each device in its own interpreter, or 'inprocess'
+            for long-lived worker processes.
+        job (dict): Job definition (db_file, driver, vars_file, driver_name, query,
+            check_reachability and the per-device options).
+        num_processes (int): Number of worker processes.
+        threads_per_process (int): Concurrent device sessions per process with the inprocess engine.
+        event_queue (multiprocessing.Queue): Destination for device progress events, or None.
+
+    Returns:
+        tuple: (executor, submit, capacity) where submit(row) returns a Future resolving to a result
+        record and capacity is the number of devices the engine can run at once.
+    """
+    options = job['options']
+    if engine == 'inprocess':
+        # Ensure output and log directories exist, as the simplenet CLI would
+        os.makedirs(options['global_output_path'], exist_ok=True)
+        os.makedirs('./log', exist_ok=True)
+        executor = InProcessEngine(num_processes, threads_per_process, job, event_queue=event_queue)
+        return executor, executor.submit, executor.capacity
+
+    # Use ProcessPoolExecutor for concurrency; each worker forwards its children's events to event_queue
+    executor = ProcessPoolExecutor(max_workers=num_processes, initializer=events.set_queue_sink,
+                                   initargs=(event_queue,))
+
+    def submit(row):
+        return executor.submit(run_for_device, row, job['db_file'], job['driver'], job['vars_file'],
+                               job['driver_name'], options['timeout'], options['prompt'], options['prompt_count'],
+                               options['inter_command_time'], options['pretty'], options['look_for_keys'],
+                               options['timestamps'], options['global_output_path'], job['query'],
+                               job['check_reachability'], not job.get('quiet'),
+                               options.get('transcript_size'), options.get('transcript_dir'),
+                               options.get('prompt_cache_dir'), options.get('learn_prompt', True),
+                               options.get('crypto_profile'), options.get('credential_cache_dir'))
+
+    return executor, submit, num_processes
+
+
+def fetch_device_rows(cursor, query):
+    """
+    Execute the inventory query and return each row as a dictionary keyed by column name.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on the inventory database.
+        query (str): SQL query selecting the devices to run against.
+
+    Returns:
+        list: One dict per matching row.
+    """
+    cursor.execute(query)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 
 @click.command()
@@ -226,8 +523,76 @@ def run_for_device(row, db_file, driver, vars_file, driver_name, timeout, prompt
 @click.option('--pretty', is_flag=True, help='Enable pretty output.')
 @click.option('--output-root', default='./output', help='Root directory for all output files [default=./output].')
 @click.option('--num-processes', default=4, help='Number of processes to run concurrently [default=4].')
+@click.option('--engine', type=click.Choice(['subprocess', 'inprocess']), default='subprocess',
+              help='Run each device in its own interpreter, or in long-lived worker processes [default=subprocess].')
+@click.option('--threads-per-process', default=8,
+              help='Concurrent device sessions per worker process with --engine inprocess [default=8].')
+@click.option('--max-in-flight', default=0,
+              help='Maximum devices dispatched at once [default=0, the engine capacity].')
+@click.option('--adaptive', is_flag=True,
+              help='Adjust devices in flight automatically (AIMD) from handshake latency and connection failures.')
+@click.option('--adaptive-min', default=1, help='Lowest in-flight limit with --adaptive [default=1].')
+@click.option('--adaptive-max', default=0,
+              help='Highest in-flight limit with --adaptive [default=0, --max-in-flight or the engine capacity].')
+@click.option('--order', type=click.Choice(['query', 'longest-first']), default='query',
+              help='Dispatch in query order, or longest expected duration first from run history [default=query].')
+@click.option('--deadline', default=0.0,
+              help='Seconds the job may run; devices that are not expected to fit are deferred [default=0, none].')
+@click.option('--priority-query', required=False,
+              help='SQL query returning hostnames of high-value devices, dispatched first and kept within --deadline.')
+@click.option('--site-limit', default=0, help='Maximum concurrent devices per site_id [default=0, unlimited].')
+@click.option('--role-limit', default=0, help='Maximum concurrent devices per role_id [default=0, unlimited].')
+@click.option('--resource-limits', required=False,
+              help='YAML file of shared resources (e.g. TACACS servers) with per-resource concurrency limits.')
+@click.option('--journal', required=False,
+              help='Path to the run journal database [default=simplenet_runs.db next to --output-root].')
+@click.option('--resume', 'resume_run_id', required=False,
+              help='Resume the given run id, dispatching only devices that have not completed.')
+@click.option('--retries', default=0, help='Times to retry failed devices at the end of the run [default=0].')
+@click.option('--retry-backoff', default=30.0,
+              help='Seconds to wait before the first retry round, doubling each round [default=30].')
+@click.option('--coordinator', required=False,
+              help='Listen on HOST:PORT (or PORT, on 127.0.0.1) and distribute devices to simplenet-worker nodes '
+                   'instead of running them locally. The protocol is plaintext.')
+@click.option('--cluster-token', envvar='SIMPLENET_CLUSTER_TOKEN', required=False,
+              help='Shared secret workers must present with --coordinator (or set SIMPLENET_CLUSTER_TOKEN) '
+                   '[default=a random token, printed at start].')
+@click.option('--min-workers', default=1, help='Workers to wait for before dispatching with --coordinator [default=1].')
+@click.option('--heartbeat-timeout', default=15.0,
+              help='Seconds without a heartbeat before a worker is dropped and its devices reassigned [default=15].')
+@click.option('--worker-grace', default=60.0, type=click.FloatRange(min=0),
+              help='Seconds devices wait for a worker once none is connected to --coordinator, before they fail [default=60].')
+@click.option('--events-file', required=False, help='Append every device progress event to this NDJSON file.')
+@click.option('--quiet', is_flag=True, help='Do not echo per-device console output; report progress through events only.')
+@click.option('--metrics-json', required=False, help='Write per-phase timing histograms and per-device totals to this JSON file.')
+@click.option('--metrics-prom', required=False,
+              help='Write per-phase timing histograms in Prometheus text format (textfile collector .prom file).')
+@click.option('--rebuild-inventory', is_flag=True, help='Rebuild the SQLite inventory even if the YAML is unchanged.')
+@click.option('--prescan', is_flag=True, help='Probe all devices concurrently and dispatch only reachable ones.')
+@click.option('--prescan-timeout', default=3.0, help='Connect timeout in seconds for the pre-scan [default=3.0].')
+@click.option('--prescan-concurrency', default=500, help='Maximum probes in flight during the pre-scan [default=500].')
+@click.option('--transcript-size', default=DEFAULT_TRANSCRIPT_SIZE,
+              help=f'Characters of session transcript kept in memory per device, 0 for unbounded [default={DEFAULT_TRANSCRIPT_SIZE}].')
+@click.option('--transcript-dir', required=False,
+              help='Spill transcript overflow to gzip files in this directory instead of dropping it.')
+@click.option('--prompt-cache-dir', default=DEFAULT_PROMPT_CACHE_DIR,
+              help=f'Directory caching the prompt regex learned for each device [default={DEFAULT_PROMPT_CACHE_DIR}].')
+@click.option('--no-learn-prompt', is_flag=True,
+              help='Do not learn device prompts; end command output on a pause in the output instead.')
+@click.option('--crypto-profile', type=click.Choice(list(CRYPTO_PROFILES)), required=False,
+              help=f'SSH crypto profile for devices whose inventory sets none for the device or its platform '
+                   f'[default={DEFAULT_CRYPTO_PROFILE}].')
+@click.option('--credential-cache-dir', default=DEFAULT_CREDENTIAL_CACHE_DIR,
+              help=f'Directory recording the credential that last logged in to each device [default={DEFAULT_CREDENTIAL_CACHE_DIR}].')
+@click.option('--reuse-connections', is_flag=True,
+              help='Keep SSH sessions in a per-process pool and reuse them for later work on the same device '
+                   '(--engine inprocess and cluster workers).')
 def main(inventory, query, driver, vars, driver_name, timeout, prompt, prompt_count, look_for_keys, timestamps,
-               inter_command_time, pretty, output_root, num_processes):
+               inter_command_time, pretty, output_root, num_processes, engine, threads_per_process, max_in_flight,
+               adaptive, adaptive_min, adaptive_max, order, deadline, priority_query, site_limit, role_limit, resource_limits, journal, resume_run_id, retries, retry_backoff,
+               coordinator, cluster_token, min_workers, heartbeat_timeout, worker_grace, events_file, quiet, metrics_json, metrics_prom,
+               rebuild_inventory, prescan, prescan_timeout, prescan_concurrency, transcript_size, transcript_dir,
+               prompt_cache_dir, no_learn_prompt, crypto_profile, credential_cache_dir, reuse_connections):
     """
     Command-line tool to query YAML inventory data using SQL and execute commands for matching devices.
     """
@@ -236,6 +601,7 @@ def main(inventory, query, driver, vars, driver_name, timeout, prompt, prompt_co
 
     # Start time
     start_time = datetime.datetime.now()
+    start_monotonic = time.monotonic()
     print(f"Processing started at: {start_time}")
 
     # Load driver logging paths from the YAML configuration
@@ -248,62 +614,269 @@ def main(inventory, query, driver, vars, driver_name, timeout, prompt, prompt_co
     error_log = "error.log"
     connection_failures = "connection_failures.log"
 
-    # Initialize counters using Manager for thread-safe operations
-    with Manager() as manager:
-        counters = manager.dict()
-        counters['processed'] = 0
-        counters['failed'] = 0
+    # Results are collected in the parent process, so plain counters are sufficient
+    counters = {'processed': 0, 'failed': 0}
+
+    run_journal = RunJournal(journal or default_journal_path(output_root))
+    run_id = resume_run_id or new_run_id()
+    if resume_run_id and not run_journal.get_run(resume_run_id):
+        print(f"Run id {resume_run_id} not found in journal {run_journal.journal_path}")
+        run_journal.close()
+        sys.exit(EXIT_RUN_ERROR)
+    if resume_run_id:
+        # Resuming under another query or driver would mark devices completed by different work
+        mismatched = run_journal.mismatched_settings(resume_run_id, query=query, driver=driver, driver_name=driver_name)
+        if mismatched:
+            for column, (stored, given) in mismatched.items():
+                print(f"Cannot resume run {resume_run_id}: it ran with {column} {stored!r}, not {given!r}")
+            run_journal.close()
+            sys.exit(EXIT_RUN_ERROR)
+    print(f"Run id: {run_id} (journal: {run_journal.journal_path})")
+
+    # Workers send typed progress events to this queue; the aggregator summarizes them in the parent
+    event_queue = multiprocessing.Queue()
+    metrics_collector = MetricsCollector()
+    event_aggregator = EventAggregator(events_file, listeners=[metrics_collector]).start(event_queue)
+    events.set_sink(event_aggregator.handle)
 
-        try:
-            # Create a SQLite database file from the YAML file
-            conn = create_sqlite_db(inventory, db_file)
-            cursor = conn.cursor()
-
-            # Execute the provided SQL query
-            cursor.execute(query)
-            results = cursor.fetchall()
-
-            # If results found, run the utility for each matching device using concurrency
-            if results:
-                print(f"Devices matching query: {query}")
-
-                # Use ProcessPoolExecutor for concurrency
-                with ProcessPoolExecutor(max_workers=num_processes) as executor:
-                    futures = {executor.submit(run_for_device, row, db_file, driver, vars, driver_name, timeout, prompt,
-                                               prompt_count, inter_command_time, pretty, look_for_keys, timestamps,
-                                               output_root, query, counters, error_log, connection_failures): row for row in results}
-
-                    for future in as_completed(futures):
-                        try:
-                            future.result()  # Block until each future completes
-                        except Exception as e:
-                            print(f"Error occurred: {str(e)}")
-
-                # Stop time
-                stop_time = datetime.datetime.now()
-                print(f"Processing stopped at: {stop_time}")
-
-                # Calculate total execution time
-                total_execution_time = stop_time - start_time
-
-                # Format the total execution time as hh:mm:ss
-                formatted_total_time = str(total_execution_time)
-
-                # Display summary
-                print(f"Devices processed: {counters['processed']}")
-                print(f"Failed devices: {counters['failed']}")
-                print(f"Start time: {start_time}")
-                print(f"Stop time: {stop_time}")
-                print(f"Total execution time: {formatted_total_time}")
+    try:
+        # Open the SQLite inventory, rebuilding it only if the YAML file changed
+        conn = create_sqlite_db(inventory, db_file, force_rebuild=rebuild_inventory)
+        cursor = conn.cursor()
+
+        # Execute the provided SQL query
+        results = fetch_device_rows(cursor, query)
+
+        # If results found, run the utility for each matching device using concurrency
+        if results:
+            # Validate the driver once here rather than letting every device fail on it
+            driver_error = validate_driver(driver, vars, driver_name, results[0])
+            if driver_error:
+                print(f"Invalid driver '{driver_name}' in {driver}: {driver_error}")
+                sys.exit(EXIT_RUN_ERROR)
+            print(f"Devices matching query: {query}")
+            run_journal.start_run(run_id, inventory, query, driver, driver_name, output_root, results)
+
+            if resume_run_id:
+                completed = run_journal.completed_hostnames(run_id)
+                results = [row for row in results if row['hostname'] not in completed]
+                print(f"Resuming run {run_id}: {len(completed)} devices already completed, {len(results)} remaining")
+
+            if prescan:
+                results, unreachable = prescan_devices(conn, results, prescan_timeout, prescan_concurrency)
+                for result in unreachable:
+                    events.emit('failed', device=result['hostname'], reason='unreachable',
+                                error_type=result['error_type'])
+                    record_result(result, counters, error_log, connection_failures)
+                    run_journal.record_result(run_id, result)
+
+            job = {
+                'db_file': db_file,
+                'driver': driver,
+                'vars_file': vars,
+                'driver_name': driver_name,
+                'query': query,
+                'check_reachability': not prescan,
+                'quiet': quiet,
+                'options': {
+                    'pretty': pretty,
+                    'timeout': timeout,
+                    'prompt': prompt,
+                    'prompt_count': prompt_count,
+                    'look_for_keys': look_for_keys,
+                    'timestamps': timestamps,
+                    'inter_command_time': inter_command_time,
+                    'global_output_path': output_root,
+                    'global_output_mode': 'overwrite',
+                    'transcript_size': transcript_size,
+                    'transcript_dir': transcript_dir,
+                    'prompt_cache_dir': prompt_cache_dir,
+                    'learn_prompt': not no_learn_prompt,
+                    'crypto_profile': crypto_profile,
+                    'credential_cache_dir': credential_cache_dir,
+                    'reuse_connections': reuse_connections,
+                },
+            }
+
+            if coordinator:
+                # Devices are run by simplenet-worker nodes; results stream back to this process
+                host, port = parse_address(coordinator)
+                executor = ClusterCoordinator(host, port, job, heartbeat_timeout=heartbeat_timeout,
+                                              on_event=events.forward, worker_grace=worker_grace,
+                                              token=cluster_token).start()
+                if not cluster_token:
+                    print(f"Cluster token: {executor.token} (pass it to simplenet-worker with --token)")
+                print(f"Waiting for {min_workers} worker(s) to connect...")
+                executor.wait_for_workers(min_workers)
+                submit = executor.submit
+                capacity = executor.capacity
+                # Workers join and leave during the run, so the limit follows the live capacity. With no
+                # worker connected one device is still queued, to be failed after --worker-grace.
+                in_flight_limit = max_in_flight or (lambda: max(executor.capacity, 1))
             else:
-                print("No results found for the given query.")
-
-        except Exception as e:
-            print(f"Error occurred: {str(e)}")
+                executor, submit, capacity = build_executor(engine, job, num_processes, threads_per_process,
+                                                            event_queue=event_queue)
+                in_flight_limit = max_in_flight or capacity
+
+            controller = None
+            if adaptive:
+                # Start small and let the controller find the level the network and AAA servers sustain
+                ceiling = adaptive_max or max_in_flight or capacity
+                controller = AdaptiveConcurrency(initial=min(8, ceiling), minimum=adaptive_min, maximum=ceiling)
+                event_aggregator.add_listener(controller)
+                in_flight_limit = controller
+                print(f"Adaptive concurrency: starting at {controller.limit}, range {controller.minimum}-{controller.maximum}")
+
+            # Expected durations from previous runs drive longest-first ordering and deadline planning
+            expected = {}
+            if order == 'longest-first' or deadline:
+                history = run_journal.expected_durations(driver_name)
+                default_duration = statistics.median(history.values()) if history else 60.0
+                expected = {row['hostname']: history.get(row['hostname'], default_duration) for row in results}
+
+            priority_hosts = set()
+            if priority_query:
+                priority_hosts = {row[0] for row in conn.execute(priority_query)}
+
+            def dispatch_priority(row):
+                return row['hostname'] in priority_hosts, expected.get(row['hostname'], 0)
+
+            ordered = order == 'longest-first' or bool(priority_hosts) or bool(deadline)
+            deadline_at = start_monotonic + deadline if deadline else None
+            deferred_rows = []
+            if deadline:
+                slots = max_in_flight or capacity
+                available = deadline_at - time.monotonic()
+                results, deferred_rows, makespan = plan_deadline(results, expected, slots, available, dispatch_priority)
+                print(f"Deadline plan: {len(results)} devices expected to finish in {makespan:.1f}s of {available:.1f}s "
+                      f"on {slots} slots; {len(deferred_rows)} deferred")
+
+            resources = load_resource_limits(resource_limits)
+            failed_rows = []
+
+            def journaled_submit(row):
+                run_journal.mark_running(run_id, row['hostname'])
+                return submit(row)
+
+            def on_complete(row, future):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error occurred: {str(e)}")
+                    result = {'hostname': row['hostname'], 'mgmt_ip': row['mgmt_ip'], 'status': 'failed',
+                              'exit_code': None}
+                record_result(result, counters, error_log, connection_failures)
+                run_journal.record_result(run_id, result, output_location=output_root)
+                if result['status'] == 'completed' and result.get('duration') is not None:
+                    run_journal.record_duration(result['hostname'], driver_name, result['duration'])
+                if result['status'] != 'completed':
+                    failed_rows.append(row)
+
+            with executor:
+                pending_rows = results
+                for attempt in range(retries + 1):
+                    if attempt:
+                        # Retry only the devices that failed in the previous round, with exponential backoff
+                        pending_rows, failed_rows[:] = list(failed_rows), []
+                        if not pending_rows or (deadline_at and time.monotonic() >= deadline_at):
+                            break
+                        delay = retry_backoff * (2 ** (attempt - 1))
+                        print(f"Retry round {attempt}/{retries}: {len(pending_rows)} devices in {delay}s")
+                        time.sleep(delay)
+                        counters['failed'] -= len(pending_rows)
+
+                    scheduler = DeviceScheduler(pending_rows, site_limit=site_limit, role_limit=role_limit,
+                                                resources=resources, priority=dispatch_priority if ordered else None)
+                    # Only max_in_flight devices are submitted at a time; the scheduler picks each next device
+                    dispatch(scheduler, journaled_submit, in_flight_limit, on_complete, deadline=deadline_at)
+
+                    if deadline_at and time.monotonic() >= deadline_at and scheduler.pending():
+                        print(f"Deadline reached: {scheduler.pending()} devices not started")
+                        deferred_rows.extend(scheduler.remaining())
+                    elif scheduler.pending():
+                        print(f"Warning: {scheduler.pending()} devices could not be scheduled under the configured limits.")
+
+            for row in deferred_rows:
+                run_journal.record_result(run_id, {'hostname': row['hostname'], 'status': 'deferred', 'exit_code': None})
+
+            run_journal.finish_run(run_id)
+            event_aggregator.stop()
+            event_summary = event_aggregator.summary()
+
+            # Stop time
+            stop_time = datetime.datetime.now()
+            print(f"Processing stopped at: {stop_time}")
+
+            # Calculate total execution time
+            total_execution_time = stop_time - start_time
+
+            # Format the total execution time as hh:mm:ss
+            formatted_total_time = str(total_execution_time)
+
+            # Display summary
+            print(f"Devices processed: {counters['processed']}")
+            print(f"Failed devices: {counters['failed']}")
+            if deferred_rows:
+                print(f"Deferred devices (did not fit the deadline): {len(deferred_rows)}")
+                for row in deferred_rows:
+                    print(f"  {row['hostname']} (expected {expected.get(row['hostname'], 0):.1f}s)")
+            print(f"Start time: {start_time}")
+            print(f"Stop time: {stop_time}")
+            print(f"Total execution time: {formatted_total_time}")
+            print(f"Run id: {run_id} {run_journal.status_counts(run_id)}")
+            print(f"Devices connected: {event_summary['devices_connected']}")
+            print(f"Parsed records: {event_summary['parsed_records']}")
+            for action_name, timing in sorted(event_summary['actions'].items()):
+                print(f"Action {action_name}: {timing['count']} runs, mean {timing['mean']}s")
+            if event_summary['audits']:
+                print(f"Audit results: {event_summary['audits']}")
+            if event_summary['failures']:
+                print(f"Failure reasons: {event_summary['failures']}")
+
+            # Phase timings show whether the run was network-, device- or parser-bound
+            for phase, histogram in metrics_collector.phase_summary().items():
+                print(f"Phase {phase}: {histogram['count']} samples, total {histogram['sum']:.2f}s, "
+                      f"mean {histogram['mean']:.3f}s, p95 <= {histogram['p95']}s")
+
+            run_info = {
+                'run_id': run_id,
+                'start_time': str(start_time),
+                'stop_time': str(stop_time),
+                'duration_seconds': total_execution_time.total_seconds(),
+                'devices_processed': counters['processed'],
+                'devices_failed': counters['failed'],
+                'devices_deferred': len(deferred_rows),
+            }
+            if controller:
+                adaptive_summary = controller.summary()
+                run_info['adaptive'] = adaptive_summary
+                print(f"Adaptive concurrency: final limit {adaptive_summary['final_limit']}, "
+                      f"peak {adaptive_summary['peak_limit']}, {len(adaptive_summary['decisions'])} adjustments")
+                for decision in adaptive_summary['decisions']:
+                    print(f"  {decision['time']} {decision['from']} -> {decision['to']}: {decision['reason']}")
+            if metrics_json:
+                metrics_collector.write_json(metrics_json, run_info)
+                print(f"Metrics written to {metrics_json}")
+            if metrics_prom:
+                metrics_collector.write_prometheus(metrics_prom, run_info)
+                print(f"Prometheus metrics written to {metrics_prom}")
+
+            status_counts = run_journal.status_counts(run_id)
+            if status_counts.get('failed') or status_counts.get('unreachable'):
+                sys.exit(EXIT_DEVICES_FAILED)
+        else:
+            print("No results found for the given query.")
 
-        finally:
-            if conn:
-                conn.close()
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        sys.exit(EXIT_RUN_ERROR)
+
+    finally:
+        if conn:
+            conn.close()
+        events.set_sink(None)
+        event_aggregator.stop()
+        run_journal.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,231 @@
+import heapq
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from ruamel.yaml import YAML
+
+
+def load_resource_limits(resource_file):
+    """
+    Load shared-resource concurrency limits from a YAML file.
+
+    Expected format::
+
+        resources:
+          tacacs-east:
+            limit: 20
+            sites: [1, 2]
+          wan-emea:
+            limit: 5
+            roles: [3]
+
+    A device counts against a resource if its site_id or role_id is listed for it.
+
+    Args:
+        resource_file (str): Path to the YAML file, or None.
+
+    Returns:
+        dict: Resource name -> {'limit': int, 'sites': set, 'roles': set}
+    """
+    if not resource_file:
+        return {}
+
+    yaml_loader = YAML(typ='safe')
+    with open(resource_file, 'r') as f:
+        data = yaml_loader.load(f) or {}
+
+    resources = {}
+    for name, spec in (data.get('resources') or {}).items():
+        resources[name] = {
+            'limit': int(spec.get('limit', 0)),
+            'sites': set(spec.get('sites', [])),
+            'roles': set(spec.get('roles', [])),
+        }
+    return resources
+
+
+class DeviceScheduler:
+    """
+    Orders device dispatch with per-site, per-role and per-resource concurrency caps.
+
+    Devices are queued per site and handed out round-robin across sites, so a large site cannot
+    starve the others. When a priority function is given, each site's queue is sorted by it and
+    the eligible device with the highest priority across all sites goes next instead. A device is
+    only released when its site, its role and every shared resource it maps to are below their
+    caps. A limit of 0 means unlimited.
+    """
+
+    # How far into a site's queue to look for an eligible device when the head is blocked
+    lookahead = 64
+
+    def __init__(self, rows, site_limit=0, role_limit=0, resources=None, priority=None):
+        """
+        Args:
+            rows (list): Device rows (dicts with 'site_id' and 'role_id').
+            site_limit (int): Maximum devices in flight per site_id.
+            role_limit (int): Maximum devices in flight per role_id.
+            resources (dict): Shared resource limits as returned by load_resource_limits().
+            priority (callable): Optional key function; devices with higher keys are dispatched first.
+        """
+        self.site_limit = site_limit
+        self.role_limit = role_limit
+        self.resources = resources or {}
+        self.priority = priority
+        self._queues = OrderedDict()
+        if priority:
+            rows = sorted(rows, key=priority, reverse=True)
+        for row in rows:
+            self._queues.setdefault(row.get('site_id'), deque()).append(row)
+        self._sites = deque(self._queues.keys())
+        self._pending = len(rows)
+        self._site_in_flight = Counter()
+        self._role_in_flight = Counter()
+        self._resource_in_flight = Counter()
+
+    def pending(self):
+        """Number of devices not yet handed out."""
+        return self._pending
+
+    def _resources_for(self, row):
+        return [name for name, spec in self.resources.items()
+                if row.get('site_id') in spec['sites'] or row.get('role_id') in spec['roles']]
+
+    def _eligible(self, row):
+        if self.site_limit and self._site_in_flight[row.get('site_id')] >= self.site_limit:
+            return False
+        if self.role_limit and self._role_in_flight[row.get('role_id')] >= self.role_limit:
+            return False
+        for name in self._resources_for(row):
+            limit = self.resources[name]['limit']
+            if limit and self._resource_in_flight[name] >= limit:
+                return False
+        return True
+
+    def _take(self, site, index):
+        queue = self._queues[site]
+        row = queue[index]
+        del queue[index]
+        if not queue:
+            del self._queues[site]
+            self._sites.remove(site)
+        self._pending -= 1
+
+        self._site_in_flight[row.get('site_id')] += 1
+        self._role_in_flight[row.get('role_id')] += 1
+        for name in self._resources_for(row):
+            self._resource_in_flight[name] += 1
+        return row
+
+    def next_device(self):
+        """
+        Return the next device that may start now, or None if every remaining device is blocked.
+        """
+        if self.priority:
+            return self._next_by_priority()
+
+        for _ in range(len(self._sites)):
+            site = self._sites[0]
+            # Rotate so the next call starts with the following site
+            self._sites.rotate(-1)
+            queue = self._queues[site]
+            for index in range(min(len(queue), self.lookahead)):
+                if self._eligible(queue[index]):
+                    return self._take(site, index)
+        return None
+
+    def _next_by_priority(self):
+        best = None
+        for site in self._sites:
+            queue = self._queues[site]
+            for index in range(min(len(queue), self.lookahead)):
+                if self._eligible(queue[index]):
+                    # Queues are sorted, so the first eligible device is the site's best candidate
+                    key = self.priority(queue[index])
+                    if best is None or key > best[0]:
+                        best = (key, site, index)
+                    break
+        if best is None:
+            return None
+        return self._take(best[1], best[2])
+
+    def remaining(self):
+        """Remove and return every device that has not been handed out."""
+        rows = [row for queue in self._queues.values() for row in queue]
+        self._queues.clear()
+        self._sites.clear()
+        self._pending = 0
+        return rows
+
+    def release(self, row):
+        """Mark a previously handed-out device as finished, freeing its slots."""
+        self._site_in_flight[row.get('site_id')] -= 1
+        self._role_in_flight[row.get('role_id')] -= 1
+        for name in self._resources_for(row):
+            self._resource_in_flight[name] -= 1
+
+
+def plan_deadline(rows, expected, slots, deadline, priority):
+    """
+    Decide which devices fit within a deadline, given their expected durations.
+
+    Devices are placed in priority order onto `slots` parallel lanes, greedily starting each one
+    on the lane that frees up first. A device whose expected finish is past the deadline does
+    not fit; shorter devices after it may still fit.
+
+    Args:
+        rows (list): Device rows.
+        expected (dict): Hostname -> expected duration in seconds.
+        slots (int): Number of devices that run in parallel.
+        deadline (float): Seconds available for the job.
+        priority (callable): Key function; higher keys are placed first.
+
+    Returns:
+        tuple: (planned_rows, deferred_rows, expected_makespan)
+    """
+    lanes = [0.0] * max(1, slots)
+    planned = []
+    deferred = []
+    for row in sorted(rows, key=priority, reverse=True):
+        duration = expected.get(row['hostname'], 0)
+        if lanes[0] + duration > deadline:
+            deferred.append(row)
+            continue
+        heapq.heapreplace(lanes, lanes[0] + duration)
+        planned.append(row)
+    return planned, deferred, max(lanes)
+
+
+def dispatch(scheduler, submit, max_in_flight, on_complete, deadline=None):
+    """
+    Feed devices from a scheduler into an executor with a bounded number of outstanding futures.
+
+    Args:
+        scheduler (DeviceScheduler): Source of devices in dispatch order.
+        submit (callable): Takes a device row and returns a concurrent.futures.Future.
+        max_in_flight (int or callable): Maximum number of submitted but unfinished devices, or a
+            callable returning the current maximum (e.g. an AdaptiveConcurrency controller).
+        on_complete (callable): Called as on_complete(row, future) for each finished device.
+        deadline (float): Optional time.monotonic() value after which no new devices are started.
+    """
+    in_flight = {}
+    while scheduler.pending() or in_flight:
+        limit = max_in_flight() if callable(max_in_flight) else max_in_flight
+        if deadline is not None and time.monotonic() >= deadline:
+            limit = 0
+        while len(in_flight) < limit:
+            row = scheduler.next_device()
+            if row is None:
+                break
+            in_flight[submit(row)] = row
+
+        if not in_flight:
+            # Nothing running and nothing eligible: the remaining devices can never start
+            break
+
+        # A changing limit is re-read periodically, not only when a device finishes
+        done, _ = wait(in_flight, timeout=1.0 if callable(max_in_flight) else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            row = in_flight.pop(future)
+            scheduler.release(row)
+            on_complete(row, future)
@@ -1,15 +1,25 @@
 from pprint import pprint
-from ruamel.yaml import YAML
 import click
 import os
+import sys
+import time
 import logging
 import traceback
-from jinja2 import Template
 import sqlite3
+import paramiko
 
+from simplenet.cli import events, metrics
+from simplenet.cli.adaptive import classify_connection_error
 from simplenet.cli.data_store_broke import GlobalDataStoreWrapper as GlobalDataStore
 from simplenet.cli.ssh_utils import ThreadSafeSSHConnection
 from simplenet.cli.command_executor2 import execute_commands
+from simplenet.cli.driver_plan import DriverCompileError
+from simplenet.cli.driver_templates import get_driver_template, load_variables
+from simplenet.cli.lib.transcript import DEFAULT_TRANSCRIPT_SIZE
+from simplenet.cli.lib.prompt import PromptCache, DEFAULT_PROMPT_CACHE_DIR
+from simplenet.cli.ssh_pool import close_pool, get_pool
+from simplenet.cli.crypto_profiles import CRYPTO_PROFILES, DEFAULT_CRYPTO_PROFILE
+from simplenet.cli.credentials import get_credential_service, DEFAULT_CREDENTIAL_CACHE_DIR
 
 # Configure logging
 logging.basicConfig(filename='automation.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,60 +28,123 @@ def load_variables_and_render_driver(vars_file, driver_file, device_info):
     """
     Load variables from a file and render the driver file with these variables.
 
+    Both files are parsed once per process and re-read only when they change on disk; only
+    the driver values that contain Jinja are rendered for each device.
+
     Args:
         vars_file (str): Path to the YAML file containing variables, or None.
         driver_file (str): Path to the driver YAML file.
         device_info (tuple): A tuple containing (hostname, mgmt_ip) for the device.
 
     Returns:
-        tuple: (variables, driver_data)
+        tuple: (variables, driver_data); driver_data shares unrendered parts with the cache and must not be modified.
     """
-    yaml_loader = YAML()
-    yaml_loader.preserve_quotes = True  # Preserve quotes if necessary
-
-    if vars_file:
-        with open(vars_file, 'r') as f:
-            variables = yaml_loader.load(f)
-    else:
-        variables = {}
-
     hostname, mgmt_ip = device_info
-    variables.update({'hostname': hostname, 'mgmt_ip': mgmt_ip})
-
-    with open(driver_file, 'r') as f:
-        driver_template = f.read()
-
-    template = Template(driver_template)
-    rendered_driver = template.render(variables)
-    driver_data = yaml_loader.load(rendered_driver)
-
+    variables = dict(load_variables(vars_file), hostname=hostname, mgmt_ip=mgmt_ip)
+    driver_data = get_driver_template(driver_file).render(variables)
     return variables, driver_data
 
-def get_device_credentials(device_id, db_conn):
+def get_device_credentials(device_id, hostname, db_conn, credential_service):
     """
-    Retrieve the credentials for a given device based on its credential_ids.
+    Retrieve the credentials to try for a device, in the order of its credential_ids.
+
+    The credential that last logged in to the device is moved to the front.
 
     Args:
         device_id (int): Device ID to look up credentials for.
+        hostname (str): Device hostname.
         db_conn (sqlite3.Connection): Connection to the SQLite database.
+        credential_service (CredentialService): Service that decrypts secrets and remembers working credentials.
 
     Returns:
-        tuple: (username, password) for the device, or (None, None) if not found.
+        list: (credential_id, username, password) tuples with encrypted passwords; empty if none are found.
     """
-    cursor = db_conn.cursor()
+    return [credential for credential in credential_service.candidates(device_id, hostname, db_conn)
+            if credential[1] and credential[2]]
 
-    cursor.execute('''
-        SELECT username, password 
-        FROM credentials 
-        WHERE id IN (SELECT credential_id FROM device_credentials WHERE device_id = ?)
-    ''', (device_id,))
+def connect_with_credentials(mgmt_ip, hostname, credentials, credential_service, pool, connection_kwargs):
+    """
+    Log in to a device with the first credential it accepts, and remember that credential.
 
-    credential = cursor.fetchone()
+    Only authentication failures move on to the next credential; any other connection error
+    is raised at once, since another credential would not help.
 
-    if credential:
-        return credential[0], credential[1]
+    Args:
+        mgmt_ip (str): Device address.
+        hostname (str): Device hostname.
+        credentials (list): (credential_id, username, password) tuples from get_device_credentials().
+        credential_service (CredentialService): Service that decrypts secrets and remembers working credentials.
+        pool (SSHConnectionPool): Pool to lease the session from, or None for a dedicated connection.
+        connection_kwargs (dict): ThreadSafeSSHConnection arguments.
 
-    return None, None
+    Returns:
+        ThreadSafeSSHConnection: The connected session.
+
+    Raises:
+        paramiko.AuthenticationException: If every credential was rejected.
+    """
+    auth_error = None
+    for credential_id, username, password in credentials:
+        password = credential_service.decrypt(password)
+        ssh_conn = None
+        try:
+            if pool is not None:
+                ssh_conn = pool.acquire(mgmt_ip, username, password, displayname=hostname, **connection_kwargs)
+            else:
+                ssh_conn = ThreadSafeSSHConnection(hostname=mgmt_ip, **connection_kwargs)
+                ssh_conn.set_displayname(hostname)
+                ssh_conn.connect(username=username, password=password)
+        except paramiko.AuthenticationException as e:
+            print(f"Credential {credential_id} rejected by {hostname}")
+            metrics.count('auth_failures', 1)
+            if pool is None and ssh_conn is not None:
+                ssh_conn.disconnect()
+            auth_error = e
+            continue
+        credential_service.remember(hostname, credential_id)
+        return ssh_conn
+    raise auth_error
+
+def get_device_crypto_profile(device, db_conn):
+    """
+    Look up the SSH crypto profile set for a device in the inventory, or else for its platform.
+
+    Args:
+        device (sqlite3.Row): Device information retrieved from the SQLite database.
+        db_conn (sqlite3.Connection): Connection to the SQLite database.
+
+    Returns:
+        str: Profile name, or None if the inventory does not set one.
+    """
+    columns = device.keys()
+    if 'crypto_profile' in columns and device['crypto_profile']:
+        return device['crypto_profile']
+    if 'platform_id' not in columns:
+        return None
+    try:
+        row = db_conn.execute('SELECT crypto_profile FROM platforms WHERE id = ?', (device['platform_id'],)).fetchone()
+    except sqlite3.OperationalError:
+        # Inventories built before crypto profiles have no such column
+        return None
+    return row[0] if row else None
+
+def learn_device_prompt(ssh_conn, hostname, prompt_cache_dir=None):
+    """
+    Learn the device prompt after login so every command ends the moment the prompt arrives.
+
+    Args:
+        ssh_conn (ThreadSafeSSHConnection): Connected session that has not run a command yet.
+        hostname (str): Device hostname, the prompt cache key.
+        prompt_cache_dir (str): Directory of the prompt cache, or None to learn without caching.
+    """
+    prompt_cache = PromptCache(prompt_cache_dir) if prompt_cache_dir else None
+    entry = prompt_cache.get(hostname) if prompt_cache is not None else None
+    cached = entry['pattern'] if entry else None
+    pattern = ssh_conn.learn_prompt(cached=cached)
+    if pattern is None:
+        print(f"Prompt not learned for {hostname}; falling back to reading until output goes quiet")
+    elif prompt_cache is not None and pattern != cached:
+        prompt_cache.set(hostname, pattern)
 
 def run_automation_for_device(device, driver_file, vars_file, driver_name, db_conn, global_data_store, **kwargs):
     """
@@ -84,50 +157,101 @@ def run_automation_for_device(device, driver_file, vars_file, driver_name, db_co
         driver_name (str): Name of the driver.
         db_conn (sqlite3.Connection): Connection to the SQLite database.
         global_data_store (GlobalDataStore): Instance of the global data store.
+        **kwargs: Run options; with reuse_connections=True the session is leased from the
+            process-wide SSH connection pool and returned to it afterwards. Unless learn_prompt is
+            False, the device prompt is learned after login and cached in prompt_cache_dir.
+            crypto_profile is used when the inventory sets no profile for the device or its platform.
+            The credential that logs in is recorded in credential_cache_dir and tried first next time.
+
+    Returns:
+        bool: True if the driver ran to completion, False otherwise.
     """
     hostname = device['hostname']
     mgmt_ip = device['mgmt_ip']
     print(f"Run automation for device {hostname}")
+    events.set_device(hostname)
+    pool = None
+    ssh_conn = None
 
     try:
         # Retrieve credentials for the device
-        username, password = get_device_credentials(device['id'], db_conn)
-        if not username or not password:
+        credential_service = get_credential_service(
+            cache_dir=kwargs.get('credential_cache_dir', DEFAULT_CREDENTIAL_CACHE_DIR))
+        credentials = get_device_credentials(device['id'], hostname, db_conn, credential_service)
+        if not credentials:
             print(f"Error: No credentials found for device {hostname}")
-            return
-
-        ssh_conn = ThreadSafeSSHConnection(
-            hostname=mgmt_ip,
+            events.emit('failed', reason='no_credentials')
+            return False
+
+        # The driver is rendered before connecting so its transport_mode decides whether a shell is opened
+        render_start = time.perf_counter()
+        driver_template = get_driver_template(driver_file)
+        variables = dict(load_variables(vars_file), hostname=hostname, mgmt_ip=mgmt_ip)
+        driver_config = driver_template.render(variables)['drivers'][driver_name]
+        # Validate and compile the driver before spending a login on it; a driver without Jinja is compiled once
+        try:
+            plan = driver_template.plan(driver_name, driver_config)
+        except DriverCompileError as e:
+            print(f"Error: invalid driver '{driver_name}': {e}")
+            events.emit('failed', reason='invalid_driver', error=str(e))
+            return False
+        metrics.observe('driver_render', time.perf_counter() - render_start)
+        transport_mode = plan.transport_mode
+
+        connection_kwargs = dict(
             debug=True,
             look_for_keys=kwargs.get('look_for_keys', False),
             timeout=kwargs.get('timeout', 10),
             allow_agent=False,
             prompt_failure=False,
-            scrub_esc=True
+            scrub_esc=True,
+            transport_mode=transport_mode,
+            sentinel=plan.sentinel,
+            crypto_profile=get_device_crypto_profile(device, db_conn) or kwargs.get('crypto_profile'),
+            transcript_size=kwargs.get('transcript_size', DEFAULT_TRANSCRIPT_SIZE),
+            transcript_file=os.path.join(kwargs['transcript_dir'], f"{hostname}.transcript.gz")
+            if kwargs.get('transcript_dir') else None
         )
+        pool = get_pool() if kwargs.get('reuse_connections') else None
 
-        ssh_conn.set_displayname(hostname)
-
+        connect_start = time.perf_counter()
         try:
-            ssh_conn.connect(username=username, password=password)
+            ssh_conn = connect_with_credentials(mgmt_ip, hostname, credentials, credential_service, pool,
+                                                connection_kwargs)
+            if pool is not None:
+                # A reused session may have served another driver
+                ssh_conn.set_transport_mode(transport_mode)
+                ssh_conn.set_sentinel(plan.sentinel)
         except Exception as e:
             print(f"Connection failure: {hostname}:{mgmt_ip}")
-            return
-
-        variables, driver_data = load_variables_and_render_driver(vars_file, driver_file, (hostname, mgmt_ip))
-        ssh_conn.channel.hostname = hostname
-        actions = driver_data['drivers'][driver_name]['actions']
-        error_string = driver_data['drivers'][driver_name].get('error_string', '')
+            events.emit('failed', reason='connection', error_type=classify_connection_error(e), error=str(e))
+            return False
+        connect_time = time.perf_counter() - connect_start
+        reused = (ssh_conn.get_meta_data('pool_leases') or 1) > 1
+        algorithms = ssh_conn.negotiated_algorithms
+        if reused:
+            metrics.count('ssh_reused', 1)
+        else:
+            # Labelled by key exchange, so slow legacy handshakes stand out in the histograms
+            metrics.observe('ssh_connect', connect_time, label=algorithms.get('kex'))
+        events.emit('connected', mgmt_ip=mgmt_ip, duration=round(connect_time, 3), reused=reused,
+                    crypto_profile=ssh_conn.crypto_profile, algorithms=algorithms)
+
+        if transport_mode == 'shell' and kwargs.get('learn_prompt', True) and ssh_conn.prompt_pattern is None:
+            learn_device_prompt(ssh_conn, hostname, kwargs.get('prompt_cache_dir', DEFAULT_PROMPT_CACHE_DIR))
+
+        if ssh_conn.channel is not None:
+            ssh_conn.channel.hostname = hostname
         global_prompt_count = [0, kwargs.get('prompt_count', 1)]
 
         # Execute commands
         execute_commands(
             ssh_connection=ssh_conn,
-            actions=actions,
+            actions=plan,
             variables=variables,
             inter_command_time=kwargs.get('inter_command_time', 1),
             log_file=f"./log/{hostname}.log",
-            error_string=error_string,
+            error_string=plan.error_string,
             global_output_path=kwargs.get('global_output_path', 'output'),
             global_output_mode=kwargs.get('global_output_mode', 'overwrite'),
             prompt=kwargs.get('prompt', ''),
@@ -141,12 +265,21 @@ def run_automation_for_device(device, driver_file, vars_file, driver_name, db_co
             buffer_lock=None
         )
 
-        ssh_conn.disconnect()
+        if pool is not None:
+            pool.release(ssh_conn)
+        else:
+            ssh_conn.disconnect()
         print(f"Device {hostname} completed successfully")
+        return True
 
     except Exception as e:
         print(f"Error during execution for device {hostname}: {str(e)}")
         traceback.print_exc()
+        events.emit('failed', reason='exception', error=str(e))
+        if pool is not None and ssh_conn is not None:
+            # The shell may be mid-command; do not hand it to the next caller
+            pool.release(ssh_conn, discard=True)
+        return False
 
 @click.command()
 @click.option('--inventory', required=True, help='Path to the inventory SQLite file')
@@ -162,9 +295,30 @@ def run_automation_for_device(device, driver_file, vars_file, driver_name, db_co
 @click.option('--timestamps', is_flag=True, help='Add timestamps to output')
 @click.option('--inter-command-time', default=1.0, help='Time to wait between commands [default=1.0]')
 @click.option('--output-root', default='./output', help='Root directory for all output files [default=./output]')
+@click.option('--event-stream', is_flag=True, help='Write NDJSON progress events to stdout for simplenet-runner')
+@click.option('--transcript-size', default=DEFAULT_TRANSCRIPT_SIZE,
+              help=f'Characters of session transcript kept in memory per device, 0 for unbounded [default={DEFAULT_TRANSCRIPT_SIZE}]')
+@click.option('--transcript-dir', required=False,
+              help='Spill transcript overflow to <hostname>.transcript.gz in this directory instead of dropping it')
+@click.option('--prompt-cache-dir', default=DEFAULT_PROMPT_CACHE_DIR,
+              help=f'Directory caching the prompt regex learned for each device [default={DEFAULT_PROMPT_CACHE_DIR}]')
+@click.option('--no-learn-prompt', is_flag=True,
+              help='Do not learn the device prompt; end command output on a pause in the output instead')
+@click.option('--crypto-profile', type=click.Choice(list(CRYPTO_PROFILES)), required=False,
+              help=f'SSH crypto profile for devices whose inventory entry sets none [default={DEFAULT_CRYPTO_PROFILE}]')
+@click.option('--credential-cache-dir', default=DEFAULT_CREDENTIAL_CACHE_DIR,
+              help=f'Directory recording the credential that last logged in to each device [default={DEFAULT_CREDENTIAL_CACHE_DIR}]')
+@click.option('--reuse-connections', is_flag=True,
+              help='Lease SSH sessions from a connection pool so devices matched more than once share one login')
 def main(inventory, query, driver, vars, driver_name, pretty, timeout, prompt, prompt_count,
-         look_for_keys, timestamps, inter_command_time, output_root):
+         look_for_keys, timestamps, inter_command_time, output_root, event_stream, transcript_size, transcript_dir,
+         prompt_cache_dir, no_learn_prompt, crypto_profile, credential_cache_dir, reuse_connections):
     """Single-device automation based on inventory."""
+    if event_stream:
+        events.set_stream_sink(sys.stdout)
+
+    # simplenet-runner journals and retries a device by this process's exit status
+    all_completed = True
     try:
         # Connect to the SQLite database
         db_conn = sqlite3.connect(inventory)
@@ -188,7 +342,7 @@ def main(inventory, query, driver, vars, driver_name, pretty, timeout, prompt, p
 
         # Process each filtered device
         for device in filtered_devices:
-            run_automation_for_device(
+            completed = run_automation_for_device(
                 device, driver, vars, driver_name,
                 db_conn=db_conn,
                 global_data_store=global_operation_store,
@@ -200,20 +354,34 @@ def main(inventory, query, driver, vars, driver_name, pretty, timeout, prompt, p
                 timestamps=timestamps,
                 inter_command_time=inter_command_time,
                 global_output_path=output_root,
-                global_output_mode='overwrite'
+                global_output_mode='overwrite',
+                transcript_size=transcript_size,
+                transcript_dir=transcript_dir,
+                prompt_cache_dir=prompt_cache_dir,
+                learn_prompt=not no_learn_prompt,
+                crypto_profile=crypto_profile,
+                credential_cache_dir=credential_cache_dir,
+                reuse_connections=reuse_connections
             )
+            if not completed:
+                all_completed = False
 
         # pprint(global_operation_store.get_all_data())
 
     except Exception as e:
         logging.critical(f"Unhandled exception: {str(e)}", exc_info=True)
         traceback.print_exc()
+        all_completed = False
 
     finally:
+        close_pool()
         try:
             db_conn.close()
         except:
             pass
 
+    if not all_completed:
+        sys.exit(1)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,321 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from simplenet.cli.ssh_utils import ThreadSafeSSHConnection
+
+DEFAULT_MAX_SIZE = 32
+DEFAULT_MAX_PER_HOST = 2
+DEFAULT_MAX_IDLE = 300.0
+DEFAULT_KEEPALIVE = 30
+
+# Process-wide pool returned by get_pool()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class SSHConnectionPool:
+    """
+    Pool of authenticated ThreadSafeSSHConnection objects keyed by host, port, username and connection settings.
+
+    acquire() leases a connection to one caller at a time. Reusing an idle connection skips the
+    TCP connect, key exchange and authentication. release() returns the connection to the pool
+    with its shell drained and its buffers cleared. Idle connections are closed after max_idle
+    seconds. When the pool is full, the least recently used idle connection is closed to make room.
+    Each device is limited to max_per_host sessions, so concurrent callers do not flood its vty lines.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, max_per_host=DEFAULT_MAX_PER_HOST, max_idle=DEFAULT_MAX_IDLE,
+                 keepalive=DEFAULT_KEEPALIVE, acquire_timeout=60.0):
+        """
+        Args:
+            max_size (int): Maximum connections held by the pool, idle and leased.
+            max_per_host (int): Maximum connections to one host.
+            max_idle (float): Seconds an idle connection is kept before it is closed.
+            keepalive (int): SSH keepalive interval in seconds for pooled transports, 0 to disable.
+            acquire_timeout (float): Seconds acquire() waits for a free slot before raising TimeoutError.
+        """
+        self.max_size = max_size
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.keepalive = keepalive
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = OrderedDict()  # id(conn) -> (key, conn, released_at), least recently used first
+        self._leased = {}  # id(conn) -> (key, conn)
+        self._host_counts = defaultdict(int)
+        self._total = 0
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'evicted_idle': 0, 'evicted_lru': 0, 'unhealthy': 0}
+
+    @staticmethod
+    def _key(hostname, port, username, connection_kwargs):
+        # Sessions opened with another crypto profile, transcript or transport setting are not interchangeable
+        return hostname, port, username, tuple(sorted(connection_kwargs.items()))
+
+    def acquire(self, hostname, username, password, port=22, displayname=None, **connection_kwargs):
+        """
+        Lease a connected session to a device, reusing an idle one when possible.
+
+        Only a session opened with the same port, username and connection_kwargs is reused.
+
+        Args:
+            hostname (str): Device address.
+            username (str): Login username.
+            password (str): Login password, plain or Fernet-encrypted.
+            port (int): SSH port.
+            displayname (str): Display name set on the connection.
+            **connection_kwargs: Passed to ThreadSafeSSHConnection for new connections.
+
+        Returns:
+            ThreadSafeSSHConnection: Connected session; hand it back with release().
+
+        Raises:
+            TimeoutError: If no slot became free within acquire_timeout.
+        """
+        key = self._key(hostname, port, username, connection_kwargs)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            closing = []
+            try:
+                with self._cond:
+                    conn = self._take_or_reserve_locked(key, deadline, closing)
+            finally:
+                # Closing and probing sessions wait on the network, so they run outside the lock
+                for stale in closing:
+                    self._close(stale)
+            if conn is None:
+                break
+            try:
+                healthy = conn.is_alive(probe=True)
+            except Exception:
+                healthy = False
+            if not healthy:
+                with self._cond:
+                    self.stats['unhealthy'] += 1
+                self.release(conn, discard=True)
+                continue
+            with self._cond:
+                self.stats['hits'] += 1
+            conn.set_meta_data('pool_leases', (conn.get_meta_data('pool_leases') or 1) + 1)
+            if displayname:
+                conn.set_displayname(displayname)
+            return conn
+
+        conn = None
+        try:
+            conn = ThreadSafeSSHConnection(hostname, **connection_kwargs)
+            if displayname:
+                conn.set_displayname(displayname)
+            conn.connect(username=username, password=password, port=port)
+            conn.set_meta_data('pool_leases', 1)
+            if self.keepalive:
+                conn.set_keepalive(self.keepalive)
+        except Exception:
+            if conn is not None:
+                # A failed handshake can leave the transport thread and socket open
+                self._close(conn)
+            self._forget(hostname)
+            raise
+
+        with self._cond:
+            self._leased[id(conn)] = (key, conn)
+        return conn
+
+    def _take_or_reserve_locked(self, key, deadline, closing):
+        """
+        Lease an idle session for key, or reserve a slot for a new one and return None.
+
+        Sessions evicted to make room are appended to closing for the caller to close once the lock is released.
+        """
+        hostname = key[0]
+        while True:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            closing.extend(self._evict_idle_locked())
+            conn = self._take_idle_locked(key)
+            if conn is not None:
+                return conn
+            if self._host_counts[hostname] < self.max_per_host:
+                if self._total < self.max_size:
+                    break
+                stale = self._evict_lru_locked()
+            else:
+                # The host may be at its limit only because of idle sessions for other usernames, ports or settings
+                stale = self._evict_lru_locked(hostname)
+            if stale is not None:
+                closing.append(stale)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No pooled SSH session for {hostname} became available "
+                                   f"within {self.acquire_timeout}s")
+            self._cond.wait(remaining)
+
+        self._host_counts[hostname] += 1
+        self._total += 1
+        self.stats['misses'] += 1
+        return None
+
+    def release(self, conn, discard=False):
+        """
+        Return a leased connection to the pool.
+
+        Args:
+            conn (ThreadSafeSSHConnection): Connection obtained from acquire().
+            discard (bool): Close the connection instead of keeping it, e.g. after an error left the shell in an unknown state.
+        """
+        with self._cond:
+            entry = self._leased.pop(id(conn), None)
+        if entry is None:
+            return
+        key = entry[0]
+
+        healthy = False
+        if not discard and not self._closed:
+            try:
+                conn.reset_session()
+                healthy = conn.is_alive()
+            except Exception:
+                healthy = False
+
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle[id(conn)] = (key, conn, time.monotonic())
+                self._cond.notify_all()
+                return
+            if not discard:
+                self.stats['unhealthy'] += 1
+            self._detach_locked(key)
+        self._close(conn)
+
+    @contextmanager
+    def connection(self, hostname, username, password, port=22, displayname=None, **connection_kwargs):
+        """Context manager around acquire()/release(); the connection is discarded if the block raises."""
+        conn = self.acquire(hostname, username, password, port=port, displayname=displayname, **connection_kwargs)
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    @staticmethod
+    def open_channel(conn, kind='shell', command=None, term='vt100', width=80, height=24):
+        """
+        Open an additional channel on a pooled connection's transport, without a new handshake.
+
+        Args:
+            conn (ThreadSafeSSHConnection): A leased connection.
+            kind (str): 'shell' for an interactive shell with a pty, 'exec' to run command.
+            command (str): Command for an exec channel.
+            term (str): Terminal type for the pty.
+            width (int): Terminal width.
+            height (int): Terminal height.
+
+        Returns:
+            paramiko.Channel: The new channel; the caller closes it.
+        """
+        return conn.open_channel(kind=kind, command=command, term=term, width=width, height=height)
+
+    def _take_idle_locked(self, key):
+        """Move the least recently used idle session for key to the leased set; it is probed by the caller."""
+        for conn_id, (idle_key, conn, _) in self._idle.items():
+            if idle_key == key:
+                del self._idle[conn_id]
+                self._leased[conn_id] = (idle_key, conn)
+                return conn
+        return None
+
+    def _evict_idle_locked(self):
+        """Remove idle connections that exceeded max_idle and return them for closing."""
+        if not self.max_idle:
+            return []
+        now = time.monotonic()
+        expired = []
+        for conn_id, (key, conn, released_at) in list(self._idle.items()):
+            if now - released_at > self.max_idle:
+                del self._idle[conn_id]
+                self.stats['evicted_idle'] += 1
+                self._detach_locked(key)
+                expired.append(conn)
+        return expired
+
+    def _evict_lru_locked(self, hostname=None):
+        """Remove the least recently used idle connection (to hostname if given) and return it for closing, or None."""
+        for conn_id, (key, conn, _) in self._idle.items():
+            if hostname is None or key[0] == hostname:
+                del self._idle[conn_id]
+                self.stats['evicted_lru'] += 1
+                self._detach_locked(key)
+                return conn
+        return None
+
+    def _detach_locked(self, key):
+        """Free the slot of a connection leaving the pool; the caller closes it after releasing the lock."""
+        self._host_counts[key[0]] -= 1
+        self._total -= 1
+        self._cond.notify_all()
+
+    def _forget(self, hostname):
+        with self._cond:
+            self._host_counts[hostname] -= 1
+            self._total -= 1
+            self._cond.notify_all()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.disconnect()
+        except Exception as e:
+            print(f"Error closing pooled connection: {e}")
+
+    def evict_idle(self):
+        """Close idle connections that exceeded max_idle."""
+        with self._cond:
+            expired = self._evict_idle_locked()
+        for conn in expired:
+            self._close(conn)
+
+    def close_all(self):
+        """Close every idle connection and mark the pool closed; leased connections are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle.values())
+            self._idle.clear()
+            for key, _, _ in idle:
+                self._detach_locked(key)
+        for _, conn, _ in idle:
+            self._close(conn)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Reuse and eviction counters plus current idle and leased connection counts.
+        """
+        with self._cond:
+            return dict(self.stats, idle=len(self._idle), leased=len(self._leased))
+
+
+def get_pool(**kwargs):
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    Args:
+        **kwargs: SSHConnectionPool arguments, used only when the pool is created.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = SSHConnectionPool(**kwargs)
+        return _pool
+
+
+def close_pool():
+    """Close the process-wide pool, if one was created."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
@@ -5,17 +5,27 @@ import traceback
 
 import paramiko
 import re
+import queue
+import threading
 from threading import RLock
-from typing import List, Union, Pattern, Optional
+from typing import Iterator, List, Union, Pattern, Optional
 import time
+import uuid
 from socket import timeout as SocketTimeout
-from cryptography.fernet import Fernet
+
+from simplenet.cli import events, metrics
+from simplenet.cli.credentials import get_credential_service, is_encrypted
+from simplenet.cli.crypto_profiles import DEFAULT_CRYPTO_PROFILE, connect_kwargs, get_profile, negotiated_algorithms
+from simplenet.cli.lib.receive import ReceiveBuffer, DEFAULT_RECV_SIZE
+from simplenet.cli.lib.transcript import TranscriptBuffer, DEFAULT_TRANSCRIPT_SIZE
+from simplenet.cli.lib.prompt import PROMPT_AT_END, compile_prompt, find_prompt, prompt_head, prompt_regex
 
 # Ensure stdout and stderr use UTF-8 encoding
 # sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 # sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 debug = False
 
+TRANSPORT_MODES = ("shell", "exec")
 
 
 
@@ -31,7 +41,17 @@ class ThreadSafeSSHConnection:
             retry_interval: int = 5,
             prompt_failure: bool = True,
             scrub_esc: bool = False,  # Flag to scrub escape characters
-            encryption_key_path: str = "./crypto.key"  # Path to the encryption key
+            encryption_key_path: str = "./crypto.key",  # Path to the encryption key
+            match_window: int = 256,  # Characters of earlier output rescanned when matching the prompt
+            recv_size: int = DEFAULT_RECV_SIZE,  # Maximum bytes per channel read
+            encoding_errors: str = "replace",  # Decoder error policy for invalid or split UTF-8
+            transcript_size: int = DEFAULT_TRANSCRIPT_SIZE,  # Characters of session output kept in memory
+            transcript_file: Optional[str] = None,  # gzip file receiving output trimmed from memory
+            transport_mode: str = "shell",  # 'shell' scrapes an interactive shell, 'exec' runs each command on an exec channel
+            exec_timeout: Optional[float] = None,  # Upper bound for an exec command; None waits for the device to close the channel
+            prompt_pattern: Optional[str] = None,  # Anchored prompt regex that ends every command, see learn_prompt()
+            sentinel: Optional[str] = None,  # Shell command echoed after each command to mark its end, with a {marker} placeholder
+            crypto_profile: Optional[str] = None  # Named algorithm profile from crypto_profiles [default='compatible']
     ):
 
         self.debug_output = debug
@@ -49,8 +69,10 @@ class ThreadSafeSSHConnection:
         # Initialize other attributes
         self._client = paramiko.SSHClient()
         self._channel: Optional[paramiko.Channel] = None
-        self._output_buffer = ""
-        self._accumulation_buffer = ""
+        self._transcript = TranscriptBuffer(max_size=transcript_size, spill_path=transcript_file)
+        self._accumulation_buffer = ReceiveBuffer(recv_size=recv_size, errors=encoding_errors)
+        self._match_window = match_window
+        self._last_match_offset: Optional[int] = None
         self._meta_data = {}
         self._lock = RLock()
         self._look_for_keys = look_for_keys
@@ -61,9 +83,18 @@ class ThreadSafeSSHConnection:
         self._prompt_failure = prompt_failure
         self._scrub_esc = scrub_esc
         self._encryption_key_path = encryption_key_path
+        if transport_mode not in TRANSPORT_MODES:
+            raise ValueError(f"Invalid transport mode: {transport_mode}")
+        self._transport_mode = transport_mode
+        self._exec_timeout = exec_timeout
+        self._last_exit_status: Optional[int] = None
+        self._prompt_pattern: Optional[Pattern] = compile_prompt(prompt_pattern) if prompt_pattern else None
+        self.set_sentinel(sentinel)
 
-        # Apply SSH crypto settings
-        self.set_ssh_crypto_settings()
+        # Crypto profile applied to this connection's transport at connect()
+        self._negotiated_algorithms = {}
+        self._handshake_seconds: Optional[float] = None
+        self.set_ssh_crypto_settings(crypto_profile)
 
         print(f"Initialized SSHConnection to {self._hostname}")
 
@@ -82,6 +113,61 @@ class ThreadSafeSSHConnection:
         with self._lock:
             return self._channel
 
+    @property
+    def bytes_received(self) -> int:
+        """Total bytes read from the shell channel since the connection was created."""
+        with self._lock:
+            return self._accumulation_buffer.bytes_received
+
+    @property
+    def last_match_offset(self) -> Optional[int]:
+        """Offset in the last command's output where the final expected prompt match ended."""
+        with self._lock:
+            return self._last_match_offset
+
+    @property
+    def transport_mode(self) -> str:
+        with self._lock:
+            return self._transport_mode
+
+    @property
+    def last_exit_status(self) -> Optional[int]:
+        """Exit status of the last command run with exec_command(), or None if the device sent none."""
+        with self._lock:
+            return self._last_exit_status
+
+    def set_transport_mode(self, transport_mode: str) -> None:
+        """Select how send_command() runs commands: 'shell' or 'exec'."""
+        if transport_mode not in TRANSPORT_MODES:
+            raise ValueError(f"Invalid transport mode: {transport_mode}")
+        with self._lock:
+            self._transport_mode = transport_mode
+
+    @property
+    def prompt_pattern(self) -> Optional[Pattern]:
+        """Learned prompt regex that ends command output, or None to fall back to the quiet-gap read."""
+        with self._lock:
+            return self._prompt_pattern
+
+    def set_prompt_pattern(self, pattern: Optional[str]) -> None:
+        """Set the prompt regex (as built by prompt.prompt_regex()), or None to clear it."""
+        with self._lock:
+            self._prompt_pattern = compile_prompt(pattern) if pattern else None
+
+    def set_sentinel(self, sentinel: Optional[str]) -> None:
+        """
+        Enable echo-sentinel mode for the shell.
+
+        Args:
+            sentinel: A harmless command containing a {marker} placeholder, e.g. '! {marker}' on IOS
+                or 'echo {marker}' on Linux. It is sent after every command and the output ends where
+                its echo starts. None disables sentinel mode.
+        """
+        if sentinel is not None and '{marker}' not in sentinel:
+            raise ValueError("The sentinel command must contain a {marker} placeholder")
+        with self._lock:
+            self._sentinel = sentinel
+
     @property
     def meta_data(self) -> dict:
         with self._lock:
@@ -107,66 +193,43 @@ class ThreadSafeSSHConnection:
         with self._lock:
             return self._meta_data.get(key)
 
-    def set_ssh_crypto_settings(self) -> None:
-        """Sets SSH crypto settings for preferred KEX, ciphers, and keys."""
-        if self.debug_output:
-            print("Applying SSH crypto settings...")
-
-        paramiko.Transport._preferred_kex = (
-            "diffie-hellman-group14-sha1",
-            "diffie-hellman-group-exchange-sha1",
-            "diffie-hellman-group-exchange-sha256",
-            "diffie-hellman-group1-sha1",
-            "ecdh-sha2-nistp256",
-            "ecdh-sha2-nistp384",
-            "ecdh-sha2-nistp521",
-            "curve25519-sha256",
-            "curve25519-sha256@libssh.org",
-            "diffie-hellman-group16-sha512",
-            "diffie-hellman-group18-sha512"
-        )
-        paramiko.Transport._preferred_ciphers = (
-            "aes128-cbc",
-            "aes128-ctr",
-            "aes192-ctr",
-            "aes256-ctr",
-            "aes256-cbc",
-            "3des-cbc",
-            "aes192-cbc",
-            "aes256-gcm@openssh.com",
-            "aes128-gcm@openssh.com",
-            "chacha20-poly1305@openssh.com",
-            "aes256-gcm",
-            "aes128-gcm"
-        )
-        paramiko.Transport._preferred_keys = (
-            "ssh-rsa",
-            "ssh-dss",
-            "ecdsa-sha2-nistp256",
-            "ecdsa-sha2-nistp384",
-            "ecdsa-sha2-nistp521",
-            "ssh-ed25519",
-            "rsa-sha2-256",
-            "rsa-sha2-512"
-        )
+    def set_ssh_crypto_settings(self, crypto_profile: Optional[str] = None) -> None:
+        """
+        Select the crypto profile (preferred KEX, ciphers, MACs and host keys) for the next connect().
+
+        The profile is applied to this connection's transport only; see crypto_profiles.connect_kwargs().
+        """
+        get_profile(crypto_profile)  # fail early on an unknown name
+        with self._lock:
+            self._crypto_profile = crypto_profile or DEFAULT_CRYPTO_PROFILE
         if self.debug_output:
-            print("SSH crypto settings applied.")
+            print(f"Using SSH crypto profile '{self._crypto_profile}'")
+
+    @property
+    def crypto_profile(self) -> str:
+        with self._lock:
+            return self._crypto_profile
+
+    @property
+    def negotiated_algorithms(self) -> dict:
+        """Key exchange, cipher, MAC and host key algorithms agreed with the device at connect()."""
+        with self._lock:
+            return dict(self._negotiated_algorithms)
+
+    @property
+    def handshake_seconds(self) -> Optional[float]:
+        """Duration of the successful connect attempt: TCP connect, key exchange and authentication."""
+        with self._lock:
+            return self._handshake_seconds
 
     @staticmethod
     def is_encrypted(password: str) -> bool:
         """Checks if a password is encrypted."""
-        return password.startswith('gAAAAA')
+        return is_encrypted(password)
 
     def decrypt_password(self, encrypted_password: str) -> str:
-        """Decrypts an encrypted password using the provided key."""
-        try:
-            with open(self._encryption_key_path, "r") as fh:
-                key = str(fh.read()).strip()
-            fernet = Fernet(key)
-            return fernet.decrypt(encrypted_password.encode()).decode()
-        except Exception as e:
-            print(f"Error decrypting password: {e}")
-            raise RuntimeError("Failed to decrypt password")
+        """Decrypts an encrypted password; the key and the plaintext are cached by the credential service."""
+        return get_credential_service().decrypt(encrypted_password, key_path=self._encryption_key_path)
 
     def connect(self, username: str, password: str, port: int = 22, look_for_keys = False, timeout = 10,  allow_agent = False):
                 #alidate input parameters
@@ -196,6 +259,7 @@ class ThreadSafeSSHConnection:
         print(f"Max retries: {self._max_retries}")
         print(f"Retry interval: {self._retry_interval}")
         print(f"Prompt failure: {self._prompt_failure}")
+        print(f"Crypto profile: {self._crypto_profile}")
         # print(f"Additional kwargs: {kwargs}")
 
         for attempt in range(self._max_retries):
@@ -215,6 +279,7 @@ class ThreadSafeSSHConnection:
                     )
                     try:
                     # Attempt connection
+                        attempt_start = time.perf_counter()
                         self._client.connect(
                             hostname=self.hostname,
                             port=port,
@@ -223,15 +288,22 @@ class ThreadSafeSSHConnection:
                             look_for_keys=look_for_keys,
                             timeout=timeout,
                             allow_agent=allow_agent,
-                            # **kwargs,
+                            **connect_kwargs(self._crypto_profile)
                         )
                     except Exception as e:
-                        print(f"Paramiko connect failuer: (e)")
+                        print(f"Paramiko connect failure: {e}")
                         traceback.print_exc()
+                        # Let the handlers below retry or surface the real cause
+                        raise
+                    self._handshake_seconds = time.perf_counter() - attempt_start
+                    self._negotiated_algorithms = negotiated_algorithms(self._client.get_transport())
+                    print(f"Negotiated {self._negotiated_algorithms} with profile '{self._crypto_profile}' "
+                          f"in {self._handshake_seconds:.3f}s")
                     # print(f"Connected to {self._hostname}")
 
-                    # Invoke shell
-                    self._channel = self._client.invoke_shell()
+                    # Invoke shell; exec mode runs every command on its own channel and opens a shell only if asked for one
+                    if self._transport_mode == "shell":
+                        self._channel = self._client.invoke_shell()
                     # print("SSH shell invoked successfully")
 
                     return  # Connection successful, exit the method
@@ -261,6 +333,79 @@ class ThreadSafeSSHConnection:
                 else:
                     raise RuntimeError(f"Connection failed after {self._max_retries} attempts: {e}")
 
+    def set_keepalive(self, interval: int) -> None:
+        """Send an SSH keepalive every interval seconds so idle sessions survive NAT and firewall timeouts."""
+        with self._lock:
+            transport = self._client.get_transport()
+            if transport is not None:
+                transport.set_keepalive(interval)
+
+    def is_alive(self, probe: bool = False) -> bool:
+        """
+        Check that the transport is up and authenticated, reopening the shell channel if only it was closed.
+
+        Args:
+            probe: Also send an SSH ignore message, which fails if the socket is dead.
+        """
+        with self._lock:
+            transport = self._client.get_transport()
+            if transport is None or not transport.is_active() or not transport.is_authenticated():
+                return False
+            try:
+                if probe:
+                    transport.send_ignore()
+                if self._transport_mode == "shell" and (self._channel is None or self._channel.closed):
+                    self._channel = self._client.invoke_shell()
+            except Exception as e:
+                print(f"Health check failed for {self._hostname}: {e}")
+                return False
+            return True
+
+    def reset_session(self) -> None:
+        """Discard unread shell output and clear the buffers so the session can be reused by another caller."""
+        with self._lock:
+            if self._channel is not None and not self._channel.closed:
+                while self._channel.recv_ready():
+                    if not self._channel.recv(self._accumulation_buffer.recv_size):
+                        break
+            self._accumulation_buffer.reset()
+            self._transcript.clear()
+            self._last_match_offset = None
+
+    def open_channel(self, kind: str = "shell", command: Optional[str] = None, term: str = "vt100",
+                     width: int = 80, height: int = 24, combine_stderr: bool = False) -> paramiko.Channel:
+        """
+        Open an additional shell or exec channel on this connection's transport.
+
+        Args:
+            kind: 'shell' for an interactive shell with a pty, 'exec' to run command.
+            command: Command for an exec channel.
+            term: Terminal type for the pty.
+            width: Terminal width.
+            height: Terminal height.
+            combine_stderr: Deliver stderr on the same stream as stdout.
+
+        Returns:
+            The new channel; the caller is responsible for closing it.
+        """
+        with self._lock:
+            transport = self._client.get_transport()
+            if transport is None or not transport.is_active():
+                raise RuntimeError(f"Not connected to {self._hostname}")
+            channel = transport.open_session(timeout=self._timeout)
+        channel.set_combine_stderr(combine_stderr)
+        if kind == "shell":
+            channel.get_pty(term=term, width=width, height=height)
+            channel.invoke_shell()
+        elif kind == "exec":
+            if not command:
+                raise ValueError("An exec channel requires a command")
+            channel.exec_command(command)
+        else:
+            channel.close()
+            raise ValueError(f"Unknown channel kind: {kind}")
+        return channel
+
     def disconnect(self) -> None:
         with self._lock:
             print("Disconnecting...")
@@ -277,18 +422,77 @@ class ThreadSafeSSHConnection:
                 print(f"Exception during client close: {e}")
             print("Disconnected.")
 
+    def _ensure_shell(self) -> None:
+        """Open the interactive shell on first use when the connection was made in exec mode."""
+        if self._channel is None:
+            self._channel = self._client.invoke_shell()
+
+    def _settle(self, quiet: float = 0.2) -> None:
+        """Wait quiet seconds, then read whatever the shell has sent into the buffer and the transcript."""
+        time.sleep(quiet)
+        while self._channel.recv_ready():
+            self._transcript.append(self._accumulation_buffer.recv(self._channel))
+
+    def learn_prompt(self, cached: Optional[str] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Learn the device prompt from the login output and end every later command read on it.
+
+        With a cached regex from an earlier run, the login output is read until that regex
+        matches. Otherwise (or if the cached regex no longer matches, e.g. after a rename) the
+        output is read until a prompt-like line ends it, an anchored regex is built from that line
+        and it is confirmed by sending a newline and waiting for exactly one more prompt.
+
+        Args:
+            cached: Prompt regex learned for this device in an earlier run.
+            timeout: Seconds to wait for the prompt [default=the connection timeout].
+
+        Returns:
+            The regex now in use, or None if no prompt was recognised; commands then fall back
+            to the previous end-of-output detection.
+        """
+        timeout = self._timeout if timeout is None else timeout
+        with self._lock:
+            self._ensure_shell()
+            self._accumulation_buffer.reset()
+            if cached:
+                try:
+                    self._read_until(compile_prompt(cached), timeout, 1)
+                    self._settle()
+                    self._prompt_pattern = compile_prompt(cached)
+                    print(f"Using cached prompt pattern for {self._displayname}: {cached}")
+                    return cached
+                except Exception as e:
+                    print(f"Cached prompt pattern did not match for {self._displayname}: {e}")
+
+            try:
+                if find_prompt(self._accumulation_buffer.getvalue()) is None:
+                    self._read_until(PROMPT_AT_END, timeout, 1)
+                self._settle()
+                prompt = find_prompt(self._accumulation_buffer.getvalue())
+                if prompt is None:
+                    print(f"No prompt recognised for {self._displayname}")
+                    return None
+                pattern = prompt_regex(prompt)
+                self._accumulation_buffer.reset()
+                self._channel.send("\n")
+                self._read_until(compile_prompt(pattern), timeout, 1)
+            except Exception as e:
+                print(f"Could not learn the prompt for {self._displayname}: {e}")
+                return None
+            self._prompt_pattern = compile_prompt(pattern)
+            print(f"Learned prompt '{prompt}' for {self._displayname}: {pattern}")
+            return pattern
+
     def send_newline(self, expect: Union[str, Pattern], timeout: float = 10,
                      expect_occurrences: int = 1) -> str:
         with self._lock:
             try:
-                self._accumulation_buffer = ""  # Reset the accumulation buffer for the new command
+                self._ensure_shell()
+                self._accumulation_buffer.reset()  # Reset the accumulation buffer for the new command
                 print("Sending new line/enter")
                 self._channel.send("\n")
 
-                if self._prompt_failure:
-                    result = self._read_until(expect, timeout, expect_occurrences)
-                else:
-                    result = self._read_with_timeout(timeout)
+                result = self._timed_read(expect, timeout, expect_occurrences)
 
                 if self._scrub_esc:  # Scrub escape characters if the flag is set
                     result = self._scrub_escape_characters(result)
@@ -300,17 +504,36 @@ class ThreadSafeSSHConnection:
                 raise RuntimeError(f"Failed to send newline: {e}")
 
     def send_command(self, command: str, expect: Union[str, Pattern], timeout: float = 10,
-                     expect_occurrences: int = 1) -> str:
+                     expect_occurrences: int = 1, transport_mode: Optional[str] = None) -> str:
+        """
+        Run a command and return its output.
+
+        Args:
+            command: Command to send.
+            expect: Prompt pattern that ends the output (shell mode only). None, or any value when
+                prompt_failure is off, uses the learned prompt pattern.
+            timeout: Seconds to wait for the prompt (shell mode only).
+            expect_occurrences: Prompt matches to wait for (shell mode only).
+            transport_mode: 'shell' or 'exec' for this command [default=the connection's transport mode].
+        """
+        if (transport_mode or self.transport_mode) == "exec":
+            return self.exec_command(command)
         with self._lock:
             try:
-                self._accumulation_buffer = ""  # Reset the accumulation buffer for the new command
+                self._ensure_shell()
+                # A late prompt left from the previous command would otherwise end this one immediately
+                while self._channel.recv_ready():
+                    self._transcript.append(self._accumulation_buffer.recv(self._channel))
+                self._accumulation_buffer.reset()  # Reset the accumulation buffer for the new command
                 print(f"Sending command: {command}")
-                self._channel.send(command + "\n")
-
-                if self._prompt_failure:
-                    result = self._read_until(expect, timeout, expect_occurrences)
+                marker = None
+                if self._sentinel:
+                    marker = f"SIMPLENET-{uuid.uuid4().hex[:12]}"
+                    self._channel.send(command + "\n" + self._sentinel.format(marker=marker) + "\n")
                 else:
-                    result = self._read_with_timeout(timeout)
+                    self._channel.send(command + "\n")
+
+                result = self._timed_read(expect, timeout, expect_occurrences, marker=marker)
 
                 if self._scrub_esc:  # Scrub escape characters if the flag is set
                     result = self._scrub_escape_characters(result)
@@ -335,31 +558,462 @@ class ThreadSafeSSHConnection:
                 outputs.append(output)
             return outputs
 
-    def _read_until(self, expect: Union[str, Pattern], timeout: float, expect_occurrences: int) -> str:
-        buffer = ""
-        occurrences = 0  # Track the number of times the expected pattern is found
+    def send_commands_parallel(self, commands: List[str], expect: Union[str, Pattern], timeout: float = 10,
+                               expect_occurrences: Union[int, List[int]] = 1, channels: int = 4,
+                               mode: str = "shell", setup_commands: Optional[List[str]] = None) -> List[Union[str, Exception]]:
+        """
+        Run independent commands concurrently over several channels of this connection's transport.
+
+        In 'shell' mode, up to channels - 1 extra shells are opened next to the primary one. Each
+        extra shell waits for its first prompt and runs setup_commands (for example
+        'terminal length 0'). Then every shell takes commands from a shared queue. In 'exec' mode,
+        each command runs on its own exec channel, with up to channels running at once, and the
+        output is read until the device closes the channel.
+
+        If the device refuses extra channels, the commands run on the channels that did open. If
+        none opened, they run one at a time on the primary shell as send_commands() would.
+
+        Args:
+            commands: Commands to run; they must not depend on each other's effects.
+            expect: Prompt pattern that ends each command's output in 'shell' mode.
+            timeout: Per-command timeout in seconds.
+            expect_occurrences: Prompt matches to wait for, for all commands or per command.
+            channels: Maximum number of channels used at once, including the primary shell.
+            mode: 'shell' or 'exec'.
+            setup_commands: Commands run once on each extra shell before it takes work.
+
+        Returns:
+            Outputs in the order of commands. A command that failed is returned as the
+            RuntimeError describing the failure, so one bad command does not discard the others.
+        """
+        if isinstance(expect_occurrences, int):
+            expect_occurrences = [expect_occurrences] * len(commands)
+        elif len(expect_occurrences) != len(commands):
+            raise ValueError("The length of expect_occurrences must match the length of commands")
+        if mode not in ("shell", "exec"):
+            raise ValueError(f"Unknown parallel mode: {mode}")
+
+        results: List[Union[str, Exception, None]] = [None] * len(commands)
+        side_outputs = set()  # indices of commands that ran on an extra shell
+        work = queue.Queue()
+        for index, item in enumerate(zip(commands, expect_occurrences)):
+            work.put((index,) + item)
+
+        if mode == "exec":
+            workers = [lambda: self._exec_worker(work, results, timeout)
+                       for _ in range(max(1, min(channels, len(commands))))]
+        else:
+            extra = []
+            for _ in range(max(0, min(channels, len(commands)) - 1)):
+                try:
+                    extra.append(self._open_parallel_shell(expect, timeout, setup_commands))
+                except Exception as e:
+                    # Devices cap sessions per transport (or refuse them outright); use what opened
+                    print(f"Could not open an additional channel to {self._hostname}: {e}")
+                    break
+            if not extra:
+                print("No additional channels available, running commands on the primary channel")
+            workers = [lambda: self._shell_worker(work, results, expect, timeout)]
+            workers += [lambda channel=channel, receiver=receiver:
+                        self._shell_worker(work, results, expect, timeout, channel, receiver, side_outputs)
+                        for channel, receiver in extra]
+
+        device = events.get_device()
+
+        def run(worker):
+            events.set_device(device)  # metrics from worker threads belong to this device
+            worker()
+
+        threads = [threading.Thread(target=run, args=(worker,), daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if mode == "shell":
+            for channel, _ in extra:
+                channel.close()
+            # Keep the transcript complete: append the extra shells' output in command order
+            with self._lock:
+                for index in sorted(side_outputs):
+                    if isinstance(results[index], str):
+                        self._transcript.append(results[index])
+        return results
+
+    def send_commands_pipelined(self, commands: List[str], window: int = 8, timeout: float = 10,
+                                error_string: Optional[str] = None) -> List[Union[str, Exception]]:
+        """
+        Run commands in order on the shell, keeping up to window commands written ahead.
+
+        The device reads typed-ahead lines one at a time, so the returned stream is split back
+        into per-command outputs at each learned prompt, and each output must start with the echo
+        of its command. A new command is written as soon as an earlier one completes, so a batch
+        costs about one round trip per window instead of one per command plus a pause.
+
+        If a segment does not start with the expected echo, or the prompts stop arriving within
+        timeout (the device dropped typed-ahead input), the stream is split by echoed command
+        lines instead. A command that was written but whose echo never appeared is not sent
+        again, since the device may have run it; a RuntimeError is returned in its place. Commands
+        not yet written are then sent in lock-step, waiting for the prompt after each one. Without
+        a learned prompt, or with a window below 2, or in sentinel mode, every command runs in
+        lock-step.
+
+        Args:
+            commands: Commands to run, in order.
+            window: Maximum commands written but not yet completed.
+            timeout: Seconds to wait for further output before falling back to lock-step.
+            error_string: Stop writing further commands once a command's output contains it.
+                Commands already written ahead (at most window - 1) still run.
+
+        Returns:
+            Outputs of the commands that ran, in order; shorter than commands if error_string
+            stopped the batch. A command that failed in lock-step, or whose output was lost after
+            it was written, is returned as a RuntimeError.
+        """
+        with self._lock:
+            if self._prompt_pattern is None or window < 2 or self._sentinel:
+                return self._send_lockstep(commands, timeout, error_string)
+
+            self._ensure_shell()
+            while self._channel.recv_ready():
+                self._transcript.append(self._accumulation_buffer.recv(self._channel))
+            head = compile_prompt(prompt_head(self._prompt_pattern.pattern))
+            receiver = ReceiveBuffer(recv_size=self._accumulation_buffer.recv_size,
+                                     errors=self._accumulation_buffer.errors, accumulate=False)
+            outputs: List[Union[str, Exception]] = []
+            sent = 0
+            stopped = False
+            pending: List[str] = []  # chunks of the output not yet split off
+            pending_length = 0
+            start_time = time.perf_counter()
+            self._channel.settimeout(timeout)
+            try:
+                while True:
+                    if not stopped and sent < len(commands) and sent - len(outputs) < window:
+                        batch = commands[sent:len(outputs) + window]
+                        print(f"Sending {len(batch)} pipelined commands")
+                        self._channel.send("".join(command + "\n" for command in batch))
+                        sent += len(batch)
+                    if len(outputs) == sent:
+                        return outputs
+
+                    try:
+                        chunk = receiver.recv(self._channel)
+                    except SocketTimeout:
+                        print(f"No prompt within {timeout}s with {sent - len(outputs)} commands in flight")
+                        return self._pipeline_fallback(commands, outputs, sent, "".join(pending), timeout,
+                                                       error_string)
+                    self._transcript.append(chunk)
+                    pending.append(chunk)
+                    pending_length += len(chunk)
+
+                    # Split off every complete segment: echo, output and the prompt that ends it
+                    scan = len(chunk) + self._match_window
+                    while len(outputs) < sent:
+                        window_text = self._tail(pending, scan)
+                        base = pending_length - len(window_text)
+                        if base > 0:
+                            line_start = window_text.find("\n") + 1 or len(window_text)
+                            window_text = window_text[line_start:]
+                            base += line_start
+                        next_command = commands[len(outputs) + 1] if len(outputs) + 1 < sent else None
+                        end = self._find_boundary(head, window_text, next_command)
+                        if end is None:
+                            break
+                        text = "".join(pending)
+                        segment, rest = text[:base + end], text[base + end:]
+                        pending = [rest] if rest else []
+                        pending_length = len(rest)
+                        scan = pending_length
+                        command = commands[len(outputs)]
+                        if not self._echo_matches(segment, command):
+                            print(f"Output does not start with the echo of '{command}'")
+                            return self._pipeline_fallback(commands, outputs, sent, segment + rest, timeout,
+                                                           error_string)
+                        outputs.append(self._scrub_escape_characters(segment) if self._scrub_esc else segment)
+                        if error_string and error_string in segment:
+                            print(f"Error string '{error_string}' in the output of '{command}', not sending further commands")
+                            stopped = True
+            finally:
+                self._accumulation_buffer.bytes_received += receiver.bytes_received
+                metrics.observe('prompt_wait', time.perf_counter() - start_time, label='pipelined')
+                metrics.count('bytes_received', receiver.bytes_received)
+
+    def _find_boundary(self, head: Pattern, text: str, next_command: Optional[str]) -> Optional[int]:
+        """
+        Return the offset just past the first prompt in text that ends a command, or None.
+
+        The rest of the prompt's line must be empty or the (possibly still arriving) echo of the
+        next command; a line that merely starts like the prompt inside the output is skipped.
+        """
+        next_echo = next_command.strip() if next_command is not None else None
+        for match in head.finditer(text):
+            line_end = text.find("\n", match.end())
+            rest = self._scrub_escape_characters(text[match.end():len(text) if line_end < 0 else line_end]).strip()
+            if not rest:
+                return match.end()
+            if next_echo is not None and (next_echo.startswith(rest) or self._echo_line(next_echo) in rest):
+                return match.end()
+        return None
+
+    @staticmethod
+    def _tail(chunks: List[str], size: int) -> str:
+        parts = []
+        collected = 0
+        for chunk in reversed(chunks):
+            parts.append(chunk)
+            collected += len(chunk)
+            if collected >= size:
+                break
+        return "".join(reversed(parts))[-size:]
+
+    @staticmethod
+    def _echo_line(command: str) -> str:
+        # Long lines may be echoed scrolled, e.g. '$ace GigabitEthernet1/0/1', so compare the end of the command
+        return command.strip()[-32:]
+
+    def _echo_matches(self, segment: str, command: str) -> bool:
+        echo = self._echo_line(command)
+        for line in self._scrub_escape_characters(segment).splitlines():
+            if line.strip():
+                return echo in line
+        return not echo
+
+    def _send_lockstep(self, commands: List[str], timeout: float, error_string: Optional[str]) -> List[Union[str, Exception]]:
+        """Send commands one at a time, waiting for the prompt after each, until error_string appears."""
+        outputs: List[Union[str, Exception]] = []
+        for command in commands:
+            try:
+                output = self.send_command(command, None, timeout, transport_mode="shell")
+            except RuntimeError as e:
+                outputs.append(e)
+                continue
+            outputs.append(output)
+            if error_string and error_string in output:
+                break
+        return outputs
+
+    def _pipeline_fallback(self, commands: List[str], outputs: List[Union[str, Exception]], sent: int, text: str,
+                           timeout: float, error_string: Optional[str]) -> List[Union[str, Exception]]:
+        """
+        Recover from a pipelined batch that lost sync: split what arrived by echoed command lines
+        and send the commands that were never written in lock-step.
+
+        Commands before sent were already written to the device; one whose echo is missing gets a
+        RuntimeError instead of being resent, which could apply a configuration line twice.
+        """
+        self._accumulation_buffer.reset()
+        self._settle(0.5)
+        text += self._accumulation_buffer.getvalue()
+        positions = []
+        search_from = 0
+        for command in commands[len(outputs):sent]:
+            echo = self._echo_line(command)
+            position = text.find(echo, search_from) if echo else search_from
+            if position < 0:
+                break
+            positions.append(position)
+            search_from = position + len(echo)
+        for index, start in enumerate(positions):
+            end = positions[index + 1] if index + 1 < len(positions) else len(text)
+            segment = text[start:end]
+            outputs.append(self._scrub_escape_characters(segment) if self._scrub_esc else segment)
+            if error_string and error_string in segment:
+                return outputs
+        for command in commands[len(outputs):sent]:
+            outputs.append(RuntimeError(f"Output of '{command}' was lost after it was written; not sending it again"))
+        remaining = commands[sent:]
+        if remaining:
+            print(f"Falling back to lock-step for {len(remaining)} commands")
+            outputs.extend(self._send_lockstep(remaining, timeout, error_string))
+        return outputs
+
+    def _open_parallel_shell(self, expect: Union[str, Pattern], timeout: float,
+                             setup_commands: Optional[List[str]]):
+        channel = self.open_channel(kind="shell")
+        receiver = ReceiveBuffer(recv_size=self._accumulation_buffer.recv_size, errors=self._accumulation_buffer.errors)
+        try:
+            self._timed_read(expect, timeout, 1, channel, receiver)
+            for command in setup_commands or []:
+                receiver.reset()
+                channel.send(command + "\n")
+                self._timed_read(expect, timeout, 1, channel, receiver)
+        except Exception:
+            channel.close()
+            raise
+        return channel, receiver
+
+    def _shell_worker(self, work: queue.Queue, results: list, expect: Union[str, Pattern], timeout: float,
+                      channel: Optional[paramiko.Channel] = None, receiver: Optional[ReceiveBuffer] = None,
+                      side_outputs: Optional[set] = None) -> None:
+        """Run queued commands on one shell: the primary channel when channel is None, otherwise an extra one."""
+        while True:
+            try:
+                index, command, occurrences = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if channel is None:
+                    results[index] = self.send_command(command, expect, timeout, occurrences)
+                    continue
+                receiver.reset()
+                print(f"Sending command on channel {channel.get_id()}: {command}")
+                channel.send(command + "\n")
+                output = self._timed_read(expect, timeout, occurrences, channel, receiver)
+                results[index] = self._scrub_escape_characters(output) if self._scrub_esc else output
+                side_outputs.add(index)
+            except Exception as e:
+                print(f"Exception during parallel command '{command}': {e}")
+                results[index] = e if isinstance(e, RuntimeError) else RuntimeError(f"Failed to send command '{command}': {e}")
+                if channel is not None:
+                    # The shell state is unknown after a failure; leave the remaining work to the other channels
+                    return
+
+    def exec_command(self, command: str, timeout: Optional[float] = None) -> str:
+        """
+        Run a command on its own exec channel and return its output (stdout and stderr combined).
+
+        Completion is the device closing the channel, so there is no prompt matching, no echo to
+        strip and no waiting for output to go quiet. The exit status is kept in last_exit_status.
+
+        Args:
+            command: Command to run.
+            timeout: Seconds to wait for the command to finish [default=exec_timeout, None waits indefinitely].
+
+        Raises:
+            RuntimeError: If the channel could not be opened or the command did not finish in time.
+        """
+        print(f"Executing command: {command}")
+        try:
+            output, exit_status = self._run_exec(command, self._exec_timeout if timeout is None else timeout)
+        except Exception as e:
+            print(f"Exception during exec_command: {e}")
+            raise RuntimeError(f"Failed to run command '{command}': {e}")
+        with self._lock:
+            self._last_exit_status = exit_status
+            self._transcript.append(output)
+        if exit_status:
+            print(f"Command '{command}' exited with status {exit_status}")
+        return self._scrub_escape_characters(output) if self._scrub_esc else output
+
+    def _run_exec(self, command: str, timeout: Optional[float]):
+        """Run command on a new exec channel, returning (output, exit status)."""
+        channel = self.open_channel(kind="exec", command=command, combine_stderr=True)
+        receiver = ReceiveBuffer(recv_size=self._accumulation_buffer.recv_size, errors=self._accumulation_buffer.errors)
+        channel.settimeout(timeout)
+        start_time = time.perf_counter()
+        try:
+            try:
+                while True:
+                    receiver.recv(channel)
+            except EOFError:
+                pass
+            # The status arrives with or just after EOF; paramiko reports -1 if the device closed without one
+            exit_status = channel.recv_exit_status()
+            if exit_status == -1:
+                exit_status = None
+        finally:
+            channel.close()
+            metrics.observe('prompt_wait', time.perf_counter() - start_time, label='exec')
+            metrics.count('bytes_received', receiver.bytes_received)
+        return receiver.finish(), exit_status
+
+    def _exec_worker(self, work: queue.Queue, results: list, timeout: float) -> None:
+        """Run queued commands, each on its own exec channel."""
+        while True:
+            try:
+                index, command, _ = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                output, _ = self._run_exec(command, timeout)
+                results[index] = self._scrub_escape_characters(output) if self._scrub_esc else output
+            except Exception as e:
+                print(f"Exception during exec command '{command}': {e}")
+                results[index] = RuntimeError(f"Failed to run command '{command}': {e}")
+
+    def _end_pattern(self, expect: Optional[Union[str, Pattern]]) -> Optional[Union[str, Pattern]]:
+        """The pattern that ends a command's output, or None for the quiet-gap read."""
+        if self._prompt_failure and expect is not None:
+            return expect
+        return self._prompt_pattern
+
+    def _timed_read(self, expect: Union[str, Pattern], timeout: float, expect_occurrences: int,
+                    channel: Optional[paramiko.Channel] = None, receiver: Optional[ReceiveBuffer] = None,
+                    marker: Optional[str] = None) -> str:
+        """Read the command response, recording the prompt wait time and bytes received."""
+        counter = self._accumulation_buffer if receiver is None else receiver
+        start_bytes = counter.bytes_received
+        start_time = time.perf_counter()
+        try:
+            if marker is not None:
+                return self._read_sentinel(marker, timeout)
+            pattern = self._end_pattern(expect)
+            if pattern is None:
+                return self._read_with_timeout(timeout, channel, receiver)
+            # The learned prompt is exact, so the first match ends the output
+            occurrences = expect_occurrences if pattern is expect else 1
+            return self._read_until(pattern, timeout, occurrences, channel, receiver)
+        finally:
+            metrics.observe('prompt_wait', time.perf_counter() - start_time)
+            metrics.count('bytes_received', counter.bytes_received - start_bytes)
+
+    def _read_until(self, expect: Union[str, Pattern], timeout: float, expect_occurrences: int,
+                    channel: Optional[paramiko.Channel] = None, receiver: Optional[ReceiveBuffer] = None) -> str:
+        """
+        Read until the expected pattern has matched expect_occurrences distinct times.
+
+        Each chunk is matched incrementally: only the new data plus a window of earlier output
+        (long enough for a match to straddle a chunk boundary) is scanned, and scanning never
+        restarts before the end of a match that was already counted. This keeps long outputs
+        linear in size and makes expect_occurrences count distinct prompts.
+
+        channel and receiver select an additional channel opened by send_commands_parallel();
+        output read from it is not added to the transcript.
+        """
+        primary = channel is None
+        channel = self._channel if channel is None else channel
+        receiver = self._accumulation_buffer if receiver is None else receiver
+        occurrences = 0  # Track the number of distinct matches of the expected pattern
         if isinstance(expect, str):
             expect = re.compile(re.escape(expect))
+        overlap = max(self._match_window, len(expect.pattern))
+        anchored = bool(expect.flags & re.MULTILINE)
+        last_match_end = 0
+        if primary:
+            self._last_match_offset = None
 
-        self._channel.settimeout(timeout)
+        channel.settimeout(timeout)
         print(f"Waiting for pattern '{expect.pattern}' {expect_occurrences} times")
 
         start_time = time.time()
         while True:
             try:
-                chunk = self._channel.recv(1024).decode('utf-8')
-                if not chunk:
-                    raise EOFError("Connection closed by remote host")
-                buffer += chunk
-                self._accumulation_buffer += chunk
-                self._output_buffer += chunk
+                chunk = receiver.recv(channel)
+                if primary:
+                    self._transcript.append(chunk)
                 # print(f"Received chunk: {chunk}")
 
-                if expect.search(self._accumulation_buffer):
+                # Scan the new text plus an overlap window, never before the end of a counted match
+                window = receiver.tail(len(chunk) + overlap) if chunk else ""
+                base = len(receiver) - len(window)
+                if anchored and base > 0:
+                    # '^' would match at the window start; begin the window on a real line start instead
+                    line_start = window.find("\n") + 1
+                    if not line_start:
+                        line_start = len(window)  # no line starts here, so nothing in it can be a prompt
+                    window = window[line_start:]
+                    base += line_start
+                for match in expect.finditer(window, max(0, last_match_end - base)):
+                    if match.end() == match.start() and base + match.end() <= last_match_end:
+                        continue  # an empty match at the previous position is not a new prompt
                     occurrences += 1
-                    print(f"Pattern '{expect.pattern}' occurrence {occurrences} found")
+                    last_match_end = base + match.end()
+                    print(f"Pattern '{expect.pattern}' occurrence {occurrences} found at offset {base + match.start()}")
                     if occurrences >= expect_occurrences:
-                        return self._accumulation_buffer
+                        if primary:
+                            self._last_match_offset = last_match_end
+                        return receiver.getvalue()
 
                 if time.time() - start_time > timeout:
                     raise TimeoutError(f"Timeout waiting for '{expect.pattern}' after {occurrences} occurrences")
@@ -370,26 +1024,56 @@ class ThreadSafeSSHConnection:
                 print(f"Exception in _read_until: {e}")
                 raise RuntimeError(f"Error reading from channel: {e}")
 
-    def _read_with_timeout(self, timeout: float) -> str:
-        buffer = ""
+    def _read_sentinel(self, marker: str, timeout: float) -> str:
+        """
+        Read until the shell runs the sentinel command and return the output before it.
+
+        The sentinel is typed ahead, and a terminal that echoes input as it arrives (a Linux pty)
+        may show it straight after the command, before the command's output. With a learned prompt
+        the output therefore ends at the prompt line that runs the sentinel, and earlier echoes of
+        it are dropped. Without one it ends at the first line holding the marker, which is only
+        right for CLIs that echo typed-ahead input when they read it, such as IOS. The sentinel's
+        own response is then consumed so the next command starts clean.
+        """
+        receiver = self._accumulation_buffer
+        if self._prompt_pattern is None:
+            end = re.compile(re.escape(marker))
+        else:
+            end = re.compile(prompt_head(self._prompt_pattern.pattern) + r"[^\n]*" + re.escape(marker), re.MULTILINE)
+        self._read_until(end, timeout, 1)
+        text = receiver.getvalue()
+        match = end.search(text)
+        output = text[:text.rfind("\n", 0, match.start() + 1) + 1]
+        output = "".join(line for line in output.splitlines(keepends=True) if marker not in line)
+        if self._prompt_pattern is None:
+            self._settle()
+        elif not self._prompt_pattern.search(text, match.end()):
+            self._read_until(self._prompt_pattern, timeout, 1)
+        self._last_match_offset = len(output)
+        return output
+
+    def _read_with_timeout(self, timeout: float, channel: Optional[paramiko.Channel] = None,
+                           receiver: Optional[ReceiveBuffer] = None) -> str:
+        primary = channel is None
+        channel = self._channel if channel is None else channel
+        receiver = self._accumulation_buffer if receiver is None else receiver
+        seen_newline = False
         start_time = time.time()
-        self._channel.settimeout(timeout)
+        channel.settimeout(timeout)
 
         while True:
             try:
-                chunk = self._channel.recv(1024).decode('utf-8')
-                if not chunk:
-                    raise EOFError("Connection closed by remote host")
-                buffer += chunk
-                self._accumulation_buffer += chunk
-                self._output_buffer += chunk
+                chunk = receiver.recv(channel)
+                if primary:
+                    self._transcript.append(chunk)
+                seen_newline = seen_newline or "\n" in chunk
                 # print(f"Received chunk: {chunk}")
 
                 # Check if we've received the full output
-                if "\n" in buffer and not self._channel.recv_ready():
+                if seen_newline and not channel.recv_ready():
                     time.sleep(0.1)  # Short sleep to ensure no more data is coming
-                    if not self._channel.recv_ready():
-                        return buffer
+                    if not channel.recv_ready():
+                        return receiver.getvalue()
 
                 if time.time() - start_time > timeout:
                     raise TimeoutError("Timeout waiting for command output")
@@ -407,13 +1091,28 @@ class ThreadSafeSSHConnection:
         ansi_escape = re.compile(r'(?:\x1B[@-_][0-?]*[ -/]*[@-~])')
         return ansi_escape.sub('', text)
 
-    def retrieve_buffer(self) -> str:
+    def retrieve_buffer(self, page_size: Optional[int] = None) -> Union[str, Iterator[str]]:
+        """
+        Return the session transcript.
+
+        Args:
+            page_size: If set, return an iterator of pages of this many characters covering the
+                whole transcript, including output spilled to the transcript file. Otherwise return
+                the output still held in memory (at most transcript_size characters).
+        """
+        with self._lock:
+            if page_size:
+                return self._transcript.pages(page_size)
+            return self._transcript.getvalue()
+
+    @property
+    def transcript(self) -> TranscriptBuffer:
         with self._lock:
-            return self._output_buffer
+            return self._transcript
 
     def clear_buffer(self) -> None:
         with self._lock:
-            self._output_buffer = ""
+            self._transcript.clear()
 
     def __enter__(self):
         return self
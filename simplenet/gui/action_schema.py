@@ -18,6 +18,10 @@ schema = {
                 {"name": "output_path", "type": "file", "label": "Output Path", "required": False},
                 {"name": "output_mode", "type": "choice", "label": "Output Mode", "choices": ["append", "overwrite"], "required": False},
                 {"name": "prompt_count", "type": "number", "label": "Prompt Count", "required": False},
+                {"name": "transport_mode", "type": "choice", "label": "Transport Mode", "choices": ["shell", "exec"], "required": False,
+                 "description": "shell scrapes an interactive shell for the prompt; exec runs each command on its own channel and completes on EOF."},
+                {"name": "sentinel", "type": "text", "label": "Sentinel Command", "required": False,
+                 "description": "Harmless command with a {marker} placeholder sent after every shell command, e.g. '! {marker}'. Output ends where its echo starts."},
                 {
                     "name": "actions",
                     "type": "list",
@@ -212,6 +216,11 @@ schema = {
                 {"name": "output_path", "type": "file", "label": "Output Path", "required": False},
                 {"name": "output_mode", "type": "choice", "label": "Output Mode", "choices": ["append", "overwrite"], "required": False},
                 {"name": "output_format", "type": "choice", "label": "Output Format", "choices": ["text", "both"], "required": False},
+                {"name": "transport_mode", "type": "choice", "label": "Transport Mode", "choices": ["shell", "exec"], "required": False},
+                {"name": "timeout", "type": "number", "label": "Timeout (seconds)", "required": False, "default": "10"},
+                {"name": "expect_occurrences", "type": "number", "label": "Expect Occurrences", "required": False, "default": "20"},
+                {"name": "pipeline_window", "type": "number", "label": "Pipeline Window", "required": False, "default": "1",
+                 "description": "Write up to this many command lines ahead instead of waiting for the prompt after each one. 1 sends in lock-step."},
                 {"name": "ttp_path", "type": "file", "label": "TTP Template Path", "required": False},
                 {
                     "name": "store_query",
@@ -236,6 +245,14 @@ schema = {
                 {"name": "output_mode", "type": "choice", "label": "Output Mode", "choices": ["append", "overwrite"], "required": False},
                 {"name": "parse_output", "type": "checkbox", "label": "Parse Output", "required": False},
                 {"name": "ttp_path", "type": "file", "label": "TTP Template Path", "required": False},
+                {"name": "transport_mode", "type": "choice", "label": "Transport Mode", "choices": ["shell", "exec"], "required": False},
+                {"name": "timeout", "type": "number", "label": "Timeout (seconds)", "required": False, "default": "10"},
+                {"name": "expect_occurrences", "type": "number", "label": "Expect Occurrences", "required": False, "default": "20"},
+                {"name": "parallel_channels", "type": "number", "label": "Parallel Channels", "required": False, "default": "1",
+                 "description": "Run the loop commands concurrently on up to this many channels of the SSH session. Falls back to one channel if the device refuses more."},
+                {"name": "parallel_mode", "type": "choice", "label": "Parallel Mode", "choices": ["shell", "exec"], "required": False},
+                {"name": "parallel_setup_commands", "type": "multiline_text", "label": "Parallel Channel Setup Commands", "required": False,
+                 "description": "Commands run once on each additional shell, one per line, e.g. 'terminal length 0'."},
                 {
                     "name": "store_query",
                     "type": "nested",
@@ -315,6 +332,8 @@ schema = {
                 {"name": "variables_path", "type": "file", "label": "Variables Path", "required": False},
                 {"name": "expect", "type": "text", "label": "Expected Output", "required": False},
                 {"name": "error_string", "type": "text", "label": "Error String", "required": False},
+                {"name": "pipeline_window", "type": "number", "label": "Pipeline Window", "required": False, "default": "1",
+                 "description": "Write up to this many lines ahead instead of waiting for the prompt after each one. 1 sends in lock-step."},
             ]
         },
         "send_config_loop": {
@@ -370,6 +389,12 @@ schema = {
                 {"name": "output_file_path", "type": "file", "label": "Output File Path", "required": True}
             ]
         },
+        "sleep": {
+            "fields": [
+                {"name": "display_name", "type": "text", "label": "Display Name", "required": False},
+                {"name": "seconds", "type": "number", "label": "Seconds", "required": False, "default": 1}
+            ]
+        },
         "audit": {
             "fields": [
                 {"name": "display_name", "type": "text", "label": "Display Name", "required": True},
@@ -4,10 +4,11 @@ import json
 import traceback
 
 from simplenet.cli.lib.audit_loop_actions import handle_audit_action_loop
-from simplenet.cli.simplenet import load_variables_and_render_driver
+from simplenet.cli.simplenet import load_variables_and_render_driver, learn_device_prompt
+from simplenet.cli.lib.prompt import DEFAULT_PROMPT_CACHE_DIR
 from simplenet.cli.command_executor2 import execute_commands
 from simplenet.cli.data_store_broke import GlobalDataStoreWrapper as GlobalDataStore
-from simplenet.cli.ssh_utils import ThreadSafeSSHConnection
+from simplenet.cli.ssh_pool import get_pool
 from PyQt6.QtCore import QObject, pyqtSignal
 from ruamel.yaml import YAML as yaml, YAML
 from simplenet.cli.lib.audit_loop_actions import handle_audit_action_loop
@@ -77,20 +78,20 @@ class AutomationWrapper(QObject):
 
             username, password = credentials['username'], credentials['password']
 
-            # Establish an SSH connection
-            self.ssh_conn = ThreadSafeSSHConnection(
-                hostname=mgmt_ip,
-                debug=True,
-                look_for_keys=self.params.get('look_for_keys', False),
-                timeout=self.params.get('timeout', 10),
-                allow_agent=False,
-                prompt_failure=False,
-                scrub_esc=True
-            )
-
-            self.ssh_conn.set_displayname(hostname)
+            # Lease an SSH session from the pool; re-running the debugger against the same
+            # device reuses the authenticated transport instead of a new handshake
+            self.release_connection()
             try:
-                self.ssh_conn.connect(username=username, password=password)
+                self.ssh_conn = get_pool().acquire(
+                    mgmt_ip, username, password,
+                    displayname=hostname,
+                    debug=True,
+                    look_for_keys=self.params.get('look_for_keys', False),
+                    timeout=self.params.get('timeout', 10),
+                    allow_agent=False,
+                    prompt_failure=False,
+                    scrub_esc=True
+                )
                 self.progress.emit(f"Connected to {hostname} ({mgmt_ip})")
                 self.ssh_conn.is_connected = True
             except Exception as e:
@@ -103,7 +104,12 @@ class AutomationWrapper(QObject):
                 self.progress.emit(f"Error: Driver {driver_name} not found in the loaded driver data.")
                 return
 
-            self.actions = driver_data['drivers'][driver_name].get('actions', [])
+            driver_config = driver_data['drivers'][driver_name]
+            self.actions = driver_config.get('actions', [])
+            self.ssh_conn.set_transport_mode(driver_config.get('transport_mode', 'shell'))
+            self.ssh_conn.set_sentinel(driver_config.get('sentinel'))
+            if self.ssh_conn.transport_mode == 'shell' and self.ssh_conn.prompt_pattern is None:
+                learn_device_prompt(self.ssh_conn, hostname, self.params.get('prompt_cache_dir', DEFAULT_PROMPT_CACHE_DIR))
 
 
             self.progress.emit(f"Ready to start executing actions for {hostname}")
@@ -112,6 +118,17 @@ class AutomationWrapper(QObject):
             self.progress.emit(f"Error during execution for device {device['hostname']}: {str(e)}")
             traceback.print_exc()
 
+    def release_connection(self, discard=False):
+        """
+        Return the SSH session to the connection pool.
+
+        Args:
+            discard (bool): Close the session instead of keeping it for reuse.
+        """
+        if self.ssh_conn is not None:
+            get_pool().release(self.ssh_conn, discard=discard)
+            self.ssh_conn = None
+
     def _get_device_credentials(self, device, inventory_data):
         """
         Retrieve the device credentials from the inventory data.
@@ -144,7 +161,7 @@ class AutomationWrapper(QObject):
                 print(f"DEBUG: Next action index after execution: {self.current_action_index}")
             else:
                 self.progress.emit("All actions have been executed.")
-                self.ssh_conn.disconnect()
+                self.release_connection()
                 self.connected = False
 
         except Exception as e:
@@ -104,6 +104,7 @@ class SSHLib(BaseBackend, QObject):
         self.password = password
         # self.thread = threading.Thread(target=self.connect)
         self.ssh_client = None
+        self.owns_client = False  # True when connect() opened the client, so close() must close it
         self.channel = channel  # Accept an existing channel
         # self.thread.start()
         self.listener = Communication()  # Create a listener object
@@ -131,10 +132,12 @@ class SSHLib(BaseBackend, QObject):
         self.listener.stop_flag = True
         self.listener.shutdown()
 
-    # Connect to the SSH server
+    # Connect to the SSH server. Interactive terminals live as long as their window, so they use a
+    # dedicated connection rather than holding one of the connection pool's per-host slots.
     def connect(self):
         try:
             self.ssh_client = paramiko.SSHClient()
+            self.owns_client = True
             # self.ssh_client.load_system_host_keys()  # Load known host keys
             self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # Auto-add unknown hosts
             self.ssh_client.connect(self.ip, username=self.username, password=self.password, look_for_keys=False)
@@ -191,3 +194,7 @@ class SSHLib(BaseBackend, QObject):
             return
         else:
             self.listener.shutdown()
+            if self.owns_client:
+                self.channel.close()
+                self.ssh_client.close()
+                self.owns_client = False
@@ -15,6 +15,7 @@ from simplenet.gui.terminal.term_widget import SSHTerminalWidget
 from simplenet.gui.visual_actions import display_action_details
 from simplenet.gui.runner_form import RunnerForm
 from simplenet.gui.simplenet_wrapper import AutomationWrapper
+from simplenet.cli.ssh_pool import get_pool
 global_data_store_content = ""
 debugging = False
 
@@ -379,8 +380,9 @@ class VisualDebugger(QMainWindow):
         try:
             # Check if the AutomationWrapper has an active SSH connection
             if self.automation_wrapper and self.automation_wrapper.ssh_conn:
-                # Get the live SSH channel
-                ssh_channel = self.automation_wrapper.ssh_conn.channel
+                # Open a second shell on the session's transport, so the terminal does not
+                # compete with the automation for output on its channel
+                ssh_channel = get_pool().open_channel(self.automation_wrapper.ssh_conn, kind='shell', term='xterm')
 
                 # Create the terminal widget
                 terminal_widget = SSHTerminalWidget(parent=self, channel=ssh_channel)
@@ -572,6 +574,10 @@ class VisualDebugger(QMainWindow):
             params (dict): The parameters collected from the RunnerForm.
         """
         try:
+            # Hand the previous session back to the pool before starting over
+            if self.automation_wrapper:
+                self.automation_wrapper.release_connection()
+
             # Instantiate AutomationWrapper
             self.automation_wrapper = AutomationWrapper(**params)
             self.automation_wrapper.global_data_updated.connect(self.update_global_data_store_display)
@@ -0,0 +1,72 @@
+"""
+Benchmark the receive pipeline against the legacy decode-and-concatenate path.
+
+Run from the repository root:
+
+    python -m tests.bench_receive --size-mb 50
+"""
+import time
+
+import click
+
+from simplenet.cli.lib.receive import DEFAULT_RECV_SIZE, ReceiveBuffer
+
+
+def _legacy_receive(chunks):
+    """The previous read path: decode each chunk on its own and append with str += on an attribute."""
+
+    class Holder:
+        buffer = ""
+
+    holder = Holder()
+    for chunk in chunks:
+        holder.buffer += chunk.decode('utf-8')
+    return holder.buffer
+
+
+def _pipeline_receive(chunks):
+    receiver = ReceiveBuffer()
+    for chunk in chunks:
+        receiver.feed(chunk)
+    return receiver.finish()
+
+
+def benchmark(size_mb=50, chunk_size=1024, recv_size=DEFAULT_RECV_SIZE, legacy=True):
+    """
+    Compare the legacy decode-and-concatenate path with ReceiveBuffer on a synthetic device output.
+
+    The legacy path reads in chunk_size pieces (its fixed recv size); the pipeline reads in
+    recv_size pieces. Output is ASCII so the legacy path does not fail on split characters.
+
+    Returns:
+        dict: Seconds taken by each path.
+    """
+    line = b'GigabitEthernet1/0/1 is up, line protocol is up (connected) 1000Mb/s, media type is 10/100/1000BaseTX\r\n'
+    data = line * (size_mb * 1024 * 1024 // len(line))
+    results = {'bytes': len(data)}
+
+    if legacy:
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        start = time.perf_counter()
+        _legacy_receive(chunks)
+        results['legacy_seconds'] = round(time.perf_counter() - start, 3)
+
+    chunks = [data[i:i + recv_size] for i in range(0, len(data), recv_size)]
+    start = time.perf_counter()
+    _pipeline_receive(chunks)
+    results['pipeline_seconds'] = round(time.perf_counter() - start, 3)
+    return results
+
+
+@click.command()
+@click.option('--size-mb', default=50, help='Size of the synthetic output in MB [default=50].')
+@click.option('--chunk-size', default=1024, help='recv size of the legacy path [default=1024].')
+@click.option('--recv-size', default=DEFAULT_RECV_SIZE, help=f'recv size of the pipeline [default={DEFAULT_RECV_SIZE}].')
+@click.option('--skip-legacy', is_flag=True, help='Only time the new pipeline.')
+def main(size_mb, chunk_size, recv_size, skip_legacy):
+    """Benchmark the receive pipeline against the legacy decode-and-concatenate path."""
+    print(benchmark(size_mb, chunk_size, recv_size, legacy=not skip_legacy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+INVENTORY_YAML = """
+credentials:
+  - id: 1
+    name: lab
+    username: admin
+    password: admin
+devices:
+  - id: 1
+    hostname: rtr1
+    mgmt_ip: 192.0.2.1
+    model: CSR1000V
+    serial_number: S1
+    timestamp: "2024-01-01"
+    platform_id: 1
+    role_id: 1
+    site_id: 1
+    vendor_id: 1
+    credential_ids: []
+platforms:
+  - id: 1
+    name: ios
+roles:
+  - id: 1
+    name: core
+sites:
+  - id: 1
+    name: lab
+    location: lab
+vendors:
+  - id: 1
+    name: cisco
+"""
+
+DRIVER_YAML = """
+drivers:
+  cisco_ios:
+    error_string: "Invalid input"
+    output_path: "./output/{{ hostname }}.txt"
+    output_mode: "overwrite"
+    prompt_count: 4
+    actions:
+      - action: "send_command"
+        display_name: "Set Terminal Length"
+        command: "term len 0"
+        expect: "#"
+"""
+
+
+@pytest.fixture
+def lab(tmp_path, monkeypatch):
+    """A working directory holding a one-device inventory (with no credentials) and a driver."""
+    monkeypatch.chdir(tmp_path)
+    # Device runs started by simplenet-runner import simplenet from the checkout
+    monkeypatch.setenv('PYTHONPATH', REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    (tmp_path / 'inventory.yaml').write_text(INVENTORY_YAML)
+    (tmp_path / 'driver.yml').write_text(DRIVER_YAML)
+    return tmp_path
@@ -0,0 +1,104 @@
+import socket
+
+import paramiko
+import pytest
+
+from simplenet.cli.adaptive import AdaptiveConcurrency, classify_connection_error
+from simplenet.cli import runner
+
+
+def connected(duration=0.1, reused=False):
+    return {'type': 'connected', 'device': 'rtr', 'duration': duration, 'reused': reused}
+
+
+def failed(error_type, reason='connection'):
+    return {'type': 'failed', 'device': 'rtr', 'reason': reason, 'error_type': error_type}
+
+
+def feed(controller, events):
+    for event in events:
+        controller.handle(event)
+
+
+def limits(controller):
+    return [(decision['from'], decision['to']) for decision in controller.decisions]
+
+
+def test_slow_start_doubles_up_to_the_maximum():
+    controller = AdaptiveConcurrency(4, maximum=20, min_samples=5)
+    feed(controller, [connected()] * 5)
+    assert controller.limit == 8
+    feed(controller, [connected()] * 5)
+    assert controller.limit == 16
+    # 16 // 2 attempts make the next window, and the ceiling caps the doubling
+    feed(controller, [connected()] * 8)
+    assert controller.limit == 20
+    feed(controller, [connected()] * 10)
+    assert limits(controller) == [(4, 8), (8, 16), (16, 20)]
+    assert controller.summary()['peak_limit'] == 20
+
+
+def test_congestion_halves_the_limit_and_ends_slow_start():
+    controller = AdaptiveConcurrency(16, maximum=64, step=2, min_samples=5)
+    feed(controller, [connected()] * 6 + [failed('refused')] * 2)
+    assert controller.limit == 8
+    assert controller.decisions[-1]['reason'] == 'failure rate 25%'
+
+    # After a back-off the limit grows by the additive step only
+    feed(controller, [connected()] * 5)
+    assert controller.limit == 10
+    assert controller.decisions[-1]['reason'] == 'healthy'
+
+
+def test_limit_never_drops_below_the_minimum():
+    controller = AdaptiveConcurrency(4, minimum=3, min_samples=5)
+    feed(controller, [failed('timeout')] * 5)
+    assert controller.limit == 3
+    feed(controller, [failed('timeout')] * 5)
+    assert controller.limit == 3
+    assert limits(controller) == [(4, 3)]
+
+
+def test_refused_and_timed_out_probes_count_as_congestion():
+    controller = AdaptiveConcurrency(10, min_samples=4)
+    feed(controller, [failed('refused', 'unreachable'), failed('timeout', 'unreachable'),
+                      connected(), connected(), connected()])
+    assert controller.limit == 5
+
+
+def test_wrong_passwords_and_other_failures_are_not_congestion():
+    controller = AdaptiveConcurrency(4, min_samples=5)
+    feed(controller, [failed('auth'), failed('other', 'unreachable'), connected(), connected(), connected()])
+    assert controller.limit == 8
+    # Pooled sessions and failures before any connection attempt do not fill the window
+    feed(controller, [connected(reused=True), failed(None, 'no_credentials'), failed(None, 'exception')] * 3)
+    assert controller.limit == 8
+
+
+def test_slow_handshakes_back_off():
+    controller = AdaptiveConcurrency(8, min_samples=4)
+    feed(controller, [connected(0.1)] * 4)
+    assert controller.limit == 16
+    feed(controller, [connected(0.5)] * 8)
+    assert controller.limit == 8
+    assert controller.decisions[-1]['reason'].startswith('handshake p50 0.50s')
+
+
+@pytest.mark.parametrize('error, expected', [
+    (paramiko.AuthenticationException('Authentication timeout.'), 'auth_timeout'),
+    (paramiko.AuthenticationException('Authentication failed.'), 'auth'),
+    (socket.timeout('timed out'), 'timeout'),
+    (ConnectionRefusedError(111, 'Connection refused'), 'refused'),
+    (OSError(113, 'No route to host'), 'other'),
+])
+def test_classify_connection_error(error, expected):
+    assert classify_connection_error(error) == expected
+
+
+def test_probe_classifies_a_closed_port(monkeypatch):
+    def refuse(address, timeout):
+        raise ConnectionRefusedError(111, 'Connection refused')
+
+    monkeypatch.setattr(socket, 'create_connection', refuse)
+    assert runner.probe_ssh_port('192.0.2.1', timeout=1) == 'refused'
+    assert runner.check_device_reachability('192.0.2.1', timeout=1) is False
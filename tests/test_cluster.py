@@ -0,0 +1,160 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from simplenet.cli.cluster import (ClusterCoordinator, load_local_credentials, pack_job_files, parse_address,
+                                   read_messages, send_message, unpack_job_files)
+from simplenet.cli.runner import INVENTORY_SCHEMA
+
+TOKEN = 'cluster-secret'
+
+
+def make_job(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'inventory.db')
+    with conn:
+        for statement in INVENTORY_SCHEMA:
+            conn.execute(statement)
+        conn.execute("INSERT INTO devices (id, hostname, mgmt_ip) VALUES (1, 'rtr1', '192.0.2.1')")
+        conn.execute("INSERT INTO credentials VALUES (1, 'lab', 'admin', 'hunter2')")
+        conn.execute("INSERT INTO device_credentials VALUES (1, 1)")
+    conn.close()
+    (tmp_path / 'driver.yml').write_text('drivers: {}\n')
+    return {'db_file': str(tmp_path / 'inventory.db'), 'driver': str(tmp_path / 'driver.yml'), 'vars_file': None,
+            'driver_name': 'cisco_ios'}
+
+
+def join(coordinator, slots=2, token=TOKEN):
+    """Connect as a worker and return the socket and the coordinator's reply."""
+    sock = socket.create_connection(('127.0.0.1', coordinator.port))
+    send_message(sock, threading.Lock(), {'type': 'hello', 'slots': slots, 'token': token})
+    return sock, next(read_messages(sock), None)
+
+
+def test_job_files_are_shipped(tmp_path):
+    job = make_job(tmp_path)
+    packed = json.loads(json.dumps(pack_job_files(job)))
+
+    worker_dir = tmp_path / 'worker'
+    worker_dir.mkdir()
+    unpacked = unpack_job_files(packed, str(worker_dir))
+
+    assert 'files' not in unpacked
+    assert unpacked['vars_file'] is None
+    assert open(unpacked['driver']).read() == 'drivers: {}\n'
+    assert unpacked['db_file'].startswith(str(worker_dir))
+
+    conn = sqlite3.connect(unpacked['db_file'])
+    try:
+        assert conn.execute('SELECT hostname FROM devices').fetchall() == [('rtr1',)]
+        # Credentials stay on the coordinator, but the tables exist for the worker's lookups
+        assert conn.execute('SELECT COUNT(*) FROM credentials').fetchone() == (0,)
+        assert conn.execute('SELECT COUNT(*) FROM device_credentials').fetchone() == (0,)
+    finally:
+        conn.close()
+    assert b'hunter2' not in open(unpacked['db_file'], 'rb').read()
+    # The coordinator's own inventory is untouched
+    assert b'hunter2' in open(job['db_file'], 'rb').read()
+
+
+def test_worker_loads_its_own_credentials(tmp_path):
+    job = make_job(tmp_path)
+    worker_dir = tmp_path / 'worker'
+    worker_dir.mkdir()
+    unpacked = unpack_job_files(pack_job_files(job), str(worker_dir))
+    (tmp_path / 'credentials.yaml').write_text(
+        "credentials:\n  - {id: 7, name: site, username: netops, password: s3cret}\n"
+        "devices:\n  - {id: 1, credential_ids: [7]}\n")
+
+    load_local_credentials(unpacked['db_file'], str(tmp_path / 'credentials.yaml'))
+    conn = sqlite3.connect(unpacked['db_file'])
+    try:
+        assert conn.execute('SELECT id, username FROM credentials').fetchall() == [(7, 'netops')]
+        assert conn.execute('SELECT device_id, credential_id FROM device_credentials').fetchall() == [(1, 7)]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('message', [
+    {'type': 'hello', 'slots': 2},
+    {'type': 'hello', 'slots': 2, 'token': 'guess'},
+    {'type': 'pull', 'count': 4},
+])
+def test_connections_without_the_token_get_nothing(tmp_path, message):
+    coordinator = ClusterCoordinator('127.0.0.1', 0, make_job(tmp_path), token=TOKEN).start()
+    try:
+        sock = socket.create_connection(('127.0.0.1', coordinator.port))
+        send_message(sock, threading.Lock(), message)
+        replies = list(read_messages(sock))
+        sock.close()
+        assert replies == [{'type': 'error', 'error': 'authentication failed'}]
+        assert coordinator.capacity == 0
+    finally:
+        coordinator.shutdown()
+
+
+def test_coordinator_generates_a_token_when_none_is_given(tmp_path):
+    job = make_job(tmp_path)
+    first = ClusterCoordinator('127.0.0.1', 0, job)
+    second = ClusterCoordinator('127.0.0.1', 0, job)
+    assert len(first.token) >= 32
+    assert first.token != second.token
+
+
+def test_bare_port_binds_to_localhost():
+    assert parse_address('9750') == ('127.0.0.1', 9750)
+    assert parse_address(':9751') == ('127.0.0.1', 9751)
+    assert parse_address('10.0.0.5:9752') == ('10.0.0.5', 9752)
+    assert parse_address('runner01') == ('runner01', 9750)
+
+
+def test_negative_worker_grace_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ClusterCoordinator('127.0.0.1', 0, make_job(tmp_path), worker_grace=-1)
+
+
+def test_missing_job_file_is_reported_up_front(tmp_path):
+    job = make_job(tmp_path)
+    job['vars_file'] = str(tmp_path / 'missing.yml')
+    with pytest.raises(OSError):
+        ClusterCoordinator('127.0.0.1', 0, job)
+
+
+def test_queued_devices_fail_when_no_worker_remains(tmp_path):
+    coordinator = ClusterCoordinator('127.0.0.1', 0, make_job(tmp_path), worker_grace=0, token=TOKEN).start()
+    try:
+        # A worker joins, takes nothing and disconnects
+        sock, reply = join(coordinator)
+        assert reply['type'] == 'job'
+        assert coordinator.wait_for_workers(1, timeout=5)
+        sock.close()
+
+        future = coordinator.submit({'hostname': 'rtr1', 'mgmt_ip': '192.0.2.1'})
+        with pytest.raises(RuntimeError, match='no worker'):
+            future.result(timeout=10)
+    finally:
+        coordinator.shutdown()
+
+
+def test_capacity_follows_connected_workers(tmp_path):
+    coordinator = ClusterCoordinator('127.0.0.1', 0, make_job(tmp_path), token=TOKEN).start()
+    sockets = []
+    try:
+        for slots in (2, 3):
+            sock, _ = join(coordinator, slots)
+            sockets.append(sock)
+        assert coordinator.wait_for_workers(2, timeout=5)
+        assert coordinator.capacity == 5
+
+        sockets.pop().close()
+        deadline = time.monotonic() + 5
+        while coordinator.capacity != 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert coordinator.capacity == 2
+    finally:
+        for sock in sockets:
+            sock.close()
+        coordinator.shutdown()
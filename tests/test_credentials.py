@@ -0,0 +1,108 @@
+import json
+import sqlite3
+
+import pytest
+from cryptography.fernet import Fernet
+
+from simplenet.cli import credentials
+from simplenet.cli.credentials import CredentialService
+from simplenet.cli.runner import INVENTORY_SCHEMA
+
+
+@pytest.fixture
+def key_path(tmp_path):
+    path = tmp_path / 'crypto.key'
+    path.write_bytes(Fernet.generate_key())
+    return str(path)
+
+
+def encrypt(key_path, secret):
+    with open(key_path, 'rb') as fh:
+        return Fernet(fh.read()).encrypt(secret.encode()).decode()
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')
+    for statement in INVENTORY_SCHEMA:
+        conn.execute(statement)
+    conn.executemany('INSERT INTO credentials VALUES (?, ?, ?, ?)', [
+        (1, 'ro', 'monitor', 'monitor'), (2, 'rw', 'admin', 'admin'), (3, 'legacy', 'cisco', 'cisco')])
+    # Inserted out of id order: the device's own order is kept
+    conn.executemany('INSERT INTO device_credentials VALUES (?, ?)', [(7, 3), (7, 1), (7, 2), (8, 2)])
+    yield conn
+    conn.close()
+
+
+def test_candidates_follow_the_device_order(tmp_path, db_conn):
+    service = CredentialService(cache_dir=str(tmp_path / 'cache'))
+    assert [c[0] for c in service.candidates(7, 'rtr1', db_conn)] == [3, 1, 2]
+    assert service.candidates(8, 'rtr2', db_conn) == [(2, 'admin', 'admin')]
+    assert service.candidates(9, 'rtr3', db_conn) == []
+
+
+def test_last_working_credential_is_tried_first(tmp_path, db_conn):
+    service = CredentialService(cache_dir=str(tmp_path / 'cache'))
+    service.remember('rtr1', 2)
+    assert [c[0] for c in service.candidates(7, 'rtr1', db_conn)] == [2, 3, 1]
+    # Another device is not affected, and a new process reads the same record
+    assert [c[0] for c in service.candidates(7, 'rtr9', db_conn)] == [3, 1, 2]
+    fresh = CredentialService(cache_dir=str(tmp_path / 'cache'))
+    assert [c[0] for c in fresh.candidates(7, 'rtr1', db_conn)] == [2, 3, 1]
+    # A credential no longer assigned to the device leaves the order alone
+    service.remember('rtr1', 5)
+    assert [c[0] for c in service.candidates(7, 'rtr1', db_conn)] == [3, 1, 2]
+
+
+def test_only_the_credential_id_is_written(tmp_path, key_path):
+    cache_dir = tmp_path / 'cache'
+    service = CredentialService(key_path=key_path, cache_dir=str(cache_dir))
+    assert service.decrypt(encrypt(key_path, 's3cret!')) == 's3cret!'
+    service.remember('rtr1/vrf:mgmt', 2)
+
+    files = list(cache_dir.iterdir())
+    assert [path.name for path in files] == ['rtr1_vrf_mgmt.json']
+    entry = json.loads(files[0].read_text())
+    assert sorted(entry) == ['credential_id', 'updated']
+    assert entry['credential_id'] == 2
+    assert 's3cret!' not in files[0].read_text()
+
+
+def test_cache_dir_none_disables_the_record(tmp_path, db_conn):
+    service = CredentialService(cache_dir=None)
+    service.remember('rtr1', 2)
+    assert service.last_working('rtr1') is None
+    assert [c[0] for c in service.candidates(7, 'rtr1', db_conn)] == [3, 1, 2]
+
+    (tmp_path / 'rtr1.json').write_text('not json')
+    assert CredentialService(cache_dir=str(tmp_path)).last_working('rtr1') is None
+
+
+def test_decrypted_secrets_expire_after_the_ttl(monkeypatch, key_path):
+    now = [1000.0]
+    monkeypatch.setattr(credentials.time, 'monotonic', lambda: now[0])
+    service = CredentialService(key_path=key_path, ttl=60, cache_dir=None)
+    token = encrypt(key_path, 'admin')
+
+    assert service.decrypt(token) == 'admin'
+    now[0] += 59
+    assert service.decrypt(token) == 'admin'
+    assert service.stats == {'decrypted': 1, 'cache_hits': 1}
+    now[0] += 2
+    assert service.decrypt(token) == 'admin'
+    assert service.stats == {'decrypted': 2, 'cache_hits': 1}
+
+    # Plain secrets pass through, and a ttl of 0 decrypts on every use
+    assert service.decrypt('plain') == 'plain'
+    uncached = CredentialService(key_path=key_path, ttl=0, cache_dir=None)
+    uncached.decrypt(token)
+    uncached.decrypt(token)
+    assert uncached.stats == {'decrypted': 2, 'cache_hits': 0}
+
+
+def test_undecryptable_secret_raises(tmp_path, key_path):
+    other_key = tmp_path / 'other.key'
+    other_key.write_bytes(Fernet.generate_key())
+    service = CredentialService(key_path=key_path, cache_dir=None)
+    with pytest.raises(RuntimeError, match='Failed to decrypt password'):
+        service.decrypt(encrypt(str(other_key), 'admin'))
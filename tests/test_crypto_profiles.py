@@ -0,0 +1,90 @@
+import paramiko
+import pytest
+
+from simplenet.cli import crypto_profiles
+from simplenet.cli.crypto_profiles import CRYPTO_PROFILES, connect_kwargs, unavailable_algorithms
+
+IMPLEMENTED = {
+    'kex': paramiko.Transport._kex_info,
+    'ciphers': paramiko.Transport._cipher_info,
+    'macs': paramiko.Transport._mac_info,
+    'keys': paramiko.Transport._key_info,
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_warnings(monkeypatch):
+    monkeypatch.setattr(crypto_profiles, '_warned_profiles', set())
+
+
+@pytest.mark.parametrize('name', sorted(CRYPTO_PROFILES))
+def test_disabled_algorithms_are_everything_outside_the_profile(name):
+    disabled = connect_kwargs(name)['disabled_algorithms']
+    for kind, implemented in IMPLEMENTED.items():
+        enabled = set(implemented) - set(disabled[kind])
+        assert enabled == set(CRYPTO_PROFILES[name][kind]) & set(implemented)
+        assert enabled, kind
+
+
+def test_modern_keeps_host_certificates():
+    disabled = connect_kwargs('modern')['disabled_algorithms']
+    certificates = [key for key in IMPLEMENTED['keys'] if key.endswith('-cert-v01@openssh.com')]
+    assert certificates
+    assert not set(certificates) & set(disabled['keys'])
+    assert 'ssh-rsa' not in CRYPTO_PROFILES['modern']['keys']
+
+
+def test_modern_is_fully_implemented():
+    assert unavailable_algorithms('modern') == {}
+
+
+def test_default_profile_is_compatible():
+    assert connect_kwargs(None)['disabled_algorithms'] == connect_kwargs('compatible')['disabled_algorithms']
+
+
+def test_preference_order_is_set_on_the_transport():
+    kwargs = connect_kwargs('legacy-ios')
+    if 'transport_factory' not in kwargs:
+        pytest.skip('paramiko without transport_factory keeps its own order')
+
+    class FakeSocket:
+        def settimeout(self, timeout):
+            pass
+
+    transport = kwargs['transport_factory'](FakeSocket())
+    try:
+        options = transport.get_security_options()
+        expected = [key for key in CRYPTO_PROFILES['legacy-ios']['keys'] if key in IMPLEMENTED['keys']]
+        assert list(options.key_types) == expected
+    finally:
+        transport.close()
+
+
+def without(monkeypatch, table, *algorithms):
+    implemented = getattr(paramiko.Transport, table)
+    monkeypatch.setattr(paramiko.Transport, table,
+                        {name: value for name, value in implemented.items() if name not in algorithms})
+
+
+def test_missing_algorithms_are_reported_once(monkeypatch, capsys):
+    # paramiko 5 has no SHA-1 key exchange and no ssh-rsa host keys
+    without(monkeypatch, '_kex_info', 'diffie-hellman-group14-sha1', 'diffie-hellman-group-exchange-sha1',
+            'diffie-hellman-group1-sha1')
+    without(monkeypatch, '_key_info', 'ssh-rsa', 'ssh-dss')
+    assert unavailable_algorithms('legacy-ios') == {
+        'kex': ['diffie-hellman-group14-sha1', 'diffie-hellman-group-exchange-sha1', 'diffie-hellman-group1-sha1'],
+        'keys': ['ssh-rsa'],
+    }
+
+    connect_kwargs('legacy-ios')
+    connect_kwargs('legacy-ios')
+    output = capsys.readouterr().out
+    assert output.count("WARNING: crypto profile 'legacy-ios'") == 1
+    assert 'kex diffie-hellman-group14-sha1' in output
+    assert 'keys ssh-rsa' in output
+
+
+def test_profile_without_any_usable_algorithm_is_rejected(monkeypatch):
+    without(monkeypatch, '_kex_info', *CRYPTO_PROFILES['legacy-ios']['kex'])
+    with pytest.raises(ValueError, match="none of its kex algorithms"):
+        connect_kwargs('legacy-ios')
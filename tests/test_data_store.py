@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from simplenet.cli.data_store_broke import DataStoreChange, GlobalDataStoreWrapper
+
+
+@pytest.fixture
+def store():
+    store = GlobalDataStoreWrapper()
+    store.set_current_device('rtr1')
+    return store
+
+
+def connect(store):
+    changes, snapshots = [], []
+    store.signal_data_changed.connect(changes.append)
+    store.signal_global_data_updated.connect(snapshots.append)
+    return changes, snapshots
+
+
+def test_changes_reach_both_signals(store):
+    changes, snapshots = connect(store)
+
+    store.update('rtr1', 'templates/mtu.ttp', 0, [{'mtu': 9000}])
+    store.set_variable('uplinks', ['Gi1'])
+    assert changes == [
+        DataStoreChange('rtr1', 'templates/mtu.ttp', 0, None, [{'mtu': 9000}]),
+        DataStoreChange('rtr1', 'action_variables', None, 'uplinks', ['Gi1']),
+    ]
+
+    assert store.publish_snapshot()
+    assert json.loads(snapshots[-1])['rtr1']['action_variables'] == {'uplinks': ['Gi1']}
+
+
+def test_snapshot_includes_data_changed_in_place(store):
+    changes, snapshots = connect(store)
+
+    # Handlers may write straight into the device's data instead of calling update()
+    store.get_device_data('rtr1')['facts'] = {'version': '17.3'}
+    store.session_store.get_or_create_session('rtr1').data['serial'] = 'S1'
+    assert changes == []
+
+    assert store.publish_snapshot()
+    snapshot = json.loads(snapshots[-1])['rtr1']
+    assert snapshot['facts'] == {'version': '17.3'}
+    assert snapshot['serial'] == 'S1'
+
+    # Repeated actions keep the legacy listener up to date
+    store.get_device_data('rtr1')['serial'] = 'S2'
+    assert store.publish_snapshot()
+    assert json.loads(snapshots[-1])['rtr1']['serial'] == 'S2'
+
+
+def test_nothing_is_emitted_without_listeners(store):
+    store.update('rtr1', 'templates/mtu.ttp', 0, [{'mtu': 9000}])
+    assert not store.publish_snapshot()
+    assert not store.emit_data_updated({'rtr1': {}})
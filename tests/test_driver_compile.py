@@ -0,0 +1,119 @@
+import pytest
+from click.testing import CliRunner
+
+from simplenet.cli import events, runner
+from simplenet.cli.data_store_broke import GlobalDataStoreWrapper
+from simplenet.cli.driver_plan import DriverCompileError, ExecutionContext, compile_driver, execute_plan
+from simplenet.cli.driver_templates import get_driver_template
+from simplenet.cli.journal import RunJournal
+
+ROW = {'hostname': 'rtr1', 'mgmt_ip': '192.0.2.1'}
+
+
+def send_command(**fields):
+    return dict({'action': 'send_command', 'command': 'show version', 'expect': '#'}, **fields)
+
+
+@pytest.mark.parametrize('driver, message', [
+    (None, "Driver 'ios' has no 'actions' list"),
+    ({'error_string': 'Invalid'}, "Driver 'ios' has no 'actions' list"),
+    ({'actions': [{'command': 'show clock'}]}, "drivers.ios.actions[0]: 'action' field is missing"),
+    ({'actions': [{'action': 'send_command'}]}, "missing required field 'command'"),
+    ({'actions': [send_command(output_mode='truncate')]}, "'output_mode' must be one of"),
+    ({'actions': [send_command(timeout='soon')]}, "'timeout' must be a number"),
+    ({'actions': [send_command(store_query={'query': 'interfaces[?'})]}, "invalid JMESPath expression"),
+    ({'actions': [send_command(), send_command(run_if={'check_type': 'jmespath', 'query': 'a[?'})]},
+     "drivers.ios.actions[1] run_if: invalid JMESPath expression"),
+    ({'actions': [{'action': 'audit', 'display_name': 'MTU', 'policy_name': 'mtu',
+                   'pass_if': [{'name': 'jumbo', 'query': 'mtu ==', 'check_type': 'jmespath'}]}]},
+     "pass_if: invalid JMESPath expression"),
+])
+def test_invalid_driver_is_rejected(driver, message):
+    with pytest.raises(DriverCompileError) as error:
+        compile_driver(driver, 'ios')
+    assert message in str(error.value)
+
+
+def test_unknown_actions_are_skipped_with_a_warning(capsys):
+    plan = compile_driver({'actions': [send_command(), {'action': 'custom_reboot'}, send_command()]}, 'ios')
+    assert [step.index for step in plan.steps] == [0, 2]
+    assert "drivers.ios.actions[1]: unknown action type 'custom_reboot', skipping it" in capsys.readouterr().out
+
+
+def test_unknown_actions_are_rejected_when_strict():
+    with pytest.raises(DriverCompileError, match="actions\\[1\\]: unknown action type 'custom_reboot'"):
+        compile_driver({'actions': [send_command(), {'action': 'custom_reboot'}]}, 'ios', strict=True)
+
+
+def test_skipped_device_actions_are_not_reported_as_started(monkeypatch):
+    plan = compile_driver({'actions': [send_command(), {'action': 'sleep', 'seconds': 0}]}, 'ios')
+    store = GlobalDataStoreWrapper()
+    context = ExecutionContext(None, {'hostname': 'rtr1'}, 0, 'rtr1.log', '', '', [0, 5], store)
+    # The device stopped accepting commands, e.g. after its error string appeared
+    context.stop_device_commands = True
+    emitted = []
+    monkeypatch.setattr(events, '_sink', emitted.append)
+
+    execute_plan(plan.steps, context)
+    started = [(event['index'], event['action']) for event in emitted if event['type'] == 'action_started']
+    finished = [event['index'] for event in emitted if event['type'] == 'action_finished']
+    assert started == [(1, 'sleep')]
+    assert finished == [1]
+
+
+def test_templated_values_are_left_to_render_time():
+    plan = compile_driver({'actions': [send_command(timeout='{{ timeout }}',
+                                                    store_query={'query': '{{ query }}'})]}, 'ios')
+    assert len(plan.steps) == 1
+
+
+def write_driver(lab, text):
+    (lab / 'driver.yml').write_text(text)
+    return str(lab / 'driver.yml')
+
+
+def test_validate_driver_renders_for_a_device(lab):
+    driver = write_driver(lab, """
+drivers:
+  ios:
+    actions:
+      - action: send_command
+        command: "show run | include {{ hostname }}"
+        timeout: "{{ wait }}"
+""")
+    (lab / 'vars.yml').write_text("wait: 5\n")
+    assert runner.validate_driver(driver, 'vars.yml', 'ios', ROW) is None
+    # The rendered value is checked, not the raw template
+    (lab / 'vars.yml').write_text("wait: later\n")
+    assert "'timeout' must be a number" in runner.validate_driver(driver, 'vars.yml', 'ios', ROW)
+
+
+def test_validate_driver_skips_drivers_shaped_by_jinja(lab):
+    # The {% for %} block is not YAML until rendered, so the runner leaves it to each device
+    driver = write_driver(lab, """
+drivers:
+  ios:
+    actions:
+{% for command in ['show clock', 'show version'] %}
+      - action: send_command
+        command: "{{ command }}"
+{% endfor %}
+""")
+    assert not get_driver_template(driver).per_value
+    assert runner.validate_driver(driver, None, 'ios', ROW) is None
+
+
+def test_runner_stops_before_any_device_on_an_invalid_driver(lab):
+    write_driver(lab, "drivers:\n  cisco_ios:\n    actions:\n      - action: reboot\n")
+    outcome = CliRunner().invoke(runner.main, [
+        '--inventory', 'inventory.yaml', '--query', 'select * from devices', '--driver', 'driver.yml',
+        '--journal', 'runs.db', '--quiet'])
+    assert outcome.exit_code == runner.EXIT_RUN_ERROR, outcome.output
+    assert "Invalid driver 'cisco_ios' in driver.yml" in outcome.output
+    assert "unknown action type 'reboot'" in outcome.output
+
+    journal = RunJournal('runs.db')
+    try:
+        assert journal.conn.execute("SELECT COUNT(*) FROM run_devices").fetchone()[0] == 0
+    finally:
+        journal.close()
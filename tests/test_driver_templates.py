@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from jinja2 import Template
+from ruamel.yaml import YAML
+
+from simplenet.cli.driver_templates import DriverTemplate, get_driver_template, load_variables
+
+VARIABLES = {'hostname': 'rtr1', 'mgmt_ip': '192.0.2.1', 'uplink': 'Gi0/1', 'mtu': 9000,
+             'vlans': [10, 20], 'audit': {'enabled': True}}
+
+DRIVERS = {
+    'static': """
+drivers:
+  ios:
+    error_string: "Invalid input"
+    actions:
+      - action: send_command
+        command: "show version"
+        expect: "#"
+""",
+    'values': """
+drivers:
+  ios:
+    output_path: "./output/{{ hostname }}.txt"
+    actions:
+      - action: send_command
+        display_name: "Uplink of {{ hostname }}"
+        command: "show interface {{ uplink }}"
+        expect: "#"
+        timeout: 10
+      - action: send_config
+        display_name: MTU
+        config: |
+          interface {{ uplink }}
+           mtu {{ mtu }}
+      - action: send_command
+        command: show clock
+        store_query:
+          query: "[?mtu == `{{ mtu }}`]"
+          variable_name: jumbo_{{ hostname }}
+""",
+    'structure': """
+drivers:
+  ios:
+    actions:
+{% for vlan in vlans %}
+      - action: send_command
+        command: "show vlan id {{ vlan }}"
+{% endfor %}
+{% if audit.enabled %}
+      - action: audit
+        display_name: "audit {{ hostname }}"
+        policy_name: vlans
+        pass_if: []
+{% endif %}
+""",
+    'unquoted': """
+drivers:
+  ios:
+    actions:
+      - action: sleep
+        seconds: {{ mtu }}
+""",
+}
+
+
+def render_whole_file(text, variables):
+    """How drivers were rendered before DriverTemplate: Jinja over the whole file, then YAML."""
+    return YAML(typ='safe').load(Template(text).render(variables))
+
+
+@pytest.mark.parametrize('name', sorted(DRIVERS))
+def test_render_matches_whole_file_rendering(name):
+    driver_template = DriverTemplate(name, DRIVERS[name])
+    for variables in (VARIABLES, dict(VARIABLES, hostname='rtr2', uplink='Te1/1', vlans=[30])):
+        assert driver_template.render(variables) == render_whole_file(DRIVERS[name], variables)
+
+
+@pytest.mark.parametrize('name, per_value', [('static', True), ('values', True), ('structure', False),
+                                             ('unquoted', False)])
+def test_render_mode(name, per_value):
+    assert DriverTemplate(name, DRIVERS[name]).per_value is per_value
+
+
+def test_unchanged_parts_are_shared_between_devices():
+    driver_template = DriverTemplate('values', DRIVERS['values'])
+    first = driver_template.render(VARIABLES)['drivers']['ios']['actions']
+    second = driver_template.render(dict(VARIABLES, hostname='rtr2'))['drivers']['ios']['actions']
+    assert first[0] is not second[0]
+    assert first[2]['command'] == 'show clock'
+
+
+def test_plan_is_compiled_once_for_a_static_driver():
+    driver_template = DriverTemplate('static', DRIVERS['static'])
+    driver_config = driver_template.render(VARIABLES)['drivers']['ios']
+    assert driver_template.plan('ios', driver_config) is driver_template.plan('ios', driver_config)
+
+    driver_template = DriverTemplate('values', DRIVERS['values'])
+    plans = [driver_template.plan('ios', driver_template.render(dict(VARIABLES, hostname=hostname))['drivers']['ios'])
+             for hostname in ('rtr1', 'rtr2')]
+    assert plans[0] is not plans[1]
+
+
+def test_files_are_read_again_when_they_change(tmp_path):
+    driver_file = tmp_path / 'driver.yml'
+    driver_file.write_text(DRIVERS['static'])
+    first = get_driver_template(str(driver_file))
+    assert get_driver_template(str(driver_file)) is first
+
+    driver_file.write_text(DRIVERS['values'])
+    # Make sure the modification time moves even on coarse-grained filesystems
+    stat = os.stat(driver_file)
+    os.utime(driver_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = get_driver_template(str(driver_file))
+    assert second is not first
+    assert second.render(VARIABLES)['drivers']['ios']['output_path'] == './output/rtr1.txt'
+
+    vars_file = tmp_path / 'vars.yml'
+    vars_file.write_text("uplink: Gi0/1\n")
+    assert load_variables(str(vars_file)) == {'uplink': 'Gi0/1'}
+    assert load_variables(None) == {}
@@ -0,0 +1,48 @@
+import os
+import time
+
+import pytest
+
+from simplenet.cli import engine
+
+JOB = {'db_file': 'inventory.db', 'driver': 'driver.yml', 'vars_file': None, 'driver_name': 'cisco_ios',
+       'check_reachability': False, 'quiet': True, 'options': {}}
+
+
+def fake_device_run(row, db_file, driver, vars_file, driver_name, options, local):
+    if row['hostname'] == 'crash':
+        # Stands in for a worker process killed by the OOM killer or a segfault
+        os._exit(9)
+    time.sleep(0.2)
+    return {'hostname': row['hostname'], 'mgmt_ip': row['mgmt_ip'], 'status': 'completed', 'exit_code': 0}
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    # Worker processes are forked, so they inherit the patched device run
+    monkeypatch.setattr(engine, 'run_device_inprocess', fake_device_run)
+    return engine.InProcessEngine(2, 1, JOB)
+
+
+def row(hostname):
+    return {'hostname': hostname, 'mgmt_ip': '192.0.2.1'}
+
+
+def test_results_resolve_futures(fake_engine):
+    with fake_engine:
+        futures = [fake_engine.submit(row(f'rtr{index}')) for index in range(4)]
+        results = [future.result(timeout=30) for future in futures]
+    assert [result['hostname'] for result in results] == ['rtr0', 'rtr1', 'rtr2', 'rtr3']
+
+
+def test_device_fails_when_its_process_dies(fake_engine):
+    fake_engine.start()
+    try:
+        crashed = fake_engine.submit(row('crash'))
+        with pytest.raises(RuntimeError, match='exited with code'):
+            crashed.result(timeout=10)
+
+        # The surviving process keeps serving devices
+        assert fake_engine.submit(row('rtr1')).result(timeout=30)['status'] == 'completed'
+    finally:
+        fake_engine.shutdown()
@@ -0,0 +1,120 @@
+import io
+import json
+import queue
+import threading
+
+import pytest
+
+from simplenet.cli import events
+from simplenet.cli.events import EVENT_PREFIX, ActionTracker, EventAggregator, parse_event_line
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    collected = []
+    monkeypatch.setattr(events, '_sink', collected.append)
+    return collected
+
+
+def test_stream_sink_lines_parse_back(monkeypatch):
+    monkeypatch.setattr(events, '_sink', None)
+    stream = io.StringIO()
+    events.set_stream_sink(stream)
+    events.emit('parsed_records', device='rtr1', records=3, template='ios_cdp.ttp')
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1 and lines[0].startswith(EVENT_PREFIX)
+    event = parse_event_line(lines[0] + '\n')
+    assert {key: event[key] for key in ('type', 'device', 'records', 'template')} == {
+        'type': 'parsed_records', 'device': 'rtr1', 'records': 3, 'template': 'ios_cdp.ttp'}
+
+
+@pytest.mark.parametrize('line', [
+    'Executing command: show version\n',
+    'banner ' + EVENT_PREFIX + '{"type": "failed"}\n',
+    EVENT_PREFIX + '{"type": "failed"\n',
+])
+def test_console_output_is_not_an_event(line):
+    assert parse_event_line(line) is None
+
+
+def test_events_carry_the_thread_device(emitted):
+    def run(hostname):
+        events.set_device(hostname)
+        events.emit('connected')
+
+    threads = [threading.Thread(target=run, args=(hostname,)) for hostname in ('rtr1', 'rtr2')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(event['device'] for event in emitted) == ['rtr1', 'rtr2']
+
+    events.emit('failed', device='rtr3', reason='exception')
+    assert emitted[-1]['device'] == 'rtr3'
+
+
+def test_a_broken_sink_does_not_break_the_run(monkeypatch):
+    def broken(event):
+        raise OSError('pipe closed')
+
+    monkeypatch.setattr(events, '_sink', broken)
+    events.emit('connected', device='rtr1')
+
+
+def test_action_tracker_pairs_start_and_finish(emitted):
+    tracker = ActionTracker()
+    tracker.start(0, 'send_command', 'Version')
+    tracker.start(1, 'audit')
+    tracker.finish()
+    tracker.finish()
+    assert [(event['type'], event['index']) for event in emitted] == [
+        ('action_started', 0), ('action_finished', 0), ('action_started', 1), ('action_finished', 1)]
+    assert all(event['duration'] >= 0 for event in emitted if event['type'] == 'action_finished')
+
+
+def test_aggregator_summarizes_queued_events(tmp_path):
+    class Listener:
+        def __init__(self):
+            self.types = []
+
+        def handle(self, event):
+            self.types.append(event['type'])
+
+    listener = Listener()
+    events_file = tmp_path / 'events.ndjson'
+    event_queue = queue.Queue()
+    aggregator = EventAggregator(str(events_file), listeners=[listener]).start(event_queue)
+    for event in [
+        {'type': 'connected', 'device': 'rtr1'},
+        {'type': 'connected', 'device': 'rtr1'},
+        {'type': 'action_finished', 'device': 'rtr1', 'action': 'send_command', 'duration': 1.0},
+        {'type': 'action_finished', 'device': 'rtr1', 'action': 'send_command', 'duration': 2.0},
+        {'type': 'parsed_records', 'device': 'rtr1', 'records': 4},
+        {'type': 'audit_result', 'device': 'rtr1', 'result': 'pass'},
+        {'type': 'failed', 'device': 'rtr2', 'reason': 'unreachable'},
+    ]:
+        event_queue.put(event)
+    aggregator.stop()
+    aggregator.stop()
+
+    summary = aggregator.summary()
+    assert summary['devices_connected'] == 1
+    assert summary['actions'] == {'send_command': {'count': 2, 'total': 3.0, 'mean': 1.5}}
+    assert summary['parsed_records'] == 4
+    assert summary['audits'] == {'pass': 1}
+    assert summary['failures'] == {'unreachable': 1}
+    assert summary['events']['connected'] == 2
+    assert len(listener.types) == 7
+    written = [json.loads(line) for line in events_file.read_text().splitlines()]
+    assert [event['type'] for event in written] == listener.types
+
+
+@pytest.mark.parametrize('parsed, records', [
+    ([[{'a': 1}, {'a': 2}], [{'a': 3}]], 3),
+    ([[{}]], 0),
+    ({'a': 1}, 1),
+    ('text', 0),
+])
+def test_count_records(parsed, records):
+    assert events.count_records(parsed) == records
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from simplenet.cli import runner
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Count inventory builds and hash computations."""
+    counted = {'build': 0, 'hash': 0}
+    build, fingerprint = runner._build_inventory_db, runner.inventory_fingerprint
+
+    def counting_build(*args):
+        counted['build'] += 1
+        return build(*args)
+
+    def counting_fingerprint(*args):
+        counted['hash'] += 1
+        return fingerprint(*args)
+
+    monkeypatch.setattr(runner, '_build_inventory_db', counting_build)
+    monkeypatch.setattr(runner, 'inventory_fingerprint', counting_fingerprint)
+    return counted
+
+
+def open_db(force_rebuild=False):
+    conn = runner.create_sqlite_db('inventory.yaml', 'inventory.db', force_rebuild=force_rebuild)
+    try:
+        meta = dict(conn.execute('SELECT key, value FROM inventory_meta'))
+        hostnames = [row[0] for row in conn.execute('SELECT hostname FROM devices')]
+    finally:
+        conn.close()
+    return meta, hostnames
+
+
+def move_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_inventory_is_reused_without_hashing(lab, calls):
+    meta, hostnames = open_db()
+    assert hostnames == ['rtr1']
+    assert meta['schema_version'] == runner.INVENTORY_SCHEMA_VERSION
+    assert meta['source_sha256'] == runner.inventory_fingerprint('inventory.yaml')
+    assert meta['source_size'] == str(os.path.getsize('inventory.yaml'))
+    calls.update(build=0, hash=0)
+
+    open_db()
+    assert calls == {'build': 0, 'hash': 0}
+
+
+def test_touched_inventory_is_hashed_but_not_rebuilt(lab, calls):
+    open_db()
+    move_mtime('inventory.yaml')
+    calls.update(build=0, hash=0)
+
+    meta, _ = open_db()
+    assert calls == {'build': 0, 'hash': 1}
+    # The new mtime is recorded, so the next run skips the hash again
+    assert meta['source_mtime'] == str(os.stat('inventory.yaml').st_mtime_ns)
+    open_db()
+    assert calls == {'build': 0, 'hash': 1}
+
+
+def test_changed_inventory_is_rebuilt(lab, calls):
+    open_db()
+    (lab / 'inventory.yaml').write_text((lab / 'inventory.yaml').read_text().replace('rtr1', 'rtr9'))
+    move_mtime('inventory.yaml')
+
+    meta, hostnames = open_db()
+    assert hostnames == ['rtr9']
+    assert calls['build'] == 2
+    assert meta['source_sha256'] == runner.inventory_fingerprint('inventory.yaml')
+
+
+def test_outdated_schema_and_force_rebuild(lab, calls, monkeypatch):
+    open_db()
+    open_db(force_rebuild=True)
+    assert calls['build'] == 2
+
+    monkeypatch.setattr(runner, 'INVENTORY_SCHEMA_VERSION', 'next')
+    meta, _ = open_db()
+    assert calls['build'] == 3
+    assert meta['schema_version'] == 'next'
+
+
+def test_failed_rebuild_keeps_the_previous_database(lab, monkeypatch):
+    open_db()
+    (lab / 'inventory.yaml').write_text((lab / 'inventory.yaml').read_text().replace('rtr1', 'rtr9'))
+    move_mtime('inventory.yaml')
+
+    def interrupted_build(yaml_file, db_file, meta):
+        with open(db_file, 'w') as f:
+            f.write('partial')
+        raise KeyboardInterrupt
+
+    build = runner._build_inventory_db
+    monkeypatch.setattr(runner, '_build_inventory_db', interrupted_build)
+    with pytest.raises(KeyboardInterrupt):
+        runner.create_sqlite_db('inventory.yaml', 'inventory.db')
+    monkeypatch.setattr(runner, '_build_inventory_db', build)
+
+    # The old database is untouched, and the leftover temporary file does not block the next build
+    assert runner._read_inventory_meta('inventory.db')['source_sha256'] != runner.inventory_fingerprint('inventory.yaml')
+    assert os.path.exists('inventory.db.tmp')
+    _, hostnames = open_db()
+    assert hostnames == ['rtr9']
+    assert not os.path.exists('inventory.db.tmp')
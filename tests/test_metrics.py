@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from simplenet.cli import events, metrics
+from simplenet.cli.metrics import BUCKETS, Histogram, MetricsCollector
+
+
+def metric(phase, value, device='rtr1', label=None, kind=None):
+    event = {'type': 'metric', 'device': device, 'phase': phase, 'value': value, 'label': label}
+    if kind:
+        event['kind'] = kind
+    return event
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    for value in (0.003, 0.2, 0.2, 45.0):
+        histogram.add(value)
+
+    summary = histogram.to_dict()
+    assert summary['count'] == 4
+    assert summary['sum'] == pytest.approx(45.403)
+    assert (summary['min'], summary['max']) == (0.003, 45.0)
+    assert summary['buckets']['0.005'] == 1
+    assert summary['buckets']['0.25'] == 3
+    assert summary['buckets']['60.0'] == summary['buckets']['+Inf'] == 4
+    # Quantiles are bucket upper bounds, never above the largest sample
+    assert summary['p50'] == 0.25
+    assert summary['p95'] == 45.0
+
+    histogram.add(1000.0)
+    assert histogram.quantile(1.0) == 1000.0
+    assert histogram.bucket_counts[-1] == 1
+
+
+def test_timed_blocks_emit_metric_events(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(events, '_sink', emitted.append)
+    with metrics.timed('ttp_parse', device='rtr1', label='ios_cdp.ttp'):
+        pass
+    metrics.count('bytes_received', 512, device='rtr1')
+
+    parse, received = emitted
+    assert (parse['type'], parse['phase'], parse['label']) == ('metric', 'ttp_parse', 'ios_cdp.ttp')
+    assert parse['value'] >= 0
+    assert (received['phase'], received['value'], received['kind']) == ('bytes_received', 512, 'counter')
+
+
+@pytest.fixture
+def collector():
+    collector = MetricsCollector()
+    for event in [
+        metric('ssh_connect', 0.4),
+        metric('ssh_connect', 1.6, device='rtr2'),
+        metric('ttp_parse', 0.02, label='ios_cdp.ttp'),
+        metric('bytes_received', 1024, kind='counter'),
+        metric('bytes_received', 2048, device='rtr2', kind='counter'),
+        {'type': 'action_finished', 'device': 'rtr1', 'action': 'send_command', 'duration': 3.0},
+        {'type': 'connected', 'device': 'rtr1'},
+    ]:
+        collector.handle(event)
+    return collector
+
+
+def test_collector_totals(collector, tmp_path):
+    phases = collector.phase_summary()
+    assert sorted(phases) == ['action', 'ssh_connect', 'ttp_parse']
+    assert phases['ssh_connect']['count'] == 2
+
+    path = tmp_path / 'metrics' / 'run.json'
+    collector.write_json(str(path), {'run_id': 'run1'})
+    report = json.loads(path.read_text())
+    assert report['run'] == {'run_id': 'run1'}
+    assert report['counters'] == {'bytes_received': 3072}
+    assert report['phases_by_label']['action']['send_command']['count'] == 1
+    assert report['phases_by_label']['ttp_parse']['ios_cdp.ttp']['sum'] == 0.02
+    assert report['devices']['rtr1'] == {'ssh_connect': 0.4, 'ttp_parse': 0.02, 'bytes_received': 1024, 'action': 3.0}
+    assert report['devices']['rtr2'] == {'ssh_connect': 1.6, 'bytes_received': 2048}
+
+
+def test_prometheus_output(collector, tmp_path):
+    collector.handle(metric('ttp_parse', 0.03, label='say "hi"\\'))
+    path = tmp_path / 'simplenet.prom'
+    collector.write_prometheus(str(path), {'run_id': 'run1', 'devices_failed': 1, 'devices_processed': 2})
+    lines = path.read_text().splitlines()
+    assert not os.path.exists(f'{path}.tmp')
+
+    buckets = [line for line in lines if line.startswith('simplenet_phase_duration_seconds_bucket{phase="ssh_connect",')]
+    assert len(buckets) == len(BUCKETS)
+    assert 'simplenet_phase_duration_seconds_bucket{phase="ssh_connect",le="0.5"} 1' in lines
+    assert 'simplenet_phase_duration_seconds_bucket{phase="ssh_connect",le="+Inf"} 2' in lines
+    assert 'simplenet_phase_duration_seconds_sum{phase="ssh_connect"} 2.000000' in lines
+    assert 'simplenet_phase_duration_seconds_count{phase="action",label="send_command"} 1' in lines
+    assert 'simplenet_phase_duration_seconds_count{phase="ttp_parse",label="say \\"hi\\"\\\\"} 1' in lines
+    assert lines[1] == '# TYPE simplenet_phase_duration_seconds histogram'
+    assert 'simplenet_bytes_received_total 3072' in lines
+    assert 'simplenet_devices_failed 1' in lines
+    assert not any(line.startswith('simplenet_run_id') for line in lines)
+
+    # Every series is a name, optional labels and a number
+    for line in lines:
+        if not line.startswith('#'):
+            float(line.rsplit(' ', 1)[1])
@@ -0,0 +1,53 @@
+import pytest
+
+from simplenet.cli.ssh_utils import ThreadSafeSSHConnection
+
+COMMANDS = ['interface Gi1', 'description uplink', 'mtu 9000', 'no shutdown', 'exit']
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = ThreadSafeSSHConnection('rtr1', scrub_esc=True)
+    sent = []
+
+    def send_command(command, expect, timeout, transport_mode=None):
+        sent.append(command)
+        return f"{command}\nrtr1(config-if)#"
+
+    # Nothing more arrives from the device after the batch lost sync
+    monkeypatch.setattr(conn, '_settle', lambda quiet=0.2: None)
+    monkeypatch.setattr(conn, 'send_command', send_command)
+    conn.resent = sent
+    return conn
+
+
+def test_written_commands_without_echo_are_not_resent(conn):
+    # The first three lines were written; only the first two were echoed before the prompts stopped
+    text = "interface Gi1\nrtr1(config-if)#description uplink\nrtr1(config-if)#"
+    outputs = conn._pipeline_fallback(COMMANDS, [], 3, text, 10, None)
+
+    assert len(outputs) == len(COMMANDS)
+    assert outputs[0].startswith('interface Gi1')
+    assert outputs[1].startswith('description uplink')
+    assert isinstance(outputs[2], RuntimeError)
+    assert 'mtu 9000' in str(outputs[2])
+    # Only the commands that were never written go out again
+    assert conn.resent == ['no shutdown', 'exit']
+    assert outputs[3:] == ["no shutdown\nrtr1(config-if)#", "exit\nrtr1(config-if)#"]
+
+
+def test_outputs_already_split_are_kept(conn):
+    first = "interface Gi1\nrtr1(config-if)#"
+    outputs = conn._pipeline_fallback(COMMANDS, [first], 5, "description uplink\nrtr1(config-if)#", 10, None)
+
+    assert outputs[:2] == [first, "description uplink\nrtr1(config-if)#"]
+    assert all(isinstance(output, RuntimeError) for output in outputs[2:])
+    assert conn.resent == []
+
+
+def test_error_string_stops_the_batch(conn):
+    text = "interface Gi1\n% Invalid input\nrtr1(config)#"
+    outputs = conn._pipeline_fallback(COMMANDS, [], 2, text, 10, '% Invalid')
+
+    assert outputs == [text]
+    assert conn.resent == []
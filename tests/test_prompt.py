@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from simplenet.cli.lib.prompt import PromptCache, compile_prompt, find_prompt, prompt_regex
+from simplenet.cli.simplenet import learn_device_prompt
+
+
+@pytest.mark.parametrize('output, prompt', [
+    ('Welcome\r\n\r\nusa1-rtr-1#', 'usa1-rtr-1#'),
+    ('Last login: today\r\n\x1b[?2004hadmin@web1:~$ ', 'admin@web1:~$'),
+    ('usa1-rtr-1(config-if)#  \r\n', 'usa1-rtr-1(config-if)#'),
+    ('Password expired\r\n', None),
+    ('', None),
+])
+def test_find_prompt(output, prompt):
+    assert find_prompt(output) == prompt
+
+
+@pytest.mark.parametrize('prompt, matches, misses', [
+    ('usa1-rtr-1#', ['usa1-rtr-1#', 'usa1-rtr-1>', 'usa1-rtr-1(config-if)#'],
+     ['usa1-rtr-10#', 'xusa1-rtr-1#', 'usa1-rtr-1#show version']),
+    ('admin@web1:~$', ['admin@web1:~$ ', 'admin@web1:/var/log$', '\x1b[?2004hadmin@web1:~$'], ['admin@web2:~$']),
+])
+def test_prompt_regex(prompt, matches, misses):
+    pattern = compile_prompt(prompt_regex(prompt))
+    for line in matches:
+        assert pattern.search(f"output\r\n{line}"), line
+    for line in misses:
+        assert not pattern.search(f"output\r\n{line}"), line
+
+
+def test_prompt_cache_round_trip(tmp_path):
+    cache = PromptCache(str(tmp_path / 'prompts'))
+    assert cache.get('rtr1') is None
+
+    cache.set('rtr1', prompt_regex('rtr1#'))
+    cache.set('site/rtr 2', prompt_regex('rtr2#'))
+    assert cache.get('rtr1')['pattern'] == prompt_regex('rtr1#')
+    assert cache.get('site/rtr 2')['pattern'] == prompt_regex('rtr2#')
+    # One file per device and no temporary files left behind
+    assert sorted(os.listdir(tmp_path / 'prompts')) == ['rtr1.json', 'site_rtr_2.json']
+
+
+@pytest.mark.parametrize('content', ['{"pattern": ', '["rtr1#"]', '{"updated": 1}'])
+def test_prompt_cache_ignores_unusable_entries(tmp_path, content):
+    (tmp_path / 'rtr1.json').write_text(content)
+    assert PromptCache(str(tmp_path)).get('rtr1') is None
+
+
+class FakeSession:
+    def __init__(self, learned):
+        self.learned = learned
+        self.cached = []
+
+    def learn_prompt(self, cached=None):
+        self.cached.append(cached)
+        return self.learned
+
+
+def test_learn_device_prompt_updates_the_cache(tmp_path):
+    cache_dir = str(tmp_path)
+    learn_device_prompt(FakeSession(prompt_regex('rtr1#')), 'rtr1', cache_dir)
+    session = FakeSession(prompt_regex('rtr1#'))
+    learn_device_prompt(session, 'rtr1', cache_dir)
+    assert session.cached == [prompt_regex('rtr1#')]
+
+    # A prompt that could not be learned leaves the cached one in place
+    learn_device_prompt(FakeSession(None), 'rtr1', cache_dir)
+    assert PromptCache(cache_dir).get('rtr1')['pattern'] == prompt_regex('rtr1#')
@@ -0,0 +1,50 @@
+import jmespath
+import pytest
+
+from simplenet.cli.lib import query_cache
+
+DATA = {'interfaces': [{'name': 'Gi1', 'mtu': 1500}, {'name': 'Gi2', 'mtu': 9000}]}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    query_cache.clear_cache()
+    yield
+    query_cache.clear_cache()
+
+
+@pytest.mark.parametrize('expression', [
+    'interfaces[?mtu > `1500`].name',
+    'interfaces[0]',
+    'length(interfaces)',
+    'missing.key',
+])
+def test_search_matches_jmespath(expression):
+    assert query_cache.search(expression, DATA) == jmespath.search(expression, DATA)
+
+
+def test_each_expression_is_compiled_once():
+    for _ in range(3):
+        query_cache.search('interfaces[].name', DATA)
+    # Surrounding whitespace does not make a new entry
+    assert query_cache.compile_query('  interfaces[].name\n') is query_cache.compile_query('interfaces[].name')
+    stats = query_cache.cache_stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 4
+    assert stats['size'] == 1
+    assert stats['maxsize'] == query_cache.DEFAULT_MAX_EXPRESSIONS
+
+
+def test_invalid_expressions_raise_and_are_not_cached():
+    with pytest.raises(jmespath.exceptions.JMESPathError):
+        query_cache.compile_query('interfaces[?')
+    with pytest.raises(jmespath.exceptions.JMESPathError):
+        query_cache.search('interfaces[?', DATA)
+    assert query_cache.cache_stats()['size'] == 0
+
+
+def test_clear_cache():
+    query_cache.search('interfaces', DATA)
+    query_cache.clear_cache()
+    assert query_cache.cache_stats() == {'hits': 0, 'misses': 0, 'size': 0,
+                                         'maxsize': query_cache.DEFAULT_MAX_EXPRESSIONS}
@@ -0,0 +1,89 @@
+import asyncio
+import socket
+import sqlite3
+
+import pytest
+
+from simplenet.cli import reachability, runner
+from simplenet.cli.reachability import probe_device, scan_devices, write_reachability_table
+
+
+@pytest.fixture
+def listening_port():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def rows(count):
+    return [{'id': index, 'hostname': f'rtr{index}', 'mgmt_ip': '127.0.0.1'} for index in range(1, count + 1)]
+
+
+def test_probe_statuses(listening_port, closed_port, monkeypatch):
+    assert asyncio.run(probe_device('127.0.0.1', listening_port))['status'] == 'open'
+    refused = asyncio.run(probe_device('127.0.0.1', closed_port))
+    assert refused['status'] == 'refused'
+    assert refused['latency_ms'] is not None
+
+    async def never_answers(host, port):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(asyncio, 'open_connection', never_answers)
+    timed_out = asyncio.run(probe_device('192.0.2.1', 22, timeout=0.05))
+    assert timed_out == {'status': 'timeout', 'latency_ms': None, 'error': 'No response within 0.05s'}
+
+
+def test_scan_bounds_probes_in_flight(monkeypatch):
+    in_flight = []
+    peak = []
+
+    async def fake_probe(host, port, timeout):
+        in_flight.append(host)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(host)
+        return {'status': 'open', 'latency_ms': 1.0, 'error': None}
+
+    monkeypatch.setattr(reachability, 'probe_device', fake_probe)
+    results = scan_devices(rows(20), concurrency=4)
+    assert max(peak) == 4
+    assert [result['hostname'] for result in results] == [f'rtr{index}' for index in range(1, 21)]
+    assert scan_devices([]) == []
+
+
+def test_results_table_is_replaced_on_each_scan(listening_port, closed_port):
+    conn = sqlite3.connect(':memory:')
+    devices = rows(2)
+    write_reachability_table(conn, scan_devices(devices, port=listening_port))
+    write_reachability_table(conn, scan_devices(devices[:1], port=closed_port))
+
+    table = conn.execute('SELECT device_id, hostname, port, status FROM reachability').fetchall()
+    assert table == [(1, 'rtr1', closed_port, 'refused')]
+
+
+def test_prescan_splits_reachable_devices(monkeypatch):
+    statuses = {'rtr1': 'open', 'rtr2': 'refused', 'rtr3': 'timeout', 'rtr4': 'error'}
+
+    def fake_scan(rows, timeout, concurrency):
+        return [{'device_id': row['id'], 'hostname': row['hostname'], 'mgmt_ip': row['mgmt_ip'], 'port': 22,
+                 'status': statuses[row['hostname']], 'latency_ms': 1.0 if statuses[row['hostname']] == 'open' else None,
+                 'error': None, 'checked_at': 'now'} for row in rows]
+
+    monkeypatch.setattr(runner, 'scan_devices', fake_scan)
+    conn = sqlite3.connect(':memory:')
+    live, unreachable = runner.prescan_devices(conn, rows(4), 1.0, 10)
+    assert [row['hostname'] for row in live] == ['rtr1']
+    assert [(result['hostname'], result['status'], result['error_type']) for result in unreachable] == [
+        ('rtr2', 'unreachable', 'refused'), ('rtr3', 'unreachable', 'timeout'), ('rtr4', 'unreachable', 'other')]
+    assert conn.execute('SELECT COUNT(*) FROM reachability').fetchone()[0] == 4
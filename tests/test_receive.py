@@ -0,0 +1,83 @@
+import pytest
+
+from simplenet.cli.lib.receive import ReceiveBuffer
+
+PROMPT = 'Routeur-Zürich#'
+
+
+class FakeChannel:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv(self, size):
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+def split_inside(text, character):
+    """Encode text and split the bytes in the middle of the given multibyte character."""
+    data = text.encode('utf-8')
+    cut = data.index(character.encode('utf-8')) + 1
+    return data[:cut], data[cut:]
+
+
+def test_character_split_across_chunks_is_decoded_once_complete():
+    first, second = split_inside('show clock\r\n' + PROMPT, 'ü')
+    receiver = ReceiveBuffer()
+    text = receiver.feed(first)
+    assert text == 'show clock\r\nRouteur-Z'
+    assert PROMPT not in receiver.tail(len(text) + len(PROMPT))
+
+    text = receiver.feed(second)
+    assert text == 'ürich#'
+    assert PROMPT in receiver.tail(len(text) + len(PROMPT))
+    assert receiver.finish() == 'show clock\r\n' + PROMPT
+    assert receiver.bytes_received == len(first) + len(second)
+
+
+def test_a_chunk_holding_only_part_of_a_character_decodes_to_nothing():
+    data = '€'.encode('utf-8')
+    receiver = ReceiveBuffer()
+    assert receiver.feed(data[:1]) == ''
+    assert receiver.feed(data[1:2]) == ''
+    assert len(receiver) == 0
+    assert receiver.feed(data[2:]) == '€'
+    assert receiver.tail(1) == '€'
+
+
+def test_tail_spans_chunks_without_joining():
+    receiver = ReceiveBuffer()
+    for text in ('interface Gi1\r\n', ' mtu 9000\r\n', PROMPT):
+        receiver.feed(text.encode('utf-8'))
+    assert receiver.tail(len(PROMPT) + 3) == '0\r\n' + PROMPT
+    assert receiver.tail(0) == ''
+    assert receiver.tail(1000) == receiver.getvalue()
+
+
+def test_incomplete_character_at_the_end_follows_the_error_policy():
+    first, _ = split_inside(PROMPT, 'ü')
+    assert ReceiveBuffer().feed(first) == 'Routeur-Z'
+    receiver = ReceiveBuffer()
+    receiver.feed(first)
+    assert receiver.finish() == 'Routeur-Z�'
+
+    receiver = ReceiveBuffer(errors='strict')
+    receiver.feed(first)
+    with pytest.raises(UnicodeDecodeError):
+        receiver.finish()
+
+
+def test_recv_reads_the_channel_until_it_closes():
+    first, second = split_inside(PROMPT, 'ü')
+    receiver = ReceiveBuffer(recv_size=8)
+    channel = FakeChannel([first, second])
+    assert receiver.recv(channel) + receiver.recv(channel) == PROMPT
+    with pytest.raises(EOFError):
+        receiver.recv(channel)
+
+
+def test_reset_keeps_the_byte_count():
+    receiver = ReceiveBuffer()
+    receiver.feed(PROMPT.encode('utf-8')[:10])
+    receiver.reset()
+    assert receiver.getvalue() == ''
+    assert receiver.bytes_received == 10
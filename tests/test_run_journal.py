@@ -0,0 +1,139 @@
+import pytest
+from click.testing import CliRunner
+
+from simplenet.cli import runner
+from simplenet.cli.journal import RunJournal
+
+
+def device_rows(*hostnames):
+    return [{'id': index, 'hostname': hostname, 'mgmt_ip': f'192.0.2.{index}'}
+            for index, hostname in enumerate(hostnames, 1)]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    run_journal = RunJournal(str(tmp_path / 'runs.db'))
+    yield run_journal
+    run_journal.close()
+
+
+def test_only_completed_devices_are_skipped_on_resume(journal):
+    journal.start_run('run1', 'inv.yaml', 'select', 'driver.yml', 'cisco_ios', './output',
+                      device_rows('a', 'b', 'c', 'd'))
+    journal.record_result('run1', {'hostname': 'a', 'status': 'completed', 'exit_code': 0})
+    journal.record_result('run1', {'hostname': 'b', 'status': 'failed', 'exit_code': 1})
+    journal.record_result('run1', {'hostname': 'c', 'status': 'unreachable', 'exit_code': None})
+
+    assert journal.completed_hostnames('run1') == {'a'}
+    assert journal.status_counts('run1') == {'completed': 1, 'failed': 1, 'unreachable': 1, 'pending': 1}
+
+
+def test_restarting_a_run_keeps_device_statuses(journal):
+    rows = device_rows('a', 'b')
+    journal.start_run('run1', 'inv.yaml', 'select', 'driver.yml', 'cisco_ios', './output', rows)
+    journal.record_result('run1', {'hostname': 'a', 'status': 'completed', 'exit_code': 0})
+
+    journal.start_run('run1', 'inv.yaml', 'select', 'driver.yml', 'cisco_ios', './output', rows)
+
+    assert journal.completed_hostnames('run1') == {'a'}
+
+
+def test_each_dispatch_counts_an_attempt(journal):
+    journal.start_run('run1', 'inv.yaml', 'select', 'driver.yml', 'cisco_ios', './output', device_rows('a'))
+    journal.mark_running('run1', 'a')
+    journal.record_result('run1', {'hostname': 'a', 'status': 'failed', 'exit_code': 1})
+    journal.mark_running('run1', 'a')
+
+    row = journal.conn.execute("SELECT status, attempts FROM run_devices WHERE hostname = 'a'").fetchone()
+    assert (row['status'], row['attempts']) == ('running', 2)
+
+
+def test_expected_duration_is_smoothed(journal):
+    journal.record_duration('a', 'cisco_ios', 10.0)
+    journal.record_duration('a', 'cisco_ios', 20.0)
+
+    assert journal.expected_durations('cisco_ios') == {'a': pytest.approx(13.0)}
+    assert journal.expected_durations('other') == {}
+
+
+def test_failing_device_is_journaled_as_failed(lab):
+    conn = runner.create_sqlite_db('inventory.yaml', 'inventory.db')
+    row = runner.fetch_device_rows(conn.cursor(), 'select * from devices')[0]
+    conn.close()
+
+    # rtr1 has no credentials, so the device run fails before any connection is attempted
+    result = runner.run_for_device(row, 'inventory.db', 'driver.yml', None, 'cisco_ios', 1, '#', 1, 0,
+                                   False, False, False, './output', 'select * from devices',
+                                   check_reachability=False, echo_output=False)
+    assert result['status'] == 'failed'
+    assert result['exit_code'] == 1
+
+    journal = RunJournal('runs.db')
+    try:
+        journal.start_run('run1', 'inventory.yaml', 'select', 'driver.yml', 'cisco_ios', './output', [row])
+        journal.mark_running('run1', row['hostname'])
+        journal.record_result('run1', result)
+        assert journal.status_counts('run1') == {'failed': 1}
+        assert journal.completed_hostnames('run1') == set()
+    finally:
+        journal.close()
+
+
+def test_runner_retries_a_failing_device(lab, monkeypatch):
+    monkeypatch.setattr(runner, 'probe_ssh_port', lambda mgmt_ip, timeout=10: None)
+    outcome = CliRunner().invoke(runner.main, [
+        '--inventory', 'inventory.yaml', '--query', 'select * from devices', '--driver', 'driver.yml',
+        '--timeout', '1', '--num-processes', '1', '--journal', 'runs.db', '--retries', '1',
+        '--retry-backoff', '0', '--quiet', '--no-learn-prompt'])
+    assert outcome.exit_code == runner.EXIT_DEVICES_FAILED, outcome.output
+
+    journal = RunJournal('runs.db')
+    try:
+        row = journal.conn.execute("SELECT status, exit_code, attempts FROM run_devices WHERE hostname = 'rtr1'").fetchone()
+    finally:
+        journal.close()
+    assert (row['status'], row['exit_code'], row['attempts']) == ('failed', 1, 2)
+
+
+def test_mismatched_settings(journal):
+    journal.start_run('run1', 'inv.yaml', 'select 1', 'driver.yml', 'cisco_ios', './output', device_rows('a'))
+    assert journal.mismatched_settings('run1', query='select 1', driver='driver.yml', driver_name='cisco_ios') == {}
+    assert journal.mismatched_settings('run1', query='select 2', driver_name='cisco_ios') == {
+        'query': ('select 1', 'select 2')}
+
+
+def run_runner(*options):
+    return CliRunner().invoke(runner.main, [
+        '--inventory', 'inventory.yaml', '--driver', 'driver.yml', '--timeout', '1', '--num-processes', '1',
+        '--journal', 'runs.db', '--quiet', '--no-learn-prompt', *options])
+
+
+def test_runner_exit_status(lab, monkeypatch):
+    monkeypatch.setattr(runner, 'probe_ssh_port', lambda mgmt_ip, timeout=10: 'refused')
+    outcome = run_runner('--query', 'select * from devices')
+    assert outcome.exit_code == runner.EXIT_DEVICES_FAILED, outcome.output
+
+    # A query matching no device leaves nothing failed
+    assert run_runner('--query', "select * from devices where hostname = 'none'").exit_code == 0
+
+    outcome = run_runner('--query', 'select * from devices', '--resume', 'no-such-run')
+    assert outcome.exit_code == runner.EXIT_RUN_ERROR
+    assert 'Run id no-such-run not found' in outcome.output
+
+
+def test_resume_refuses_other_settings(lab, monkeypatch):
+    monkeypatch.setattr(runner, 'probe_ssh_port', lambda mgmt_ip, timeout=10: 'refused')
+    journal = RunJournal('runs.db')
+    try:
+        journal.start_run('run1', 'inventory.yaml', 'select * from devices', 'driver.yml', 'cisco_ios', './output',
+                          device_rows('rtr1'))
+    finally:
+        journal.close()
+
+    outcome = run_runner('--query', "select * from devices where hostname = 'rtr1'", '--resume', 'run1')
+    assert outcome.exit_code == runner.EXIT_RUN_ERROR
+    assert "it ran with query 'select * from devices'" in outcome.output
+
+    outcome = run_runner('--query', 'select * from devices', '--resume', 'run1')
+    assert outcome.exit_code == runner.EXIT_DEVICES_FAILED, outcome.output
+    assert 'Resuming run run1' in outcome.output
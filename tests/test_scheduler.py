@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import Future
+
+from simplenet.cli.scheduler import DeviceScheduler, dispatch, load_resource_limits, plan_deadline
+
+
+def device(hostname, site_id=1, role_id=1):
+    return {'hostname': hostname, 'site_id': site_id, 'role_id': role_id}
+
+
+def drain(scheduler):
+    """Hand out devices until none may start, without releasing any."""
+    rows = []
+    while True:
+        row = scheduler.next_device()
+        if row is None:
+            return rows
+        rows.append(row)
+
+
+def hostnames(rows):
+    return [row['hostname'] for row in rows]
+
+
+def test_sites_take_turns():
+    rows = [device('a1', 1), device('a2', 1), device('a3', 1), device('b1', 2), device('c1', 3)]
+    scheduler = DeviceScheduler(rows)
+    assert hostnames(drain(scheduler)) == ['a1', 'b1', 'c1', 'a2', 'a3']
+    assert scheduler.pending() == 0
+
+
+def test_site_and_role_limits():
+    rows = [device('a1', 1, 1), device('a2', 1, 2), device('a3', 1, 2), device('b1', 2, 2)]
+    scheduler = DeviceScheduler(rows, site_limit=2, role_limit=2)
+    started = drain(scheduler)
+    # a3 is held back by role 2 (a2, b1), not by its site
+    assert hostnames(started) == ['a1', 'b1', 'a2']
+    assert scheduler.pending() == 1
+
+    scheduler.release(started[0])
+    assert scheduler.next_device() is None
+    scheduler.release(started[1])
+    assert scheduler.next_device()['hostname'] == 'a3'
+
+
+def test_blocked_head_does_not_stall_the_site():
+    rows = [device('core1', 1, 1), device('core2', 1, 1), device('access1', 1, 2)]
+    scheduler = DeviceScheduler(rows, role_limit=1)
+    assert hostnames(drain(scheduler)) == ['core1', 'access1']
+
+
+def test_resource_limits(tmp_path):
+    resource_file = tmp_path / 'resources.yml'
+    resource_file.write_text("resources:\n  tacacs-east:\n    limit: 1\n    sites: [1]\n    roles: [3]\n")
+    resources = load_resource_limits(str(resource_file))
+    assert resources == {'tacacs-east': {'limit': 1, 'sites': {1}, 'roles': {3}}}
+
+    rows = [device('a1', 1), device('a2', 1), device('b1', 2, 3), device('b2', 2)]
+    scheduler = DeviceScheduler(rows, resources=resources)
+    started = drain(scheduler)
+    assert hostnames(started) == ['a1', 'b2']
+
+    # Site 1 is next in turn; b1 then waits for the resource a2 holds
+    scheduler.release(started[0])
+    assert scheduler.next_device()['hostname'] == 'a2'
+    assert scheduler.next_device() is None
+    scheduler.release(started[1])
+    assert scheduler.next_device() is None
+    assert load_resource_limits(None) == {}
+
+
+def test_priority_orders_across_sites():
+    rows = [device('a1', 1), device('a2', 1), device('b1', 2)]
+    weights = {'a1': 1, 'a2': 5, 'b1': 3}
+    scheduler = DeviceScheduler(rows, site_limit=1, priority=lambda row: weights[row['hostname']])
+    started = drain(scheduler)
+    assert hostnames(started) == ['a2', 'b1']
+
+    scheduler.release(started[0])
+    assert scheduler.next_device()['hostname'] == 'a1'
+
+
+def test_remaining_empties_the_queue():
+    scheduler = DeviceScheduler([device('a1', 1), device('b1', 2)])
+    scheduler.next_device()
+    assert hostnames(scheduler.remaining()) == ['b1']
+    assert scheduler.pending() == 0
+    assert scheduler.next_device() is None
+
+
+def longest_first(expected):
+    return lambda row: expected.get(row['hostname'], 0)
+
+
+def test_plan_deadline_packs_longest_first():
+    rows = [device(name) for name in ('a', 'b', 'c', 'd', 'e')]
+    expected = {'a': 50, 'b': 40, 'c': 30, 'd': 20, 'e': 10}
+    planned, deferred, makespan = plan_deadline(rows, expected, 2, 60, longest_first(expected))
+    # a and b fill both lanes first; c would end at 70, while d and e still fit
+    assert hostnames(planned) == ['a', 'b', 'd', 'e']
+    assert hostnames(deferred) == ['c']
+    assert makespan == 60
+
+
+def test_plan_deadline_places_priority_devices_first():
+    rows = [device(name) for name in ('core', 'edge1', 'edge2')]
+    expected = {'core': 30, 'edge1': 40, 'edge2': 40}
+    planned, deferred, makespan = plan_deadline(
+        rows, expected, 1, 75, lambda row: (row['hostname'] == 'core', expected[row['hostname']]))
+    assert hostnames(planned) == ['core', 'edge1']
+    assert hostnames(deferred) == ['edge2']
+    assert makespan == 70
+
+
+def test_plan_deadline_without_history():
+    rows = [device('a'), device('b')]
+    planned, deferred, makespan = plan_deadline(rows, {}, 0, 10, longest_first({}))
+    assert hostnames(planned) == ['a', 'b']
+    assert deferred == []
+    assert makespan == 0
+
+
+def finished_future(row):
+    future = Future()
+    future.set_result(row['hostname'])
+    return future
+
+
+def test_dispatch_stops_starting_devices_after_the_deadline():
+    scheduler = DeviceScheduler([device('a'), device('b')])
+    completed = []
+    dispatch(scheduler, finished_future, 2, lambda row, future: completed.append(future.result()),
+             deadline=time.monotonic() - 1)
+    assert completed == []
+    assert scheduler.pending() == 2
+
+    dispatch(scheduler, finished_future, lambda: 1, lambda row, future: completed.append(future.result()))
+    assert completed == ['a', 'b']
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+from simplenet.cli import ssh_pool
+
+
+class FakeConnection:
+    """Stands in for ThreadSafeSSHConnection; records what the pool does with it."""
+
+    def __init__(self, hostname, **kwargs):
+        self.hostname = hostname
+        self.kwargs = kwargs
+        self.meta = {}
+        self.alive = True
+        self.disconnected = False
+        self.on_probe = None
+        self.on_disconnect = None
+
+    def connect(self, username, password, port=22):
+        pass
+
+    def set_displayname(self, name):
+        pass
+
+    def set_keepalive(self, interval):
+        pass
+
+    def set_meta_data(self, key, value):
+        self.meta[key] = value
+
+    def get_meta_data(self, key):
+        return self.meta.get(key)
+
+    def reset_session(self):
+        pass
+
+    def is_alive(self, probe=False):
+        if probe and self.on_probe:
+            self.on_probe()
+        return self.alive
+
+    def disconnect(self):
+        if self.on_disconnect:
+            self.on_disconnect()
+        self.disconnected = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ssh_pool, 'ThreadSafeSSHConnection', FakeConnection)
+    return ssh_pool.SSHConnectionPool(max_size=4, max_per_host=2, keepalive=0, acquire_timeout=1)
+
+
+def lock_is_free(pool):
+    """Whether another thread can take the pool lock right now."""
+    taken = []
+
+    def try_lock():
+        if pool._cond.acquire(timeout=1):
+            taken.append(True)
+            pool._cond.release()
+
+    thread = threading.Thread(target=try_lock)
+    thread.start()
+    thread.join()
+    return bool(taken)
+
+
+def test_idle_session_is_reused(pool):
+    conn = pool.acquire('10.0.0.1', 'admin', 'secret', crypto_profile='modern')
+    pool.release(conn)
+    assert pool.acquire('10.0.0.1', 'admin', 'secret', crypto_profile='modern') is conn
+    assert pool.summary()['hits'] == 1
+
+
+def test_session_with_other_connection_settings_is_not_reused(pool):
+    conn = pool.acquire('10.0.0.1', 'admin', 'secret', crypto_profile='modern', transcript_file='a.gz')
+    pool.release(conn)
+
+    other = pool.acquire('10.0.0.1', 'admin', 'secret', crypto_profile='legacy', transcript_file='a.gz')
+    assert other is not conn
+    assert other.kwargs['crypto_profile'] == 'legacy'
+    pool.release(other)
+
+    other = pool.acquire('10.0.0.1', 'admin', 'secret', crypto_profile='modern', transcript_file='b.gz')
+    assert other is not conn
+    # The host is at max_per_host, so an idle session with other settings was closed to make room
+    assert conn.disconnected
+
+
+def test_probe_and_close_run_outside_the_lock(pool):
+    conn = pool.acquire('10.0.0.1', 'admin', 'secret')
+    pool.release(conn)
+
+    seen = {}
+    conn.alive = False
+    conn.on_probe = lambda: seen.setdefault('probe', lock_is_free(pool))
+    conn.on_disconnect = lambda: seen.setdefault('disconnect', lock_is_free(pool))
+
+    fresh = pool.acquire('10.0.0.1', 'admin', 'secret')
+    assert fresh is not conn
+    assert conn.disconnected
+    assert seen == {'probe': True, 'disconnect': True}
+    summary = pool.summary()
+    assert summary['unhealthy'] == 1
+    assert summary['leased'] == 1
+    assert summary['hits'] == 0
+
+
+def test_close_all_disconnects_outside_the_lock(pool):
+    conn = pool.acquire('10.0.0.1', 'admin', 'secret')
+    pool.release(conn)
+    seen = []
+    conn.on_disconnect = lambda: seen.append(lock_is_free(pool))
+
+    pool.close_all()
+    assert seen == [True]
+    with pytest.raises(RuntimeError):
+        pool.acquire('10.0.0.1', 'admin', 'secret')
+
+
+def test_failed_connect_disconnects_and_frees_the_slot(pool, monkeypatch):
+    created = []
+
+    class FailingConnection(FakeConnection):
+        def connect(self, username, password, port=22):
+            created.append(self)
+            raise OSError('Connection reset by peer')
+
+    monkeypatch.setattr(ssh_pool, 'ThreadSafeSSHConnection', FailingConnection)
+    for _ in range(3):
+        with pytest.raises(OSError):
+            pool.acquire('10.0.0.1', 'admin', 'secret')
+    assert [conn.disconnected for conn in created] == [True, True, True]
+    # max_per_host is 2, so a leaked slot would make the third attempt time out instead
+    assert pool.summary()['leased'] == 0
@@ -0,0 +1,305 @@
+import re
+import socket
+import threading
+import time
+
+import pytest
+
+from simplenet.cli.lib.prompt import prompt_regex
+from simplenet.cli.ssh_utils import ThreadSafeSSHConnection
+
+
+class FakeChannel:
+    """Stands in for a paramiko shell channel: recv() hands out the scripted chunks, then times out."""
+
+    def __init__(self, chunks=(), on_send=None):
+        self.chunks = []
+        self.sent = []
+        self.on_send = on_send
+        self.queue(chunks)
+
+    def queue(self, chunks):
+        self.chunks.extend(chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in chunks)
+
+    def recv(self, size):
+        if not self.chunks:
+            raise socket.timeout('timed out')
+        return self.chunks.pop(0)
+
+    def recv_ready(self):
+        return bool(self.chunks)
+
+    def send(self, data):
+        self.sent.append(data)
+        if self.on_send:
+            self.queue(self.on_send(data))
+        return len(data)
+
+    def settimeout(self, timeout):
+        pass
+
+    def get_id(self):
+        return id(self)
+
+    def close(self):
+        self.closed = True
+
+
+def connection(chunks=(), on_send=None, **kwargs):
+    conn = ThreadSafeSSHConnection('rtr1', **kwargs)
+    conn._channel = FakeChannel(chunks, on_send)
+    return conn
+
+
+def test_prompt_split_across_chunks():
+    conn = connection(['show clock\r\n*10:00:00 UTC\r\nrt', 'r1#'])
+    assert conn._read_until('rtr1#', 1, 1) == 'show clock\r\n*10:00:00 UTC\r\nrtr1#'
+    assert conn.last_match_offset == len('show clock\r\n*10:00:00 UTC\r\nrtr1#')
+    assert conn.retrieve_buffer().endswith('rtr1#')
+
+
+def test_occurrences_count_distinct_matches():
+    # The second chunk brings no prompt, so rescanning the overlap must not count the first one again
+    chunks = ['rtr1#', '\r\nconfigure terminal\r\n', 'rtr1#']
+    conn = connection(chunks)
+    assert conn._read_until('rtr1#', 1, 2) == ''.join(chunks)
+    assert conn.channel.chunks == []
+
+    # Two prompts arriving in one chunk count twice
+    conn = connection(['rtr1#\r\nrtr1#', 'late output'])
+    assert conn._read_until('rtr1#', 1, 2) == 'rtr1#\r\nrtr1#'
+    assert conn.channel.chunks == [b'late output']
+
+
+def test_anchored_pattern_only_matches_at_a_line_start():
+    # With an 8 character match window the second chunk's scan window starts at 'rtr1#', mid-line
+    pattern = re.compile(r'^rtr1#\s*$', re.MULTILINE)
+    chunks = ['echo xx rtr1#     ', ' ', '\r\nrtr1#']
+    conn = connection(chunks, match_window=8)
+    assert conn._read_until(pattern, 1, 1) == ''.join(chunks)
+    assert conn.last_match_offset == len(''.join(chunks))
+
+
+def test_anchored_pattern_matches_a_prompt_at_the_window_start():
+    pattern = re.compile(r'^rtr1#\s*$', re.MULTILINE)
+    chunks = ['x' * 50 + '\r\n', 'rtr1#']
+    conn = connection(chunks, match_window=8)
+    assert conn._read_until(pattern, 1, 1) == ''.join(chunks)
+
+
+def test_timeout_keeps_the_partial_output():
+    conn = connection(['show running-config\r\n', 'interface Gi1\r\n'])
+    with pytest.raises(TimeoutError, match="after 0 occurrences"):
+        conn._read_until('rtr1#', 1, 1)
+    assert conn._accumulation_buffer.getvalue() == 'show running-config\r\ninterface Gi1\r\n'
+    assert conn.retrieve_buffer() == 'show running-config\r\ninterface Gi1\r\n'
+    assert conn.last_match_offset is None
+
+
+def ios_shell(prompt='rtr1#'):
+    """Replies like an IOS shell: a bare newline gives a fresh prompt, a command its echo and output."""
+    def reply(data):
+        command = data.rstrip('\n')
+        if not command:
+            return ['\r\n' + prompt]
+        return [f"{command}\r\n*10:00:00 UTC\r\n", prompt]
+    return reply
+
+
+def test_learn_prompt_from_the_login_banner():
+    conn = connection(['Welcome to rtr1\r\n', 'rtr1#'], ios_shell(), prompt_failure=False)
+    assert conn.learn_prompt(timeout=1) == prompt_regex('rtr1#')
+    assert conn.channel.sent == ['\n']
+
+    # The learned prompt ends the command; the action's expect string is not used
+    assert conn.send_command('show clock', '#', timeout=1) == 'show clock\r\n*10:00:00 UTC\r\nrtr1#'
+    assert conn.channel.chunks == []
+
+
+def test_learn_prompt_uses_a_cached_pattern():
+    conn = connection(['rtr1#'], ios_shell())
+    assert conn.learn_prompt(cached=prompt_regex('rtr1#'), timeout=1) == prompt_regex('rtr1#')
+    assert conn.channel.sent == []
+
+
+def test_learn_prompt_relearns_when_the_cached_pattern_is_stale():
+    conn = connection(['rtr1-new#'], ios_shell('rtr1-new#'))
+    assert conn.learn_prompt(cached=prompt_regex('rtr1#'), timeout=1) == prompt_regex('rtr1-new#')
+    assert conn.prompt_pattern.pattern == prompt_regex('rtr1-new#')
+
+
+def test_learn_prompt_gives_up_without_a_prompt():
+    conn = connection(['Password expired\r\n'])
+    assert conn.learn_prompt(timeout=1) is None
+    assert conn.prompt_pattern is None
+
+
+def sentinel_reply(reply):
+    """Split what send_command() typed into the command, the sentinel line and its marker."""
+    def on_send(data):
+        command, sentinel, _ = data.split('\n')
+        return reply(command, sentinel, sentinel.split()[-1])
+    return on_send
+
+
+def test_sentinel_on_a_shell_that_echoes_typed_ahead_input_early():
+    # A Linux pty echoes the sentinel as soon as it arrives, before the command's output
+    def reply(command, sentinel, marker):
+        return [f"{command}\r\n{sentinel}\r\n", "Linux web1 6.1.0\r\n",
+                f"admin@web1:~$ {sentinel}\r\n{marker}\r\n", "admin@web1:~$ "]
+
+    conn = connection(on_send=sentinel_reply(reply), sentinel='echo {marker}', prompt_failure=False)
+    conn.set_prompt_pattern(prompt_regex('admin@web1:~$'))
+    assert conn.send_command('uname -a', None, timeout=1) == 'uname -a\r\nLinux web1 6.1.0\r\n'
+    # The sentinel's response and the prompt after it are consumed
+    assert conn.channel.chunks == []
+    assert conn.last_match_offset == len('uname -a\r\nLinux web1 6.1.0\r\n')
+
+
+def test_sentinel_without_a_learned_prompt():
+    # Output lines that look like the prompt do not end the command
+    def reply(command, sentinel, marker):
+        return [f"{command}\r\nrtr1#\r\nGi1 up\r\nrtr1#", f"{sentinel}\r\nrtr1#"]
+
+    conn = connection(on_send=sentinel_reply(reply), sentinel='! {marker}', prompt_failure=False)
+    assert conn.send_command('show banner motd', None, timeout=1) == 'show banner motd\r\nrtr1#\r\nGi1 up\r\n'
+    assert conn.channel.sent[0].startswith('show banner motd\n! SIMPLENET-')
+
+
+def test_sentinel_must_have_a_marker_placeholder():
+    with pytest.raises(ValueError, match='placeholder'):
+        ThreadSafeSSHConnection('rtr1', sentinel='! end')
+
+
+def show_shell(delays=None, fail=()):
+    """Replies to 'show <x>' with '<x> output' after delays.get(command) seconds, prompt 'rtr1#'."""
+    def reply(data):
+        command = data.rstrip('\n')
+        if command in fail:
+            return [f"{command}\r\n% Invalid input detected\r\n"]  # never returns the prompt
+        time.sleep((delays or {}).get(command, 0))
+        return [f"{command}\r\n{command.split()[-1]} output\r\n", 'rtr1#']
+    return reply
+
+
+def parallel_connection(monkeypatch, extra_shells, **reply_options):
+    """A connection whose transport opens up to extra_shells additional shells."""
+    conn = connection(on_send=show_shell(**reply_options))
+    opened = []
+    threads = set()
+
+    def open_channel(kind='shell', **kwargs):
+        if len(opened) >= extra_shells:
+            raise RuntimeError('ChannelException(1, Administratively prohibited)')
+        channel = FakeChannel(['rtr1#'], show_shell(**reply_options))
+        original = channel.send
+        channel.send = lambda data: threads.add(threading.get_ident()) or original(data)
+        opened.append(channel)
+        return channel
+
+    monkeypatch.setattr(conn, 'open_channel', open_channel)
+    return conn, opened, threads
+
+
+def test_parallel_outputs_keep_command_order(monkeypatch):
+    conn, opened, threads = parallel_connection(monkeypatch, 3, delays={'show a': 0.3, 'show b': 0.1})
+    commands = ['show a', 'show b', 'show c', 'show d', 'show e', 'show f']
+    outputs = conn.send_commands_parallel(commands, 'rtr1#', timeout=2, channels=4,
+                                          setup_commands=['terminal length 0'])
+    assert outputs == [f"{command}\r\n{command[-1]} output\r\nrtr1#" for command in commands]
+    assert len(opened) == 3 and all(channel.closed for channel in opened)
+    assert all(channel.sent[0] == 'terminal length 0\n' for channel in opened)
+    assert len(threads) > 1
+
+    # Every output reaches the transcript; the extra shells' output follows in command order
+    transcript = conn.retrieve_buffer()
+    assert all(output in transcript for output in outputs)
+    side = [transcript.index(command) for command in commands
+            if any(command + '\n' in channel.sent for channel in opened)]
+    assert side and side == sorted(side)
+
+
+def test_parallel_runs_on_the_primary_shell_when_channels_are_refused(monkeypatch):
+    conn, opened, _ = parallel_connection(monkeypatch, 0)
+    outputs = conn.send_commands_parallel(['show a', 'show b'], 'rtr1#', timeout=1, channels=4)
+    assert opened == []
+    assert outputs == ['show a\r\na output\r\nrtr1#', 'show b\r\nb output\r\nrtr1#']
+    assert conn.channel.sent == ['show a\n', 'show b\n']
+
+
+def test_a_failed_parallel_command_is_returned_in_place(monkeypatch):
+    conn, _, _ = parallel_connection(monkeypatch, 1, fail=('show bad',))
+    commands = ['show a', 'show bad', 'show c', 'show d']
+    outputs = conn.send_commands_parallel(commands, 'rtr1#', timeout=0.5, channels=2)
+    assert isinstance(outputs[1], RuntimeError)
+    assert [output for index, output in enumerate(outputs) if index != 1] == [
+        'show a\r\na output\r\nrtr1#', 'show c\r\nc output\r\nrtr1#', 'show d\r\nd output\r\nrtr1#']
+
+
+def test_parallel_arguments_are_checked():
+    conn = connection()
+    with pytest.raises(ValueError, match='expect_occurrences'):
+        conn.send_commands_parallel(['show a', 'show b'], 'rtr1#', expect_occurrences=[1])
+    with pytest.raises(ValueError, match='parallel mode'):
+        conn.send_commands_parallel(['show a'], 'rtr1#', mode='telnet')
+
+
+class ExecChannel(FakeChannel):
+    """An exec channel: the scripted chunks end with EOF, then the exit status is available."""
+    def __init__(self, chunks, exit_status=0):
+        super().__init__(list(chunks) + [b''])
+        self.exit_status = exit_status
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+
+def exec_connection(monkeypatch, channel, **kwargs):
+    conn = connection(**kwargs)
+    requests = []
+
+    def open_channel(kind='shell', **options):
+        requests.append(dict(options, kind=kind))
+        return channel
+
+    monkeypatch.setattr(conn, 'open_channel', open_channel)
+    return conn, requests
+
+
+def test_exec_command_completes_at_eof(monkeypatch):
+    # No prompt in the output and no quiet gap: the channel closing ends the command
+    channel = ExecChannel(['Cisco IOS XE Software,', ' Version 17.3\r\n', 'rtr1 uptime is 1 week\r\n'])
+    conn, requests = exec_connection(monkeypatch, channel, exec_timeout=30)
+    output = conn.exec_command('show version')
+    assert output == 'Cisco IOS XE Software, Version 17.3\r\nrtr1 uptime is 1 week\r\n'
+    assert requests == [{'kind': 'exec', 'command': 'show version', 'combine_stderr': True}]
+    assert channel.timeout == 30 and channel.closed
+    assert conn.last_exit_status == 0
+    assert output in conn.retrieve_buffer()
+
+
+@pytest.mark.parametrize('exit_status, recorded', [(1, 1), (-1, None)])
+def test_exec_command_records_the_exit_status(monkeypatch, exit_status, recorded):
+    conn, _ = exec_connection(monkeypatch, ExecChannel(['% Invalid input\r\n'], exit_status))
+    assert conn.exec_command('show bogus') == '% Invalid input\r\n'
+    assert conn.last_exit_status == recorded
+
+
+def test_exec_command_times_out_before_eof(monkeypatch):
+    channel = ExecChannel(['partial output'])
+    channel.chunks.pop()  # The device never closes the channel
+    conn, _ = exec_connection(monkeypatch, channel)
+    with pytest.raises(RuntimeError, match="Failed to run command 'show tech'"):
+        conn.exec_command('show tech', timeout=1)
+    assert channel.timeout == 1 and channel.closed
+
+
+def test_send_command_routes_exec_mode(monkeypatch):
+    conn, requests = exec_connection(monkeypatch, ExecChannel(['12:00:00 UTC\r\n']))
+    assert conn.send_command('show clock', 'rtr1#', transport_mode='exec') == '12:00:00 UTC\r\n'
+    assert requests[0]['command'] == 'show clock'
+    assert conn.channel.sent == []
@@ -0,0 +1,75 @@
+import gzip
+
+from simplenet.cli.lib.transcript import TranscriptBuffer
+
+
+def fill(transcript, count):
+    lines = [f"line {index:04d}\n" for index in range(count)]
+    for line in lines:
+        transcript.append(line)
+    return ''.join(lines)
+
+
+def test_unbounded_transcript_keeps_everything():
+    transcript = TranscriptBuffer(max_size=0)
+    text = fill(transcript, 500)
+    transcript.append('')
+    assert transcript.getvalue() == text
+    assert len(transcript) == len(text)
+    assert transcript.dropped_chars == 0
+
+
+def test_trim_keeps_the_newest_text_and_counts_the_rest():
+    transcript = TranscriptBuffer(max_size=1000)
+    text = fill(transcript, 200)  # 2000 characters
+    kept = transcript.getvalue()
+    assert len(kept) <= 1000
+    assert text.endswith(kept)
+    assert transcript.dropped_chars == len(text) - len(kept)
+    assert transcript.spilled_chars == 0
+
+
+def test_a_single_large_chunk_is_split():
+    transcript = TranscriptBuffer(max_size=100)
+    transcript.append('x' * 90)
+    transcript.append('y' * 90)
+    # Trimmed to three quarters of the limit, cutting into the first chunk
+    assert transcript.getvalue() == 'y' * 75
+    assert transcript.dropped_chars == 105
+
+
+def test_trimmed_text_spills_to_gzip(tmp_path):
+    spill = tmp_path / 'transcripts' / 'rtr1.txt.gz'
+    transcript = TranscriptBuffer(max_size=1000, spill_path=str(spill))
+    text = fill(transcript, 300)
+
+    with gzip.open(spill, 'rt', encoding='utf-8') as f:
+        spilled = f.read()
+    assert transcript.spilled_chars == len(spilled) > 0
+    assert transcript.dropped_chars == 0
+    assert spilled + transcript.getvalue() == text
+
+    pages = list(transcript.pages(256))
+    assert ''.join(pages) == text
+    assert all(0 < len(page) <= 256 for page in pages)
+
+
+def test_a_new_session_starts_a_fresh_spill_file(tmp_path):
+    spill = tmp_path / 'rtr1.txt.gz'
+    first = TranscriptBuffer(max_size=100, spill_path=str(spill))
+    fill(first, 50)
+    assert spill.exists()
+
+    second = TranscriptBuffer(max_size=100, spill_path=str(spill))
+    assert not spill.exists()
+    second.append('show clock\n')
+    assert ''.join(second.pages()) == 'show clock\n'
+
+
+def test_clear_keeps_spilled_text(tmp_path):
+    transcript = TranscriptBuffer(max_size=100, spill_path=str(tmp_path / 'rtr1.txt.gz'))
+    text = fill(transcript, 20)
+    spilled = transcript.spilled_chars
+    transcript.clear()
+    assert transcript.getvalue() == '' and len(transcript) == 0
+    assert ''.join(transcript.pages()) == text[:spilled]
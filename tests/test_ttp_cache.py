@@ -0,0 +1,97 @@
+import os
+
+import pytest
+from ttp import ttp
+
+from simplenet.cli.lib import ttp_cache
+from simplenet.cli.lib.utils import parse_output_with_ttp, parse_outputs_with_ttp
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'project', 'templates', 'interface_mtu.ttp')
+
+OUTPUT_1 = """GigabitEthernet1 is up, line protocol is up
+  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec,
+"""
+
+OUTPUT_2 = """GigabitEthernet2 is administratively down, line protocol is down
+  MTU 9000 bytes, BW 100000 Kbit/sec, DLY 100 usec,
+"""
+
+
+def fresh_parse(template_text, output):
+    parser = ttp(data=output, template=template_text)
+    parser.parse()
+    return parser.result()
+
+
+@pytest.fixture
+def template_text():
+    with open(TEMPLATE_PATH) as f:
+        return f.read()
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    ttp_cache.clear_cache()
+    yield
+    ttp_cache.clear_cache()
+
+
+def test_parse_matches_fresh_parser(template_text):
+    template = ttp_cache.TtpTemplate(template_text)
+    first = template.parse(OUTPUT_1)
+    second = template.parse(OUTPUT_2)
+
+    assert first == fresh_parse(template_text, OUTPUT_1)
+    assert second == fresh_parse(template_text, OUTPUT_2)
+    assert first[0][0]['interface'] == 'GigabitEthernet1'
+    assert second[0][0]['mtu'] == '9000'
+
+
+def test_parse_many_matches_fresh_parser(template_text):
+    template = ttp_cache.TtpTemplate(template_text)
+    results = template.parse_many([OUTPUT_1, OUTPUT_2, OUTPUT_1])
+
+    assert results == [fresh_parse(template_text, OUTPUT_1),
+                       fresh_parse(template_text, OUTPUT_2),
+                       fresh_parse(template_text, OUTPUT_1)]
+
+
+def test_results_survive_parser_reuse(template_text):
+    template = ttp_cache.TtpTemplate(template_text)
+    first = template.parse(OUTPUT_1)
+    template.parse(OUTPUT_2)
+
+    assert first == fresh_parse(template_text, OUTPUT_1)
+
+
+def test_parser_is_built_once_per_template(template_text):
+    for output in (OUTPUT_1, OUTPUT_2, OUTPUT_1):
+        parse_output_with_ttp(TEMPLATE_PATH, output)
+    parse_outputs_with_ttp(TEMPLATE_PATH, [OUTPUT_1, OUTPUT_2])
+
+    stats = ttp_cache.cache_stats()
+    assert stats['loaded'] == 1
+    assert stats['parsers_built'] == 1
+    assert stats['parses'] == 5
+
+
+def test_template_reloaded_when_file_changes(tmp_path, template_text):
+    path = tmp_path / 'interface.ttp'
+    path.write_text(template_text)
+    first = ttp_cache.load_template(str(path))
+    assert ttp_cache.load_template(str(path)) is first
+
+    path.write_text(template_text + '\n')
+    os.utime(path, ns=(0, 0))
+    assert ttp_cache.load_template(str(path)) is not first
+
+
+def test_get_template_accepts_text_and_loaded_template(template_text):
+    loaded = ttp_cache.load_template(TEMPLATE_PATH)
+    assert ttp_cache.get_template(TEMPLATE_PATH, loaded) is loaded
+    assert ttp_cache.get_template(None, template_text) is ttp_cache.template_from_text(template_text)
+
+
+def test_missing_template_raises(tmp_path):
+    with pytest.raises(OSError):
+        ttp_cache.load_template(str(tmp_path / 'missing.ttp'))